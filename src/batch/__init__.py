@@ -0,0 +1 @@
+# Batch runner of pyint scripts on a pool of worker processes, run it with python -m batch from src/, see runner.py
@@ -0,0 +1,120 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                           runner                            #
+#                                                             #
+#-------------------------------------------------------------#
+
+# Runs many pyint scripts on a pool of worker processes and writes what each one printed, its exit status and its timing to one JSON file:
+#     python -m batch <directory | manifest> [--workers N] [--engine vm|pyparser] [--maxdepth N] [--output batchresults.json]
+# A directory is run as all of its *.in files, a manifest is a text file with one script path per line, relative to the manifest, '#' starts a comment.
+# Every worker imports the interpreter once and keeps one Interpreter (see embed.py) for all the scripts it is handed,
+# instead of a new python process per script paying for startup and imports each time.
+# Run it from src/. The exit status is 1 if any script failed, as main.py exits with 1 on an error in the script.
+# Only the workers import the interpreter: the token.py of src/pyint shadows the standard token module, which multiprocessing needs before that.
+
+import sys
+import os
+import json
+import time
+import platform
+import argparse
+import multiprocessing
+
+pyintdir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pyint')
+# Same as embed.ENGINES, which the main process does not import
+ENGINES = ('vm', 'pyparser')
+
+# Format of the result file, bumped when its layout changes
+RESULTVERSION = 1
+
+# The Interpreter of this worker process, built once by startworker()
+interpreter = None
+
+def startworker(engine:str, maxcalldepth:int):
+    global interpreter
+    sys.path.insert(0, pyintdir)
+    from embed import Interpreter
+    interpreter = Interpreter(engine=engine, maxcalldepth=maxcalldepth)
+
+def runscript(path:str):
+    """Compile and run one script in this worker, returns its entry of the result file.
+    Like main.py, the status is 0 when the script ran to the end and 1 when it failed, with the error instead of a traceback and the output it printed before.
+    """
+    entry = {'script': path, 'status': 0, 'output': '', 'error': None, 'compile': None, 'run': None}
+    start = time.perf_counter()
+    phase = 'compile'
+    try:
+        with open(path, 'r') as infile:
+            source = infile.read()
+        compiled = interpreter.compile(source)
+        entry['compile'] = time.perf_counter() - start
+        phase = 'run'
+        start = time.perf_counter()
+        entry['output'] = interpreter.run(compiled).output
+        entry['run'] = time.perf_counter() - start
+    except Exception as emsg:
+        entry[phase] = time.perf_counter() - start
+        entry['status'] = 1
+        entry['error'] = str(emsg) if isinstance(emsg, RuntimeError) else f"{type(emsg).__name__}: {emsg}"
+        if phase == 'run':
+            # The engines flush what the script printed on their way out, errors included
+            entry['output'] = interpreter.output.getvalue()
+    return entry
+
+def findscripts(target:str):
+    """Paths of the scripts to run: the *.in files of a directory, or the lines of a manifest"""
+    if os.path.isdir(target):
+        return [os.path.join(target, name) for name in sorted(os.listdir(target)) if name.endswith('.in')]
+    scripts = []
+    base = os.path.dirname(os.path.abspath(target))
+    with open(target, 'r') as manifest:
+        for line in manifest:
+            line = line.split('#', 1)[0].strip()
+            if line != '':
+                scripts.append(os.path.normpath(os.path.join(base, line)))
+    return scripts
+
+def main():
+    argparser = argparse.ArgumentParser(description='pyint batch runner')
+    argparser.add_argument('target', help='directory of *.in scripts, or manifest file listing one script per line')
+    argparser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes, default the number of CPUs')
+    argparser.add_argument('--engine', choices=ENGINES, default='vm', help='engine the scripts run on, default vm')
+    argparser.add_argument('--maxdepth', type=int, help='maximum depth of nested function calls in the scripts, default that of the engine')
+    argparser.add_argument('--output', default='batchresults.json', help='where to write the results, default batchresults.json')
+    args = argparser.parse_args()
+    if args.workers < 1:
+        argparser.error('--workers must be at least 1')
+
+    try:
+        scripts = findscripts(args.target)
+    except IOError:
+        print(f'Failed to read manifest {args.target}')
+        sys.exit(1)
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers, initializer=startworker, initargs=(args.engine, args.maxdepth)) as pool:
+        # Several scripts per task, so that thousands of small scripts do not cost a round trip to a worker each
+        chunksize = max(1, len(scripts) // (args.workers * 4))
+        results = list(pool.imap(runscript, scripts, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    failed = [entry for entry in results if entry['status'] != 0]
+    document = {
+        'version': RESULTVERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'engine': args.engine,
+        'workers': args.workers,
+        'elapsed': elapsed,
+        'results': results,
+    }
+    with open(args.output, 'w') as outfile:
+        json.dump(document, outfile, indent=2)
+    for entry in failed:
+        print(f"FAILED    {entry['script']}: {entry['error']}")
+    print(f"{len(results)} scripts, {len(failed)} failed, in {elapsed:.2f}s on {args.workers} workers. Results written to {args.output}")
+    if len(failed) > 0:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
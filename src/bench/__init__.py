@@ -0,0 +1 @@
+# Benchmark suite of the pyint engines, run it with python -m bench from src/, see runner.py
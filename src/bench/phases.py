@@ -0,0 +1,117 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                           phases                            #
+#                                                             #
+#-------------------------------------------------------------#
+
+# Times the phases of one engine on one script and prints them as one line of JSON:
+#     python -m bench.phases <engine> <script>
+# The runner starts a new process for every measurement. The engines import modules of the same names (tokenizer, pyheader, type, ...)
+# from different directories, and interpreter.py keeps its whole state in module globals, so they cannot share one process.
+
+import sys
+import os
+import io
+import json
+import time
+import hashlib
+import contextlib
+
+srcdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Engine -> its phases, in the order they run
+engines = {
+    'pyparser':     ['tokenize', 'removecomment', 'execute'],
+    'vm':           ['tokenize', 'removecomment', 'compile', 'execute'],
+    'ast':          ['tokenize', 'removecomment', 'parse', 'execute'],
+    'interpreter':  ['tokenize', 'removecomment', 'execute'],
+}
+
+class phasetimer:
+    """Runs the phases of an engine one after the other and keeps the wall time of each, in seconds"""
+    def __init__(self):
+        self.phases = {}
+
+    def run(self, phase:str, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.phases[phase] = time.perf_counter() - start
+        return result
+
+def runpyint(timer:phasetimer, source:str, usevm:bool):
+    sys.path.insert(0, os.path.join(srcdir, 'pyint'))
+    from tokenizer import tokenizer
+    from pyparser import pyparser
+    from compiler import compiler
+    from vm import vm
+
+    tokenlist = []
+    T = tokenizer(source=source, tokenlist=tokenlist)
+    timer.run('tokenize', T.run)
+    timer.run('removecomment', T.removecomment)
+    if usevm is True:
+        code = timer.run('compile', compiler(tokenlist=tokenlist, source=source).compile)
+        timer.run('execute', vm(code=code, source=source).run)
+    else:
+        timer.run('execute', pyparser(tokenlist=tokenlist, source=source).parse)
+
+def runast(timer:phasetimer, source:str):
+    sys.path.insert(0, os.path.join(srcdir, 'pyint_ast'))
+    from tokenizer import tokenizer
+    from pyparser_ast import pyparser
+
+    tokenlist = []
+    T = tokenizer(source=source, tokenlist=tokenlist)
+    timer.run('tokenize', T.run)
+    timer.run('removecomment', T.removecomment)
+    P = pyparser(tokenlist=tokenlist, source=source)
+    tree = timer.run('parse', P.parse)
+    timer.run('execute', P.interpret, tree)
+
+def runinterpreter(timer:phasetimer, source:str):
+    sys.path.insert(0, os.path.join(srcdir, 'pyint'))
+    import interpreter
+
+    interpreter.source = source
+    timer.run('tokenize', interpreter.tokenizer)
+    timer.run('removecomment', interpreter.removecomment)
+    def execute():
+        interpreter.matchindent()
+        interpreter.parser()
+    timer.run('execute', execute)
+
+def measure(engine:str, path:str):
+    """Phase times of engine on the script at path, with a hash of what the script printed so the runner can tell whether the engines agree.
+    A script that fails gives its error instead of the times.
+    """
+    with open(path, 'r') as infile:
+        source = infile.read()
+    if source[-1] != '\n':
+        source = source + '\n'
+
+    timer = phasetimer()
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            if engine == 'ast':
+                runast(timer, source)
+            elif engine == 'interpreter':
+                runinterpreter(timer, source)
+            else:
+                runpyint(timer, source, engine == 'vm')
+    except Exception as emsg:
+        return {'error': f"{type(emsg).__name__}: {emsg}"}
+    return {
+        'phases': timer.phases,
+        'total': sum(timer.phases.values()),
+        'output': hashlib.sha256(output.getvalue().encode('utf-8')).hexdigest()[:16],
+    }
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in engines:
+        print(f"Usage: python -m bench.phases <{'|'.join(engines)}> <script>")
+        sys.exit(1)
+    print(json.dumps(measure(sys.argv[1], sys.argv[2])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                           runner                            #
+#                                                             #
+#-------------------------------------------------------------#
+
+# Runs the workloads on the engines, writes the results as JSON and compares them with a baseline:
+#     python -m bench [--engines ...] [--workloads ...] [--file script.in ...] [--scale 1.0] [--repeat 3]
+#                     [--output benchresults.json] [--baseline bench/baseline.json] [--save-baseline] [--threshold 0.1]
+# Run it from src/. The exit status is 1 if any phase regressed against the baseline, so it can guard a build.
+
+import sys
+import os
+import json
+import platform
+import subprocess
+import tempfile
+import argparse
+from bench.workloads import workloads
+from bench.phases import engines, srcdir
+
+# Format of the result file, bumped when its layout changes
+RESULTVERSION = 1
+# Differences below this many seconds are noise, whatever the ratio
+NOISEFLOOR = 0.005
+
+def runphases(engine:str, path:str):
+    """One measurement of engine on the script at path, in a process of its own, see bench.phases"""
+    completed = subprocess.run([sys.executable, '-m', 'bench.phases', engine, path], cwd=srcdir, capture_output=True, text=True)
+    try:
+        return json.loads(completed.stdout.strip().split('\n')[-1])
+    except (ValueError, IndexError):
+        return {'error': f"bench.phases exited with status {completed.returncode}: {completed.stderr.strip()[-200:]}"}
+
+def best(runs:list):
+    """Fastest time of every phase over repeated measurements, the least disturbed by the rest of the machine"""
+    result = dict(runs[0])
+    result['phases'] = {phase: min(run['phases'][phase] for run in runs) for phase in runs[0]['phases']}
+    result['total'] = min(run['total'] for run in runs)
+    return result
+
+def benchmark(scripts:dict, engineset:list, repeat:int):
+    """Name -> path of script for every workload, returns workload -> engine -> best result or error"""
+    results = {}
+    for name, path in scripts.items():
+        results[name] = {}
+        for engine in engineset:
+            runs = []
+            for _ in range(repeat):
+                run = runphases(engine, path)
+                if 'error' in run:
+                    runs = [run]
+                    break
+                runs.append(run)
+            results[name][engine] = runs[0] if 'error' in runs[0] else best(runs)
+            report(name, engine, results[name][engine])
+    return results
+
+def report(name:str, engine:str, result:dict):
+    if 'error' in result:
+        print(f"{name:<12}{engine:<13}{result['error']}")
+        return
+    phases = '  '.join(f"{phase} {seconds * 1000:9.1f}" for phase, seconds in result['phases'].items())
+    print(f"{name:<12}{engine:<13}total {result['total'] * 1000:9.1f} ms   {phases}")
+
+def disagreements(results:dict):
+    """Workloads on which the engines that ran it printed different output"""
+    found = []
+    for name, byengine in results.items():
+        outputs = {engine: result['output'] for engine, result in byengine.items() if 'error' not in result}
+        if len(set(outputs.values())) > 1:
+            found.append(f"{name}: engines print different output ({', '.join(f'{engine} {output}' for engine, output in outputs.items())})")
+    return found
+
+def compare(results:dict, baseline:dict, threshold:float):
+    """Compare results with the results of a baseline file, print every phase that changed by more than threshold and return the regressions"""
+    regressions = []
+    for name, byengine in results.items():
+        for engine, result in byengine.items():
+            old = baseline['results'].get(name, {}).get(engine)
+            if old is None or 'error' in old or 'error' in result:
+                continue
+            timings = [(phase, old['phases'].get(phase), seconds) for phase, seconds in result['phases'].items()] + [('total', old['total'], result['total'])]
+            for phase, before, after in timings:
+                if before is None or before == 0 or abs(after - before) < NOISEFLOOR:
+                    continue
+                ratio = after / before
+                if ratio > 1 + threshold:
+                    regressions.append(f"{name} {engine} {phase}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms ({ratio:.2f}x)")
+                elif ratio < 1 - threshold:
+                    print(f"improved  {name} {engine} {phase}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms ({ratio:.2f}x)")
+    for regression in regressions:
+        print(f"REGRESSED {regression}")
+    return regressions
+
+def main():
+    argparser = argparse.ArgumentParser(prog='python -m bench', description='pyint benchmark runner')
+    argparser.add_argument('--engines', nargs='+', choices=list(engines), default=list(engines), help='engines to run, all by default')
+    argparser.add_argument('--workloads', nargs='+', choices=list(workloads), default=list(workloads), help='built-in workloads to run, all by default')
+    argparser.add_argument('--file', action='append', default=[], help='also run this pyint script, e.g. one of src/book/*.in, can be repeated')
+    argparser.add_argument('--scale', type=float, default=1.0, help='size factor of the built-in workloads, default 1.0')
+    argparser.add_argument('--repeat', type=int, default=3, help='measurements per workload and engine, the fastest one counts, default 3')
+    argparser.add_argument('--output', default='benchresults.json', help='where to write the results, default benchresults.json')
+    argparser.add_argument('--baseline', default=os.path.join(srcdir, 'bench', 'baseline.json'), help='results to compare with, default bench/baseline.json')
+    argparser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline instead of comparing with it')
+    argparser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown of a phase that counts as a regression, default 0.10')
+    args = argparser.parse_args()
+    if args.repeat < 1:
+        argparser.error('--repeat must be at least 1')
+
+    with tempfile.TemporaryDirectory() as directory:
+        scripts = {}
+        for name in args.workloads:
+            scripts[name] = os.path.join(directory, f"{name}.in")
+            with open(scripts[name], 'w') as script:
+                script.write(workloads[name](args.scale))
+        for path in args.file:
+            scripts[os.path.basename(path)] = os.path.abspath(path)
+        results = benchmark(scripts, args.engines, args.repeat)
+
+    document = {
+        'version': RESULTVERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    for disagreement in disagreements(results):
+        print(f"WARNING   {disagreement}")
+    with open(args.output, 'w') as outfile:
+        json.dump(document, outfile, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline is True:
+        with open(args.baseline, 'w') as outfile:
+            json.dump(document, outfile, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+    try:
+        with open(args.baseline, 'r') as infile:
+            baseline = json.load(infile)
+    except (OSError, ValueError):
+        print(f"No baseline to compare with at {args.baseline}, store one with --save-baseline")
+        return
+    if baseline.get('version') != RESULTVERSION or baseline.get('scale') != args.scale:
+        print(f"Baseline {args.baseline} was taken with another result format or scale, not comparing")
+        return
+    if len(compare(results, baseline, args.threshold)) > 0:
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}")
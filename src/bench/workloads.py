@@ -0,0 +1,111 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                          workloads                          #
+#                                                             #
+#-------------------------------------------------------------#
+
+# Representative pyint programs for the benchmark runner.
+# Every workload is a function of a scale factor returning the source of one script. The scripts stick to what all engines support,
+# e.g. interpreter.py cannot call a function inside an expression, so recursion counts its calls in a global instead of returning a value,
+# and comments are # comments only, as the tokenizers do not handle /* */ reliably.
+
+def arithmetic(scale:float):
+    """Tight while loop of integer and float arithmetic"""
+    n = int(100000 * scale)
+    return f"""i = 0
+total = 0
+ratio = 0.5
+while i < {n}:
+    total = total + i * 3 - i % 7
+    ratio = ratio * 0.5 + 1.0
+    i += 1
+print(total, ratio)
+"""
+
+def recursion(scale:float):
+    """Deep recursive calls, repeated"""
+    rounds = max(1, int(100 * scale))
+    return f"""calls = 0
+def down(n):
+    global calls
+    calls += 1
+    if n > 0:
+        down(n - 1)
+rounds = 0
+while rounds < {rounds}:
+    down(150)
+    rounds += 1
+print(calls)
+"""
+
+def branching(scale:float):
+    """if / elif / else chains on every iteration"""
+    n = int(50000 * scale)
+    return f"""i = 0
+a = 0
+b = 0
+c = 0
+d = 0
+while i < {n}:
+    k = i % 4
+    if k == 0:
+        a += 1
+    elif k == 1:
+        b += 1
+    elif k == 2:
+        c += 1
+    else:
+        d += 1
+    if i % 3 == 0:
+        a -= 1
+    i += 1
+print(a, b, c, d)
+"""
+
+def strings(scale:float):
+    """String concatenation and comparison"""
+    n = int(20000 * scale)
+    return f"""i = 0
+s = ''
+word = 'ab'
+count = 0
+while i < {n}:
+    s = s + word
+    if word < 'b':
+        count += 1
+    if i % 100 == 0:
+        s = ''
+    i += 1
+print(count, s)
+"""
+
+def generated(scale:float):
+    """Large straight-line source, mostly tokenizer and parser work"""
+    lines = ["v0 = 1"]
+    for index in range(1, int(20000 * scale)):
+        lines.append(f"v{index} = v{index - 1} + {index % 10} * 2")
+    lines.append(f"print(v{len(lines) - 1})")
+    return '\n'.join(lines) + '\n'
+
+def comments(scale:float):
+    """More comments than code, mostly removecomment() work"""
+    lines = ["i = 0"]
+    for index in range(int(5000 * scale)):
+        lines.append(f"# Comment {index} on its own line, a few words long")
+        lines.append(f"i += {index % 3}  # trailing comment")
+        if index % 50 == 0:
+            lines.append("#")
+            lines.append("# A block of comments")
+            lines.append("#")
+    lines.append("print(i)")
+    return '\n'.join(lines) + '\n'
+
+# Name -> function building the source of the workload
+workloads = {
+    'arithmetic':   arithmetic,
+    'recursion':    recursion,
+    'branching':    branching,
+    'strings':      strings,
+    'generated':    generated,
+    'comments':     comments,
+}
@@ -0,0 +1,655 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                          compiler                           #
+#                                                             #
+#-------------------------------------------------------------#
+
+# The compiler follows the same CFG as pyparser.py, but instead of executing each rule it emits bytecode for it.
+# Every loop body and every function body is therefore parsed exactly once, no matter how many times it runs later in vm.py.
+###############################################################
+# <program>         -> <stmt>* EOF
+# <stmt>            -> <simplestmt> NEWLINE
+# <stmt>            -> <compoundstmt>
+# <simplestmt>      -> <printstmt>
+# <simplestmt>      -> <assignmentstmt>
+# <simplestmt>      -> <passstmt>
+# <simplestmt>      -> <breakstmt>
+# <simplestmt>      -> <globalstmt>
+# <simplestmt>      -> <returnstmt>
+# <simplestmt>      -> <functioncallstmt>
+# <compoundstmt>    -> <whilestmt>
+# <compoundstmt>    -> <ifstmt>
+# <compoundstmt>    -> <defstmt>
+# <printstmt>       -> 'print' '(' [ <relexpr> (',' <relexpr>)* [ ',' ]] ')'
+# <assignmentstmt>  -> NAME ('=' | '+=' | '-=' | '*=' | '/=') <relexpr>
+# <passstmt>        -> 'pass'
+# <breakstmt>       -> 'break'
+# <globalstmt>      -> 'global' NAME(',' NAME)*
+# <returnstmt>      -> 'return' [<relexpr>]
+# <functioncallstmt>-> NAME'(' [<relexpr> (',' <relexpr>)*] ')'
+# <whilestmt>       -> 'while' <relexpr> ':' <codeblock>
+# <ifstmt>          -> 'if' <relexpr> ':' <codeblock> ('elif' <relexpr> ':' <codeblock>)* ['else' ':' <codeblock>]
+# <defstmt>         -> 'def' NAME '(' [NAME (, NAME)*] ')'':' <codeblock>
+# <codeblock>       -> <NEWLINE> 'INDENT' <stmt>+ 'DEDENT'
+# <relexpr>         -> <expr> [ ('<' | '<=' | '==' | '!=' | '>=' | '>') <expr>]*
+# <expr>            -> <term> (('+' | '-') <term>)*
+# <term>            -> <factor> (('*' | '/' | '%') <factor>)*
+# <factor>          -> ('+' | '-') <factor>
+# <factor>          -> NAME
+# <factor>          -> <functioncallstmt>
+# <factor>          -> INTEGER | FLOAT | STRING | 'True' | 'False' | 'None'
+# <factor>          -> '(' <relexpr> ')'
+###############################################################
+
+from pyheader import *
+from type import dispatch
+from tokenbuffer import tokenbuffer
+from tokenstream import tokenstream
+from array import array
+import math
+
+class codeobject:
+    """Output of the compiler for the whole program or for one function body.
+
+    co_code holds (opcode, argument) pairs flattened into one list, so the instruction at pc is co_code[pc] with argument co_code[pc + 1].
+    co_lines holds, for every instruction, the index of the token it was compiled from in co_tokens, so that runtime errors can still point at the source.
+    Only the index is kept, in an array, a tokenbuffer would otherwise build a Token for every instruction. co_tokens is the token list of the compiler, or a tokenwindow when compiling a stream.
+    """
+    def __init__(self, name:str, parameters:list, tokens=None):
+        self.co_name = name
+        self.co_parameters = parameters
+        self.co_code = []
+        self.co_consts = []
+        self.co_names = []
+        self.co_lines = array('I')
+        self.co_tokens = tokens
+        # Index of every constant and name, so that constindex() and nameindex() do not search the lists. Constants are keyed by (type, value) as True == 1 and 1.0 == 1 in Python
+        self.co_constmap = {}
+        self.co_namemap = {}
+
+    def disassemble(self):
+        print(f"Code object {self.co_name}({', '.join(self.co_parameters)})")
+        print('co_names  = ', self.co_names)
+        print('co_consts = ', [const.co_name if isinstance(const, codeobject) else const for const in self.co_consts])
+        for pc in range(0, len(self.co_code), 2):
+            opcode = self.co_code[pc]
+            argument = self.co_code[pc + 1]
+            if opcode in [LOAD_NAME, STORE_NAME, LOAD_FUNCTION, DECLARE_GLOBAL] + [INPLACE_ADD, INPLACE_SUBTRACT, INPLACE_MULTIPLY, INPLACE_TRUE_DIVIDE]:
+                detail = self.co_names[argument]
+            elif opcode in [LOAD_CONST, MAKE_FUNCTION]:
+                detail = self.co_consts[argument]
+            elif opcode == COMPARE_OP:
+                detail = catnames[argument]
+            else:
+                detail = ''
+            print(f"{self.co_tokens[self.co_lines[pc // 2]].line:4}  {pc:5}  {opnames[opcode]:<22}{argument:<6}{detail}")
+        for const in self.co_consts:
+            if isinstance(const, codeobject):
+                print()
+                const.disassemble()
+
+# Token categories of binary operators and the opcodes they compile to
+binaryops = {
+    PLUS:       BINARY_ADD,
+    MINUS:      BINARY_SUBTRACT,
+    TIMES:      BINARY_MULTIPLY,
+    DIVISION:   BINARY_TRUE_DIVIDE,
+    MODULO:     BINARY_MODULO,
+}
+
+# Token categories of compound assignments and the opcodes they compile to
+inplaceops = {
+    ADDASSIGN:  INPLACE_ADD,
+    SUBASSIGN:  INPLACE_SUBTRACT,
+    MULASSIGN:  INPLACE_MULTIPLY,
+    DIVASSIGN:  INPLACE_TRUE_DIVIDE,
+}
+
+comparisonops = [LESSTHAN, LESSEQUAL, EQUAL, NOTEQUAL, GREATEREQUAL, GREATERTHAN]
+
+# Binary opcodes and the token categories type.dispatch knows them by, for constant folding in emitoperator()
+foldableops = {opcode: category for category, opcode in binaryops.items()}
+# Longest string emitoperator() folds, so that something like 'ab' * 1000000 in a branch that never runs does not build a huge constant
+MAXFOLDEDSTRING = 4096
+
+class compiler:
+    def __init__(self, tokenlist:list, source:str):
+        self.tokenlist = tokenlist
+        self.source = source
+        self.trace = False
+        self.token = None
+        self.tokenindex = 0
+        # What the token indices in co_lines refer to, see codeobject
+        self.tokens = tokenlist
+        # Categories of all tokens, for lookahead without building Token objects. A tokenbuffer already stores them in an array
+        if isinstance(tokenlist, tokenbuffer) or isinstance(tokenlist, tokenstream):
+            self.categories = tokenlist.categories
+        else:
+            self.categories = [token.category for token in tokenlist]
+        # The code object we are currently emitting into, the top level program or a function body
+        self.code = None
+        # For each enclosing while loop, the list of JUMP_ABSOLUTE arguments to patch with the loop exit once it is known
+        self.breaklist = []
+
+    def compile(self):
+        """Compile the whole token list and return the code object of the top level program
+        """
+        self.token = self.tokenlist[0]
+        self.code = codeobject('<program>', [], self.tokens)
+        self.program()
+        if self.trace is True:
+            self.code.disassemble()
+        return self.code
+
+    def compilestream(self):
+        """Compile the program one top level statement at a time and yield a code object for each.
+        Meant for a tokenstream over tokenizer.nexttoken(): the VM can run a statement before the rest of the source is read, and the tokens of finished statements are dropped.
+        Unlike compile(), a syntax error only stops the program where it occurs, the statements before it have already run.
+        """
+        self.token = self.tokenlist[0]
+        while self.token.category == NEWLINE:
+            self.advance()
+        while self.token.category in stmttokens:
+            # The tokens of the statement outlive the stream for the error messages of its code, and of the functions it defines
+            self.tokens = self.tokenlist.keep(self.tokenindex)
+            self.code = codeobject('<program>', [], self.tokens)
+            self.stmt()
+            self.emit(LOAD_CONST, self.constindex(None))
+            self.emit(RETURN_VALUE)
+            self.tokenlist.release()
+            if self.trace is True:
+                self.code.disassemble()
+            yield self.code
+        if self.token.category != EOF:
+            raise RuntimeError(f"Expecting a statement but get {catnames[self.token.category]}")
+
+    def advance(self):
+        """Advance the reading of a token from tokenlist.
+        The variable "token" always contain the current token
+        """
+        # EOF is always the last token. Checking for it rather than for the length also works for a tokenstream, whose length is not known
+        if self.token.category == EOF:
+            raise RuntimeError("Unexpected end of file")
+        self.tokenindex += 1
+        self.token = self.tokenlist[self.tokenindex]
+
+    def consume(self, expectedcat: int):
+        """Consumes the expected category.
+        """
+        if self.token.category != expectedcat:
+            raise RuntimeError(f"Expecting {catnames[expectedcat]} but get {catnames[self.token.category]}")
+        elif self.token.category == EOF:
+            return
+        else:
+            self.advance()
+
+    def emit(self, opcode:int, argument:int=0, tokenindex:int=None):
+        """Append one instruction and return its position in co_code.
+        The instruction is attributed to the token at tokenindex, by default the current one.
+        """
+        pc = len(self.code.co_code)
+        self.code.co_code.append(opcode)
+        self.code.co_code.append(argument)
+        self.code.co_lines.append(self.tokenindex if tokenindex is None else tokenindex)
+        return pc
+
+    def patch(self, pc:int, target:int):
+        """Point the jump instruction at pc to target
+        """
+        self.code.co_code[pc + 1] = target
+
+    def constindex(self, value):
+        # True == 1 and 1.0 == 1 in Python, so compare types as well or constants get mixed up
+        # -0.0 == 0.0 as well, a fold can produce -0.0 and it prints differently
+        key = (type(value), value) if type(value) is not float else (float, value, math.copysign(1.0, value))
+        index = self.code.co_constmap.get(key)
+        if index is None:
+            index = len(self.code.co_consts)
+            self.code.co_consts.append(value)
+            self.code.co_constmap[key] = index
+        return index
+
+    def nameindex(self, name:str):
+        index = self.code.co_namemap.get(name)
+        if index is None:
+            index = len(self.code.co_names)
+            self.code.co_names.append(name)
+            self.code.co_namemap[name] = index
+        return index
+
+    def emitoperator(self, opcode:int, tokenindex:int):
+        """Emit an arithmetic operator, folding it into a constant when its operands are constants just loaded.
+        e.g. 60 * 60 * 24 compiles to LOAD_CONST 86400 and -5 to LOAD_CONST -5, and the VM no longer computes them on every run.
+        A fold is only done when the VM would succeed: if type.dispatch has no operation for the types, or the operation raises (division by zero), the operator is emitted and fails at run time as before.
+        Jumps only ever target the start of a statement or of a condition, never the second operand of an operator, so removing the loads cannot break a jump.
+        """
+        co_code = self.code.co_code
+        folded = False
+        if opcode in foldableops:
+            if len(co_code) >= 4 and co_code[-4] == LOAD_CONST and co_code[-2] == LOAD_CONST:
+                left = self.code.co_consts[co_code[-3]]
+                right = self.code.co_consts[co_code[-1]]
+                operation = dispatch.get((foldableops[opcode], type(left), type(right)))
+                if operation is not None:
+                    try:
+                        value = operation(left, right)
+                        folded = True
+                    except ArithmeticError:
+                        pass
+                count = 2
+        elif len(co_code) >= 2 and co_code[-2] == LOAD_CONST:
+            operand = self.code.co_consts[co_code[-1]]
+            try:
+                value = -1 * operand if opcode == UNARY_NEGATIVE else operand
+                folded = True
+            except TypeError:
+                pass
+            count = 1
+        if folded is True and (type(value) is not str or len(value) <= MAXFOLDEDSTRING):
+            # Replace the loads by a single load of the result
+            del co_code[-2 * count:]
+            del self.code.co_lines[-count:]
+            self.emit(LOAD_CONST, self.constindex(value), tokenindex)
+        else:
+            self.emit(opcode, tokenindex=tokenindex)
+
+    def program(self):
+        # <program>         -> <stmt>* EOF
+        while self.token.category == NEWLINE:
+            self.advance()
+        while self.token.category in stmttokens:
+            self.stmt()
+        if self.token.category != EOF:
+            raise RuntimeError(f"Expecting a statement but get {catnames[self.token.category]}")
+        self.emit(LOAD_CONST, self.constindex(None))
+        self.emit(RETURN_VALUE)
+
+    def stmt(self):
+        # <stmt>            -> <simplestmt> NEWLINE+
+        # <stmt>            -> <compoundstmt>
+        if self.token.category in [PRINT, NAME, PYPASS, BREAK, GLOBAL, RETURN]:
+            self.simplestmt()
+            while self.token.category == NEWLINE:
+                self.consume(NEWLINE)
+        elif self.token.category in [PYIF, PYWHILE, DEF]:
+            self.compoundstmt()
+        else:
+            raise RuntimeError(f"Expecting print, a name, pass, if, while, but get {self.token.category}")
+
+    def simplestmt(self):
+        if self.token.category == PRINT:
+            self.printstmt()
+        elif self.token.category == NAME:
+            # could be assignment, or function call
+            if self.categories[self.tokenindex + 1] == LEFTPAREN:
+                self.functioncallstmt()
+                # The returned value is not used by a statement
+                self.emit(POP_TOP)
+            else:
+                self.assignmentstmt()
+        elif self.token.category == PYPASS:
+            self.advance()
+        elif self.token.category == BREAK:
+            self.breakstmt()
+        elif self.token.category == GLOBAL:
+            self.globalstmt()
+        elif self.token.category == RETURN:
+            self.returnstmt()
+        else:
+            raise RuntimeError("Expecting PRINT, NAME, PYPASS, BREAK, GLOBAL, RETURN and FUNCTION CALL")
+
+    def printstmt(self):
+        # <printstmt>       -> 'print' '(' [ <relexpr> (',' <relexpr>)* [ ',' ]] ')'
+        index_print = self.tokenindex
+        self.advance()
+        self.consume(LEFTPAREN)
+        if self.token.category != RIGHTPAREN:
+            self.relexpr()
+            self.emit(PRINT_ITEM, tokenindex=index_print)
+            while self.token.category == COMMA:
+                self.advance()
+                # Is this the last comma before ')'?
+                if self.token.category == RIGHTPAREN:
+                    break
+                self.relexpr()
+                self.emit(PRINT_ITEM, tokenindex=index_print)
+        self.consume(RIGHTPAREN)
+        self.emit(PRINT_NEWLINE, tokenindex=index_print)
+
+    def assignmentstmt(self):
+        # <assignmentstmt>  -> NAME ('=' | '+=' | '-=' | '*=' | '/=') <relexpr>
+        index_left = self.tokenindex
+        name_left = self.token.lexeme
+        self.advance()
+        index_op = self.tokenindex
+        category_op = self.token.category
+        if category_op == ASSIGNOP:
+            self.advance()
+            self.relexpr()
+            self.emit(STORE_NAME, self.nameindex(name_left), index_left)
+        elif category_op in inplaceops:
+            self.advance()
+            self.relexpr()
+            # The VM looks up the left side, checks the types and stores the result in one go
+            self.emit(inplaceops[category_op], self.nameindex(name_left), index_op)
+        else:
+            raise RuntimeError(f"Expecting an assignment operator but get {catnames[category_op]}")
+
+    def breakstmt(self):
+        # <breakstmt>       -> 'break'
+        if len(self.breaklist) == 0:
+            raise RuntimeError("Only allow break in a loop")
+        # The loop exit is not known yet, whilestmt() patches it
+        self.breaklist[-1].append(self.emit(JUMP_ABSOLUTE))
+        self.advance()
+
+    def globalstmt(self):
+        # <globalstmt>      -> 'global' NAME(',' NAME)*
+        if self.code.co_name == '<program>':
+            raise RuntimeError(f"'global' keyboard can only be used within functions.")
+        self.advance()
+        while True:
+            if self.token.category != NAME:
+                raise RuntimeError(f"Expecting NAME but get {catnames[self.token.category]}")
+            self.emit(DECLARE_GLOBAL, self.nameindex(self.token.lexeme))
+            self.advance()
+            if self.token.category == COMMA:
+                self.advance()
+            else:
+                break
+
+    def returnstmt(self):
+        # <returnstmt>      -> 'return' [<relexpr>]
+        if self.code.co_name == '<program>':
+            raise RuntimeError("'return' can only be used within functions.")
+        index_return = self.tokenindex
+        self.advance()
+        if self.token.category != NEWLINE:
+            self.relexpr()
+        else:
+            self.emit(LOAD_CONST, self.constindex(None), index_return)
+        self.emit(RETURN_VALUE, tokenindex=index_return)
+
+    def functioncallstmt(self):
+        # <functioncallstmt>-> NAME'(' [<relexpr> (',' <relexpr>)*] ')'
+        index_function = self.tokenindex
+        # Functions are looked up before their arguments get evaluated, as in pyparser.functioncallstmt()
+        self.emit(LOAD_FUNCTION, self.nameindex(self.token.lexeme))
+        self.advance()
+        self.consume(LEFTPAREN)
+        counter = 0
+        while self.token.category != RIGHTPAREN:
+            self.relexpr()
+            counter += 1
+            if self.token.category == COMMA:
+                self.advance()
+            elif self.token.category != RIGHTPAREN:
+                raise RuntimeError(f"Expecting COMMA or RIGHTPAREN but get {catnames[self.token.category]}")
+        self.consume(RIGHTPAREN)
+        self.emit(CALL_FUNCTION, counter, index_function)
+
+    def compoundstmt(self):
+        if self.token.category == PYIF:
+            self.ifstmt()
+        elif self.token.category == PYWHILE:
+            self.whilestmt()
+        elif self.token.category == DEF:
+            self.defstmt()
+
+    def ifstmt(self):
+        # <ifstmt>          -> 'if' <relexpr> ':' <codeblock> ('elif' <relexpr> ':' <codeblock>)* ['else' ':' <codeblock>]
+        """
+        Compiles into:
+
+                <relexpr>
+                JUMP_IF_FALSE_OR_POP next
+                <codeblock>
+                JUMP_ABSOLUTE       end
+        next:   POP_JUMP_IF_NOT_FALSE end
+        elif1:  <relexpr>
+                POP_JUMP_IF_NOT_TRUE else
+                <codeblock>
+                JUMP_ABSOLUTE       end
+        else:   <codeblock>
+        end:
+
+        The same rules as pyparser.ifstmt(): "if" tests its condition for truthiness, "elif" with "is True", and the "elif"s and the "else" only run when the condition of the "if" is False.
+        A falsy condition that is not False, such as 0 or None, runs none of the branches, which is what next is for.
+        Without "elif" and "else" the condition is simply popped with POP_JUMP_IF_FALSE end.
+        """
+        exitjumps = []
+        self.consume(PYIF)
+        self.relexpr()
+        self.consume(COLON)
+        if_next = self.emit(JUMP_IF_FALSE_OR_POP)
+        self.codeblock()
+        if self.token.category not in (PYELIF, PYELSE):
+            # Nothing to choose between, a falsy condition of any kind skips the block
+            self.code.co_code[if_next] = POP_JUMP_IF_FALSE
+            self.patch(if_next, len(self.code.co_code))
+            return
+        exitjumps.append(self.emit(JUMP_ABSOLUTE))
+        self.patch(if_next, len(self.code.co_code))
+        exitjumps.append(self.emit(POP_JUMP_IF_NOT_FALSE))
+        jump_next = None
+        while self.token.category == PYELIF:
+            if jump_next is not None:
+                exitjumps.append(self.emit(JUMP_ABSOLUTE))
+                self.patch(jump_next, len(self.code.co_code))
+            self.advance()
+            self.relexpr()
+            self.consume(COLON)
+            jump_next = self.emit(POP_JUMP_IF_NOT_TRUE)
+            self.codeblock()
+        if self.token.category == PYELSE:
+            if jump_next is not None:
+                exitjumps.append(self.emit(JUMP_ABSOLUTE))
+                self.patch(jump_next, len(self.code.co_code))
+            self.advance()
+            self.consume(COLON)
+            self.codeblock()
+        elif jump_next is not None:
+            self.patch(jump_next, len(self.code.co_code))
+        for pc in exitjumps:
+            self.patch(pc, len(self.code.co_code))
+
+    def whilestmt(self):
+        # <whilestmt>       -> 'while' <relexpr> ':' <codeblock>
+        """
+        Compiles into:
+
+        start:  <relexpr>
+                POP_JUMP_IF_NOT_TRUE end
+                <codeblock>
+                JUMP_ABSOLUTE       start
+        end:
+
+        Every "break" in the <codeblock> is a JUMP_ABSOLUTE to end.
+        """
+        index_while = self.tokenindex
+        self.consume(PYWHILE)
+        start = len(self.code.co_code)
+        self.relexpr()
+        self.consume(COLON)
+        jump_end = self.emit(POP_JUMP_IF_NOT_TRUE, tokenindex=index_while)
+        self.breaklist.append([])
+        self.codeblock()
+        self.emit(JUMP_ABSOLUTE, start, index_while)
+        end = len(self.code.co_code)
+        self.patch(jump_end, end)
+        for pc in self.breaklist.pop():
+            self.patch(pc, end)
+
+    def defstmt(self):
+        # <defstmt>         -> 'def' NAME '(' [NAME (, NAME)*] ')'':' <codeblock>
+        """
+        The function body is compiled into its own code object, which is stored as a constant of the enclosing code.
+        MAKE_FUNCTION registers it in the global symbol table when the "def" is executed, same as pyparser.defstmt()
+        """
+        index_def = self.tokenindex
+        self.advance()
+        if self.token.category != NAME:
+            raise RuntimeError(f"Expecting NAME but get {catnames[self.token.category]}")
+        function_name = self.token.lexeme
+        self.advance()
+
+        # Parameter names
+        function_parameters = []
+        self.consume(LEFTPAREN)
+        while self.token.category != RIGHTPAREN:
+            if self.token.category != NAME:
+                raise RuntimeError(f"Expecting COMMA and NAME but get {catnames[self.token.category]}")
+            function_parameters.append(self.token.lexeme)
+            self.advance()
+            if self.token.category == COMMA:
+                self.advance()
+                if self.token.category != NAME:
+                    raise RuntimeError(f"Expecting NAME after COMMA")
+        self.consume(RIGHTPAREN)
+        self.consume(COLON)
+
+        # Compile the body into a fresh code object, break cannot jump out of a function
+        enclosing_code = self.code
+        enclosing_breaklist = self.breaklist
+        self.code = codeobject(function_name, function_parameters, self.tokens)
+        self.breaklist = []
+        self.codeblock()
+        # Falling off the end of a function returns None
+        self.emit(LOAD_CONST, self.constindex(None), index_def)
+        self.emit(RETURN_VALUE, tokenindex=index_def)
+        function_code = self.code
+        self.code = enclosing_code
+        self.breaklist = enclosing_breaklist
+
+        self.emit(MAKE_FUNCTION, self.constindex(function_code), index_def)
+
+    def codeblock(self):
+        # <codeblock>       -> <NEWLINE> 'INDENT' <stmt>+ 'DEDENT'
+        while self.token.category == NEWLINE:
+            self.consume(NEWLINE)
+        self.consume(INDENT)
+        if self.token.category not in stmttokens:
+            raise RuntimeError(f"Expecting a statement but get {catnames[self.token.category]}")
+        while self.token.category in stmttokens:
+            self.stmt()
+        self.consume(DEDENT)
+
+    def relexpr(self):
+        # <relexpr>         -> <expr> [ ('<' | '<=' | '==' | '!=' | '>=' | '>') <expr>]*
+        """
+        A single comparison compiles into <expr> <expr> COMPARE_OP.
+        Chained comparisons such as a < b < c keep the right operand for the next comparison and evaluate every operand, as pyparser.relexpr() does:
+
+                <a> <b> DUP_TOP ROT_THREE COMPARE_OP        stack: b, r1
+                ROT_TWO <c> DUP_TOP ROT_THREE COMPARE_OP    stack: r1, c, r2
+                AND_COMPARE                                 stack: c, r1 and r2
+                ...
+                ROT_TWO POP_TOP                             stack: r1 and r2 and ...
+        """
+        self.expr()
+        if self.token.category not in comparisonops:
+            return
+        category_op = self.token.category
+        index_op = self.tokenindex
+        self.advance()
+        self.expr()
+        if self.token.category not in comparisonops:
+            self.emit(COMPARE_OP, category_op, index_op)
+            return
+        # Chained comparison, keep a copy of the right operand under the result
+        self.emit(DUP_TOP, tokenindex=index_op)
+        self.emit(ROT_THREE, tokenindex=index_op)
+        self.emit(COMPARE_OP, category_op, index_op)
+        while self.token.category in comparisonops:
+            category_op = self.token.category
+            index_op = self.tokenindex
+            self.advance()
+            # stack: right, result -> result, right
+            self.emit(ROT_TWO, tokenindex=index_op)
+            self.expr()
+            # stack: result, right, new -> result, new, right, new
+            self.emit(DUP_TOP, tokenindex=index_op)
+            self.emit(ROT_THREE, tokenindex=index_op)
+            self.emit(COMPARE_OP, category_op, index_op)
+            # stack: result, new, newresult -> new, result and newresult
+            self.emit(AND_COMPARE, tokenindex=index_op)
+        # Drop the last right operand
+        self.emit(ROT_TWO, tokenindex=index_op)
+        self.emit(POP_TOP, tokenindex=index_op)
+
+    def expr(self):
+        # <expr>            -> <term> (('+' | '-') <term>)*
+        self.term()
+        while self.token.category in [PLUS, MINUS]:
+            category_op = self.token.category
+            index_op = self.tokenindex
+            self.advance()
+            self.term()
+            self.emitoperator(binaryops[category_op], index_op)
+
+    def term(self):
+        # <term>            -> <factor> (('*' | '/' | '%') <factor>)*
+        self.factor()
+        while self.token.category in [TIMES, DIVISION, MODULO]:
+            category_op = self.token.category
+            index_op = self.tokenindex
+            self.advance()
+            self.factor()
+            self.emitoperator(binaryops[category_op], index_op)
+
+    def factor(self):
+        # <factor>          -> ('+' | '-') <factor>
+        # <factor>          -> NAME
+        # <factor>          -> <functioncallstmt>
+        # <factor>          -> INTEGER | FLOAT | STRING | 'True' | 'False' | 'None'
+        # <factor>          -> '(' <relexpr> ')'
+        category = self.token.category
+        if category == PLUS:
+            index_op = self.tokenindex
+            self.advance()
+            self.factor()
+            self.emitoperator(UNARY_POSITIVE, index_op)
+        elif category == MINUS:
+            index_op = self.tokenindex
+            self.advance()
+            self.factor()
+            self.emitoperator(UNARY_NEGATIVE, index_op)
+        elif category == NAME:
+            if self.categories[self.tokenindex + 1] == LEFTPAREN:
+                self.functioncallstmt()
+            else:
+                self.emit(LOAD_NAME, self.nameindex(self.token.lexeme))
+                self.advance()
+        elif category == FLOAT:
+            self.emit(LOAD_CONST, self.constindex(float(self.token.lexeme)))
+            self.advance()
+        elif category == INTEGER:
+            self.emit(LOAD_CONST, self.constindex(int(self.token.lexeme)))
+            self.advance()
+        elif category == STRING:
+            self.emit(LOAD_CONST, self.constindex(self.token.lexeme))
+            self.advance()
+        elif category == PYTRUE:
+            self.emit(LOAD_CONST, self.constindex(True))
+            self.advance()
+        elif category == PYFALSE:
+            self.emit(LOAD_CONST, self.constindex(False))
+            self.advance()
+        elif category == PYNONE:
+            self.emit(LOAD_CONST, self.constindex(None))
+            self.advance()
+        elif category == LEFTPAREN:
+            self.advance()
+            self.relexpr()
+            self.consume(RIGHTPAREN)
+        else:
+            raise RuntimeError("Expecting a valid expression.")
+
+    def dump(self):
+        # In output, show '\n' for newline
+        lexeme = self.token.lexeme.replace('\n', '\\n')
+        print(f"\nError on '{lexeme}' ' line {str(self.token.line)} ' column {str(self.token.column)}'")
+        # Show the line with a caret pointing to the token
+        sourcesplit = self.source.split('\n')
+        print(sourcesplit[self.token.line - 1])
+        print(' ' * (self.token.column - 1) + '^')
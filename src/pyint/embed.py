@@ -0,0 +1,109 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                            embed                            #
+#                                                             #
+#-------------------------------------------------------------#
+
+# Running pyint programs from Python, for a service that runs many small scripts without starting main.py for each:
+#     sys.path.insert(0, 'src/pyint')
+#     from embed import Interpreter
+#     interpreter = Interpreter()
+#     program = interpreter.compile("x = n * 2\nprint(x)\n")
+#     result = interpreter.run(program, globals={'n': 21})
+#     result.output, result.globals        # '42 \n', {'n': 21, 'x': 42}
+# Errors in the script, when it is compiled or when it runs, are raised as the RuntimeError of the engine. Nothing is printed and nothing calls sys.exit().
+
+import io
+from tokenizer import tokenizer
+from pyparser import pyparser
+from compiler import compiler, codeobject
+from vm import vm
+from output import outputbuffer, EXIT
+from pyheader import MAXCALLDEPTH, MAXVMCALLDEPTH
+
+ENGINES = ('vm', 'pyparser')
+# Types of the values a script can be given as globals
+GLOBALTYPES = (int, float, str, bool, type(None))
+
+class program:
+    """A compiled pyint program, returned by Interpreter.compile() and run as many times as needed by Interpreter.run().
+    With the vm engine it holds the code object, with the pyparser engine a prepared pyparser bound to the tokens, which is reset before each run.
+    """
+    __slots__ = ('source', 'engine', 'code', 'parser')
+
+    def __init__(self, source:str, engine:str, code:codeobject=None, parser:pyparser=None):
+        self.source = source
+        self.engine = engine
+        self.code = code
+        self.parser = parser
+
+class result:
+    """What a run left: the text the script printed, and its global variables"""
+    __slots__ = ('output', 'globals')
+
+    def __init__(self, output:str, globals:dict):
+        self.output = output
+        self.globals = globals
+
+class Interpreter:
+    """Compiles and runs pyint programs in the calling process.
+
+    The engines are built once and kept: one vm for all the programs of the vm engine, one pyparser per program for the pyparser engine.
+    Between runs they are reset, which clears their symbol tables, stacks and flags but keeps what was worked out once, the prepared tokens of a pyparser or the frames it recycles.
+    The output of the script is kept in memory, see outputbuffer.
+    """
+    def __init__(self, engine:str='vm', maxcalldepth:int=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine}, expecting one of {', '.join(ENGINES)}")
+        self.engine = engine
+        if maxcalldepth is None:
+            maxcalldepth = MAXVMCALLDEPTH if engine == 'vm' else MAXCALLDEPTH
+        self.maxcalldepth = maxcalldepth
+        self.output = outputbuffer(policy=EXIT, sink=io.BytesIO())
+        self.vm = vm(code=None, source='', maxcalldepth=maxcalldepth, output=self.output) if engine == 'vm' else None
+
+    def compile(self, source:str):
+        """Tokenize source and compile it for the engine, raises RuntimeError on a syntax error.
+        The token interpreter only parses a statement when it runs it, so for the pyparser engine the tokens are also compiled once as a check of the whole program, and the code is thrown away.
+        """
+        if len(source) == 0 or source[-1] != '\n':
+            source = source + '\n'
+        tokenlist = []
+        tokenizer(source=source, tokenlist=tokenlist, fast=True, stripcomments=True).run()
+        code = compiler(tokenlist=tokenlist, source=source).compile()
+        if self.engine == 'vm':
+            return program(source, self.engine, code=code)
+        parser = pyparser(tokenlist=tokenlist, source=source, maxcalldepth=self.maxcalldepth, output=self.output)
+        parser.prepare()
+        return program(source, self.engine, parser=parser)
+
+    def run(self, compiled:program, globals:dict=None):
+        """Run a compiled program with globals as its initial global variables, and return a result.
+        globals is not changed, the script works on a copy of it.
+        """
+        if compiled.engine != self.engine:
+            raise ValueError(f"Program was compiled for the {compiled.engine} engine, this interpreter runs {self.engine}")
+        initial = {} if globals is None else dict(globals)
+        for name, value in initial.items():
+            if not isinstance(value, GLOBALTYPES):
+                raise RuntimeError(f"Global {name} is a {type(value).__name__}, pyint only has int, float, str, bool and None")
+        self.output.clear()
+        if self.engine == 'vm':
+            engine = self.vm
+            engine.reset()
+            engine.code = compiled.code
+            engine.source = compiled.source
+            engine.globalsymboltable.update(initial)
+            engine.run()
+            # Functions are code objects in the same table
+            variables = {name: value for name, value in engine.globalsymboltable.items() if not isinstance(value, codeobject)}
+        else:
+            engine = compiled.parser
+            # The program may have been compiled by another Interpreter, print into the output and keep to the limit of this one
+            engine.output = self.output
+            engine.maxcalldepth = self.maxcalldepth
+            engine.reset()
+            engine.globalsymboltable.update(initial)
+            engine.execute()
+            variables = dict(engine.globalsymboltable)
+        return result(self.output.getvalue(), variables)
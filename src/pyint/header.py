@@ -1,4 +1,7 @@
 class Token:
+    # No per-instance __dict__, scripts easily produce hundreds of thousands of tokens
+    __slots__ = ('line', 'column', 'category', 'lexeme')
+
     def __init__(self, line, column, category, lexeme) -> None:
         self.line = line
         self.column = column
@@ -157,6 +160,7 @@ line = 0                # current line number
 column = 0              # current column number
 tokenlist = []          # list of tokens to be consumed by parser
 tokenindex = 0
+indenttable = {}        # INDENT token index -> matching DEDENT token index, see matchindent()
 prevchar = '\n'         # '\n' in prevchar signals start of new line
 blankline = True        # Set to False if line is not blank
 
@@ -4,6 +4,9 @@ from header import *
 from type import is_operatable
 
 class Token:
+    # No per-instance __dict__, scripts easily produce hundreds of thousands of tokens
+    __slots__ = ('line', 'column', 'category', 'lexeme')
+
     def __init__(self, line, column, category, lexeme) -> None:
         self.line = line
         self.column = column
@@ -826,23 +829,9 @@ def ifstmt():
         if flagbreak is True:
             return
     else:
-        # Skip over until all pairs of INDENT-DEDENT are passed
+        # Skip over the whole INDENT-DEDENT block
         # codeblock() runs pass the indent-dedent block, but if we choose not to execute codeblock(), we need to implement this functionality by our own
-        indent_tracker = 0
-        indent_start = False
-        while True:
-            if token.category == INDENT:
-                indent_tracker += 1
-                indent_start = True
-            elif token.category == DEDENT:
-                indent_tracker -= 1
-            if indent_tracker == 0 and indent_start is True:
-                # We got all those indent-dedent pairs
-                # Next token should be a statement or something close
-                # Don't forget to advance() from the DEDENT
-                advance()
-                break
-            advance()
+        skipblock()
     # Now that we skipped the codeblock of "if", we should expect either "else" or "elif", or something else which means that the "if" has no "else" nor "elif". We can also have multiple "elif"s so a loop is good for this kind of stuffs (or recursively function call)
     # Hacky way to tell the "else" block that some "elif" got executed
     elif_executed = False
@@ -862,23 +851,9 @@ def ifstmt():
             if flagbreak is True:
                 return
         else:
-            # Skip over until all pairs of INDENT-DEDENT are passed
+            # Skip over the whole INDENT-DEDENT block
             # codeblock() runs pass the indent-dedent block, but if we choose not to execute codeblock(), we need to implement this functionality by our own
-            indent_tracker = 0
-            indent_start = False
-            while True:
-                if token.category == INDENT:
-                    indent_tracker += 1
-                    indent_start = True
-                elif token.category == DEDENT:
-                    indent_tracker -= 1
-                if indent_tracker == 0 and indent_start is True:
-                    # We got all those indent-dedent pairs
-                    # Next token should be a statement or something close
-                    # Don't forget to advance() from the DEDENT
-                    advance()
-                    break
-                advance()
+            skipblock()
     if token.category == PYELSE:
         advance()
         consume(COLON)
@@ -887,21 +862,7 @@ def ifstmt():
             codeblock()
         else:
             # codeblock() runs pass the indent-dedent block, but if we choose not to execute codeblock(), we need to implement this functionality by our own
-            indent_tracker = 0
-            indent_start = False
-            while True:
-                if token.category == INDENT:
-                    indent_tracker += 1
-                    indent_start = True
-                elif token.category == DEDENT:
-                    indent_tracker -= 1
-                if indent_tracker == 0 and indent_start is True:
-                    # We got all those indent-dedent pairs
-                    # Next token should be a statement or something close
-                    # Don't forget to advance() from the DEDENT
-                    advance()
-                    break
-                advance()
+            skipblock()
 
 def whilestmt():
     # <whilestmt>       -> 'while' <relexpr> ':' <codeblock>
@@ -951,24 +912,11 @@ def whilestmt():
                 token = tokenlist[tokenindex]
         else:
             # as in if, we need to skip the indent-dedent block
-            indent_tracker = 0
-            indent_start = False
-            while True:
-                if token.category == INDENT:
-                    indent_tracker += 1
-                    indent_start = True
-                elif token.category == DEDENT:
-                    indent_tracker -= 1
-                if indent_tracker == 0 and indent_start is True:
-                    # We got all those indent-dedent pairs
-                    # Next token should be a statement or something close
-                    # Don't forget to advance() from the DEDENT
-                    advance()
-                    # return instead of break as we are inside of double while loop
-                    # Don't forget to pop the indentloop stack as no "break" is run
-                    indentloop.pop()
-                    return
-                advance()
+            skipblock()
+            # return instead of break as we are inside of double while loop
+            # Don't forget to pop the indentloop stack as no "break" is run
+            indentloop.pop()
+            return
 
 def defstmt():
     # <defstmt>         -> 'def' NAME '(' [NAME (, NAME)*] ')'':' <codeblock>
@@ -1023,14 +971,7 @@ def defstmt():
             globalsymboltable[function_name]["entry"] = tokenindex
             break
     # Skip the rest of the function
-    while True:
-        token_col = token.column
-        token_cat = token.category
-        # TODO: Need to de-hardcode token_col == 1 if we want to allow multiple layers of function definition (def within a def)
-        if token_col == 1 and token_cat not in [INDENT, DEDENT]:
-            break
-        else:
-            advance()
+    skipblock()
 
 def codeblock():
     # <codeblock>       -> <NEWLINE> 'INDENT' <stmt>+ 'DEDENT'
@@ -1266,6 +1207,33 @@ def factor():
     else:
         raise RuntimeError("Expecting a valid expression.")
 
+def matchindent():
+    """Pair every INDENT with its DEDENT, once, before parsing starts.
+    indenttable maps the index of each INDENT token to the index of its matching DEDENT token, so that a block we decide not to execute can be skipped with a single jump instead of counting INDENT-DEDENT pairs token by token.
+    """
+    indenttable.clear()
+    indentstack = []
+    for index, token in enumerate(tokenlist):
+        if token.category == INDENT:
+            indentstack.append(index)
+        elif token.category == DEDENT:
+            if len(indentstack) == 0:
+                raise RuntimeError(f"DEDENT on line {token.line} has no matching INDENT")
+            indenttable[indentstack.pop()] = index
+    if len(indentstack) != 0:
+        raise RuntimeError(f"INDENT on line {tokenlist[indentstack[-1]].line} has no matching DEDENT")
+
+def skipblock():
+    """Skip a whole <codeblock> without executing it.
+    Leading NEWLINEs are passed over, then we jump straight to the DEDENT matching the INDENT and advance() from it.
+    """
+    global token, tokenindex
+    while token.category != INDENT:
+        advance()
+    tokenindex = indenttable[tokenindex]
+    # Don't forget to advance() from the DEDENT
+    advance()
+
 def advance():
     """Advance the reading of a token from tokenlist.
     The variable "token" always contain the current token
@@ -1329,6 +1297,7 @@ def main():
         if only_tokenizer == True:
             exit()
         removecomment()
+        matchindent()
         parser()
     except RuntimeError as emsg:
         # In output, show '\n' for newline
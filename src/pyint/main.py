@@ -1,6 +1,19 @@
 import sys
+import os
+import argparse
 from tokenizer import tokenizer
 from pyparser import pyparser
+from compiler import compiler
+from vm import vm
+from tokenbuffer import tokenbuffer
+from tokenstream import tokenstream
+from mappedsource import mappedsource
+from cache import sourcecache
+from stats import phasestats, statspyparser
+from profiler import profilingpyparser, countingpyparser, sampler
+from output import outputbuffer, FLUSHPOLICIES, LINE, SIZE
+from hooks import EVENTS, tracehooks, tracesink, tracewriter, tracingpyparser
+from pyheader import MAXCALLDEPTH, MAXVMCALLDEPTH
 
 # Control switches
 only_tokenizer = False
@@ -9,37 +22,178 @@ def main():
     source = ''
     tokenlist = []
 
-    if len(sys.argv) == 2:
-        try:
-            infile = open(sys.argv[1], 'r')
-            source = infile.read()
-        except IOError:
-            print(f'Failed to read input file {sys.argv[1]}')
-            sys.exit(1)
-    else:
-        print('Wrong number of command line arguments')
-        print('Usage: python3 interpreter.py <infile>')
+    argparser = argparse.ArgumentParser(description='pyint interpreter')
+    argparser.add_argument('infile', help='pyint source file')
+    argparser.add_argument('--vm', action='store_true', help='compile to bytecode and run it on the stack VM instead of interpreting the tokens')
+    argparser.add_argument('--columnar', action='store_true', help='store tokens in a compact columnar tokenbuffer instead of a list of Token objects, the parsers read categories, columns and lexemes straight from its arrays')
+    argparser.add_argument('--fast', action='store_true', help='tokenize with the regex scanner, which produces the same tokens as the default character by character scanner')
+    argparser.add_argument('--stream', action='store_true', help='read and tokenize the input lazily in chunks, compiling and running one top level statement at a time on the stack VM')
+    argparser.add_argument('--mmap', action='store_true', help='memory-map the input file instead of reading it into one string, the tokenizer decodes it a window of lines at a time')
+    argparser.add_argument('--cache', action='store_true', help='reuse the tokens of an unchanged source from a cache directory (not with --stream)')
+    argparser.add_argument('--cachedir', help='directory of --cache, by default __pyintcache__ next to the source file')
+    argparser.add_argument('--maxdepth', type=int, help=f'maximum depth of nested function calls in the script, default {MAXCALLDEPTH}, or {MAXVMCALLDEPTH} with --vm as the VM does not recurse in Python')
+    argparser.add_argument('--stats', action='store_true', help='report the wall time of every phase and counters of the run on stderr')
+    argparser.add_argument('--statsmemory', action='store_true', help='--stats with the peak memory of every phase as well, which slows the run down')
+    argparser.add_argument('--profile', metavar='PREFIX', help='sample the pyint call stack while the token interpreter runs, write a flat report per function and source line to PREFIX.txt and the stacks in collapsed format to PREFIX.collapsed')
+    argparser.add_argument('--profileinterval', type=float, default=5.0, help='milliseconds between two samples of --profile, default 5')
+    argparser.add_argument('--profilecounts', action='store_true', help='--profile also counts the statements executed on every source line, which slows the run down')
+    argparser.add_argument('--outfile', help='write what the script prints to this file instead of stdout')
+    argparser.add_argument('--flush', choices=FLUSHPOLICIES, help='when to write the output of the script: at the end of every print statement (line), once --buffersize characters are waiting (size) or only at the end of the run (exit). Default line on a terminal, size otherwise')
+    argparser.add_argument('--buffersize', type=int, default=65536, help='characters of output kept before they are written with --flush size, default 65536')
+    argparser.add_argument('--trace', metavar='EVENTS', help=f"write a line per event to stderr, or to --tracefile, for a comma separated list of events out of {', '.join(EVENTS)}. Tokens loaded from --cache are not traced, statement, call and branch need the token interpreter")
+    argparser.add_argument('--tracefile', help='file to write the events of --trace to instead of stderr')
+    args = argparser.parse_args()
+    traceevents = [] if args.trace is None else [event.strip() for event in args.trace.split(',')]
+    for event in traceevents:
+        if event not in EVENTS:
+            argparser.error(f"unknown --trace event {event}, expecting {', '.join(EVENTS)}")
+    if any(event != 'token' for event in traceevents) and (args.vm is True or args.stream is True):
+        argparser.error('--trace statement, call and branch trace the token interpreter, they cannot be combined with --vm or --stream')
+    if args.profile is not None and (args.vm is True or args.stream is True):
+        argparser.error('--profile profiles the token interpreter, it cannot be combined with --vm or --stream')
+    if args.maxdepth is None:
+        args.maxdepth = MAXVMCALLDEPTH if args.vm is True or args.stream is True else MAXCALLDEPTH
+
+    if args.columnar is True:
+        tokenlist = tokenbuffer()
+
+    try:
+        sink = open(args.outfile, 'wb') if args.outfile is not None else None
+    except IOError:
+        print(f'Failed to open output file {args.outfile}')
+        sys.exit(1)
+    policy = args.flush if args.flush is not None else LINE if args.outfile is None and sys.stdout.isatty() else SIZE
+    output = outputbuffer(policy=policy, buffersize=args.buffersize, sink=sink)
+
+    hooks = None
+    traceoutput = None
+    if len(traceevents) > 0:
+        hooks = tracehooks()
+        traceoutput = tracesink(args.tracefile)
+        tracewriter(traceoutput).register(hooks, traceevents)
+
+    try:
+        if args.mmap is True:
+            # Parsers only need the source for error messages, which read their line back from the mapping
+            infile = mappedsource(args.infile)
+            source = infile
+        else:
+            infile = open(args.infile, 'r')
+            if args.stream is False:
+                source = infile.read()
+    except IOError:
+        print(f'Failed to read input file {args.infile}')
         sys.exit(1)
 
-    # Add newline to end if missing TODO: Why does the last line need a newline?
-    # (probably because the parser needs a newline to properly identify one line)
-    if source[-1] != '\n':
-        source = source + '\n'
+    if args.stream is True or args.mmap is True:
+        # The tokenizer reads infile in chunks, as the compiler pulls tokens or as run() goes
+        T = tokenizer(source='', tokenlist=tokenlist, fast=args.fast, infile=infile, hooks=hooks)
+    else:
+        # Add newline to end if missing TODO: Why does the last line need a newline?
+        # (probably because the parser needs a newline to properly identify one line)
+        if source[-1] != '\n':
+            source = source + '\n'
+        T = tokenizer(source=source, tokenlist=tokenlist, fast=args.fast, hooks=hooks)
+    P = None
+
+    stats = phasestats(memory=args.statsmemory) if args.stats is True or args.statsmemory is True else None
+    # Number of tokens from the tokenizer, and left after removecomment(), and the pyparser or vm that ran the script, for --stats
+    tokencounts = [None, None]
+    executor = None
+
+    def phase(name:str, function, *args):
+        if stats is None:
+            return function(*args)
+        return stats.run(name, function, *args)
 
-    T = tokenizer(source=source, tokenlist=tokenlist)
+    cache = None
+    if args.cache is True and args.stream is False:
+        directory = args.cachedir if args.cachedir is not None else os.path.join(os.path.dirname(os.path.abspath(args.infile)), '__pyintcache__')
+        cache = sourcecache(directory, infile.map if args.mmap is True else source.encode('utf-8'))
 
     try:
-        T.run()
-        if only_tokenizer == True:
-            exit()
-        T.traceall()
-        T.removecomment()
-        P = pyparser(tokenlist=tokenlist, source=source)
-        P.parse()
+        if args.stream is True:
+            C = compiler(tokenlist=tokenstream(T.nexttoken()), source=source)
+            V = vm(code=None, source=source, maxcalldepth=args.maxdepth, output=output)
+            executor = V
+            P = C
+            def stream():
+                nonlocal P
+                for code in C.compilestream():
+                    P = V
+                    V.code = code
+                    V.run()
+                    P = C
+            # Tokenizing, compiling and executing take turns, so they are timed as one
+            phase('stream', stream)
+            return
+
+        payload = None if cache is None else phase('load cache', cache.load, 'tokens')
+        if payload is not None:
+            # Same source and same interpreter version, skip the tokenizer
+            cached = tokenbuffer()
+            cached.frombytes(payload)
+            tokenlist = cached if args.columnar is True else cached.tolist()
+        else:
+            phase('tokenize', T.run)
+            tokencounts[0] = len(tokenlist)
+            if only_tokenizer == True:
+                exit()
+            phase('removecomment', T.removecomment)
+            if cache is not None:
+                if args.columnar is True:
+                    cache.store('tokens', tokenlist.tobytes())
+                else:
+                    cached = tokenbuffer()
+                    cached.extend(tokenlist)
+                    cache.store('tokens', cached.tobytes())
+        tokencounts[1] = len(tokenlist)
+        if args.vm is True:
+            P = compiler(tokenlist=tokenlist, source=source)
+            code = phase('compile', P.compile)
+            P = vm(code=code, source=source, maxcalldepth=args.maxdepth, output=output)
+            executor = P
+            phase('execute', P.run)
+        else:
+            # The token interpreter parses and executes in the same pass
+            # --stats, --profile and --trace each work in a subclass of pyparser, several at once in a class derived from them
+            tracing = any(event != 'token' for event in traceevents)
+            parserclasses = ([] if stats is None else [statspyparser]) + ([] if args.profile is None else [countingpyparser if args.profilecounts is True else profilingpyparser]) + ([tracingpyparser] if tracing is True else [])
+            parserclass = pyparser if len(parserclasses) == 0 else parserclasses[0] if len(parserclasses) == 1 else type('pyparser', tuple(parserclasses), {})
+            parserkwargs = {'hooks': hooks} if tracing is True else {}
+            P = parserclass(tokenlist=tokenlist, source=source, maxcalldepth=args.maxdepth, output=output, **parserkwargs)
+            executor = P
+            if args.profile is not None:
+                profile = sampler(P, args.profileinterval / 1000)
+                profile.start()
+            try:
+                phase('parse+execute', P.parse)
+            finally:
+                if args.profile is not None:
+                    profile.stop()
+                    with open(f"{args.profile}.collapsed", 'w') as outfile:
+                        outfile.write(profile.collapsed())
+                    with open(f"{args.profile}.txt", 'w') as outfile:
+                        outfile.write(profile.report(source.split('\n'), P.linecounts if args.profilecounts is True else None))
     except RuntimeError as emsg:
-        T.dump()
-        P.dump()
+        if P is None or T.error is True:
+            T.dump()
+        else:
+            if args.stream is True and args.mmap is False:
+                # Only a window of the source was kept while streaming, read it again for the error message
+                with open(args.infile, 'r') as infile:
+                    P.source = infile.read()
+            P.dump()
         print(emsg)
         sys.exit(1)
+    finally:
+        output.close()
+        if traceoutput is not None:
+            traceoutput.close()
+        if stats is not None:
+            counters = [('tokens produced', tokencounts[0]), ('tokens after removecomment()', tokencounts[1])]
+            if executor is not None:
+                counters += executor.counters()
+            stats.report(counters)
 
-main()
\ No newline at end of file
+main()
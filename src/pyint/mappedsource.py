@@ -0,0 +1,83 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                        mappedsource                         #
+#                                                             #
+#-------------------------------------------------------------#
+import mmap
+from array import array
+
+class mappedsource:
+    """A script file mapped into memory with mmap instead of being read into one big string.
+
+    It stands in for two things:
+        - the infile of a tokenizer: read() decodes the next complete lines of the mapping, so the tokenizer only ever holds a window of the source as str
+        - the source of the parsers and the VM: split('\\n') gives the lines for dump() without a copy of the whole source, each line is decoded from the mapping when asked for
+    Line endings are translated the same way open(path, 'r') does, so tokens, lines and columns come out as if the file was read as text.
+    """
+    def __init__(self, path:str, encoding:str='utf-8'):
+        self.encoding = encoding
+        with open(path, 'rb') as file:
+            try:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # An empty file cannot be mapped
+                self.map = b''
+        # Offset of the next byte read() returns
+        self.position = 0
+        # Offset where every line starts, found by linestarts() the first time a line is asked for
+        self.lineoffsets = None
+
+    def decode(self, start:int, end:int):
+        text = self.map[start:end].decode(self.encoding)
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+    def read(self, size:int):
+        """Decode at least size bytes, up to the end of the line they stop in, so that no character or line is cut in half.
+        Returns '' at the end of the file.
+        """
+        start = self.position
+        if start >= len(self.map):
+            return ''
+        end = self.map.find(b'\n', min(start + size, len(self.map)) - 1)
+        end = len(self.map) if end < 0 else end + 1
+        self.position = end
+        return self.decode(start, end)
+
+    def linestarts(self):
+        """Offsets where the lines start, the last one is the part after the last newline, as for str.split('\\n')"""
+        if self.lineoffsets is None:
+            data = self.map
+            offsets = array('Q', [0])
+            end = data.find(b'\n')
+            while end >= 0:
+                offsets.append(end + 1)
+                end = data.find(b'\n', end + 1)
+            self.lineoffsets = offsets
+        return self.lineoffsets
+
+    def split(self, separator:str):
+        if separator != '\n':
+            raise ValueError("A mappedsource can only be split into lines")
+        return mappedlines(self)
+
+class mappedlines:
+    """lines[index] of a mappedsource, decoded from the mapping when an error message or a report asks for one.
+    The mapping is scanned for newlines once, on the first lookup, see mappedsource.linestarts()
+    """
+    def __init__(self, source:mappedsource):
+        self.source = source
+
+    def __len__(self):
+        return len(self.source.linestarts())
+
+    def __getitem__(self, index:int):
+        offsets = self.source.linestarts()
+        if index < 0:
+            index += len(offsets)
+        if index < 0 or index >= len(offsets):
+            raise IndexError(index)
+        start = offsets[index]
+        end = offsets[index + 1] - 1 if index + 1 < len(offsets) else len(self.source.map)
+        return self.source.decode(start, end).rstrip('\n')
@@ -0,0 +1,92 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                           output                            #
+#                                                             #
+#-------------------------------------------------------------#
+import sys
+import io
+
+# When outputbuffer writes what the script printed:
+#     line    at the end of every print statement, what a terminal needs
+#     size    once buffersize characters are waiting
+#     exit    only when the engine is done running, or when flush() is called
+LINE = 'line'
+SIZE = 'size'
+EXIT = 'exit'
+FLUSHPOLICIES = (LINE, SIZE, EXIT)
+
+class outputbuffer:
+    """Output of the print statements of a script.
+
+    A print statement used to call print() once per item and once more for the newline, which is a write() system call each when stdout is a pipe or a file.
+    The engines hand their text to write() and newline() instead, which only collect it, and flush() joins it into a single write to the sink.
+    The engines flush once more when they are done, so nothing is left behind whatever the policy.
+
+    Without a sink the text is encoded and written to sys.stdout.buffer, looked up on every flush so that a redirected sys.stdout is followed.
+    A sink is any binary file: a file opened with 'wb', or an io.BytesIO to keep the output in memory, see getvalue().
+    """
+    def __init__(self, policy:str=SIZE, buffersize:int=65536, sink=None, encoding:str='utf-8'):
+        if policy not in FLUSHPOLICIES:
+            raise ValueError(f"Unknown flush policy {policy}, expecting one of {', '.join(FLUSHPOLICIES)}")
+        self.policy = policy
+        self.buffersize = buffersize
+        self.sink = sink
+        # Encoding of the text written to a sink, sys.stdout has its own
+        self.encoding = encoding
+        self.parts = []
+        self.size = 0
+        # Number of flushes that wrote something
+        self.flushes = 0
+
+    def write(self, text:str):
+        self.parts.append(text)
+        self.size += len(text)
+
+    def newline(self):
+        """End of a print statement, the only place where the policy is checked"""
+        self.parts.append('\n')
+        self.size += 1
+        if self.policy == LINE or (self.policy == SIZE and self.size >= self.buffersize):
+            self.flush()
+
+    def flush(self):
+        if len(self.parts) == 0:
+            return
+        text = ''.join(self.parts)
+        self.parts.clear()
+        self.size = 0
+        self.flushes += 1
+        if self.sink is not None:
+            self.sink.write(text.encode(self.encoding))
+            return
+        stdout = sys.stdout
+        buffer = getattr(stdout, 'buffer', None)
+        if buffer is None:
+            # A text stream without a binary layer, such as the io.StringIO of contextlib.redirect_stdout
+            stdout.write(text)
+            return
+        # Whatever print() left in the text layer goes first, then the binary layer gets all of the text at once
+        stdout.flush()
+        buffer.write(text.encode(stdout.encoding or self.encoding, stdout.errors or 'strict'))
+        buffer.flush()
+
+    def getvalue(self):
+        """Everything printed so far, for an io.BytesIO sink"""
+        self.flush()
+        if not isinstance(self.sink, io.BytesIO):
+            raise RuntimeError("Only an output kept in memory can be read back")
+        return self.sink.getvalue().decode(self.encoding)
+
+    def clear(self):
+        """Drop what was printed so far, unwritten or kept in an io.BytesIO sink, so that the buffer can take the output of another run"""
+        self.parts.clear()
+        self.size = 0
+        if isinstance(self.sink, io.BytesIO):
+            self.sink.seek(0)
+            self.sink.truncate()
+
+    def close(self):
+        """Flush, and close the sink if it is a file"""
+        self.flush()
+        if self.sink is not None and not isinstance(self.sink, io.BytesIO):
+            self.sink.close()
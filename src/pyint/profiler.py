@@ -0,0 +1,128 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                          profiler                           #
+#                                                             #
+#-------------------------------------------------------------#
+from pyparser import pyparser
+import threading
+import time
+
+# Name of the outermost frame of a stack, the code outside of any function
+MODULENAME = '<module>'
+
+class profilingpyparser(pyparser):
+    """pyparser able to tell its pyint call stack to a sampler
+    """
+    def stack(self):
+        """The pyint call stack, outermost first, as (function name, source line) pairs.
+        Called from the sampler thread while the parser runs, so the frames may change under it: the walk stops at a frame that was released meanwhile, and is bounded by maxcalldepth.
+        """
+        stack = []
+        line = self.token.line
+        frame = self.frame
+        while frame is not None and len(stack) <= self.maxcalldepth:
+            function = frame.function
+            if function is None:
+                break
+            stack.append((function.name, line))
+            # The caller is on the line of the call
+            line = self.tokenlist[frame.returnaddr].line
+            frame = frame.caller
+        stack.append((MODULENAME, line))
+        stack.reverse()
+        return tuple(stack)
+
+class countingpyparser(profilingpyparser):
+    """profilingpyparser also counting how many statements start on every source line.
+    Counting costs a method call per statement, a lot more than sampling, so it is only done when asked for.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Source line -> statements executed on it. Lines are numbered from 1, the EOF token is on the line after the last one
+        self.linecounts = [0] * (self.tokenlist[len(self.tokenlist) - 1].line + 1 if len(self.tokenlist) > 0 else 1)
+
+    def stmt(self):
+        self.linecounts[self.token.line] += 1
+        super().stmt()
+
+class sampler:
+    """Samples the pyint call stack of a running profilingpyparser from a thread of its own, every interval seconds.
+
+    The parser does not know it is being sampled, so the cost for the script is the time the sampler thread holds the GIL to copy the stack, a few microseconds per sample.
+    A sample stands for the wall time since the previous one. Python hands the GIL over every sys.getswitchinterval() seconds (5 ms by default), which bounds how often a sample can actually be taken.
+    """
+    def __init__(self, parser:profilingpyparser, interval:float=0.005):
+        self.parser = parser
+        self.interval = interval
+        # Stack -> [number of samples, seconds]
+        self.samples = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, name='pyint sampler', daemon=True)
+        self.elapsed = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def sample(self):
+        previous = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            try:
+                stack = self.parser.stack()
+            except (AttributeError, IndexError):
+                # Caught the parser before it read its first token, or between two updates of its state
+                continue
+            now = time.perf_counter()
+            entry = self.samples.get(stack)
+            if entry is None:
+                entry = self.samples[stack] = [0, 0.0]
+            entry[0] += 1
+            entry[1] += now - previous
+            previous = now
+
+    def collapsed(self):
+        """The samples in the collapsed stack format of flamegraph.pl, speedscope and similar tools: one line per stack, frames outermost first separated by ';', and its number of samples"""
+        lines = []
+        for stack, (count, _) in sorted(self.samples.items()):
+            lines.append(';'.join(f"{name}:{line}" for name, line in stack) + f" {count}")
+        return '\n'.join(lines) + '\n'
+
+    def report(self, sourcelines, linecounts:list=None):
+        """Flat report: time per function and per source line, self time where the line or function was running, total time where it was anywhere on the stack, and how many statements started on each line if they were counted"""
+        sampled = sum(seconds for _, seconds in self.samples.values())
+        functions = {}
+        lines = {}
+        for stack, (_, seconds) in self.samples.items():
+            for position, (name, line) in enumerate(stack):
+                leaf = position == len(stack) - 1
+                # Recursion puts a function or a line on the stack more than once, its total time is only counted once per sample
+                for key, table in [(name, functions), (line, lines)]:
+                    entry = table.setdefault(key, [0.0, 0.0, None])
+                    if entry[2] is not stack:
+                        entry[1] += seconds
+                        entry[2] = stack
+                    if leaf is True:
+                        entry[0] += seconds
+
+        def percent(seconds:float):
+            return 100 * seconds / sampled if sampled > 0 else 0.0
+
+        output = [f"Wall time {self.elapsed * 1000:.1f} ms, {sum(count for count, _ in self.samples.values())} samples every {self.interval * 1000:.1f} ms covering {sampled * 1000:.1f} ms", '']
+        output.append(f"{'self ms':>10}{'self %':>8}{'total ms':>10}{'total %':>9}  function")
+        for name, (selftime, totaltime, _) in sorted(functions.items(), key=lambda item: -item[1][0]):
+            output.append(f"{selftime * 1000:10.1f}{percent(selftime):8.1f}{totaltime * 1000:10.1f}{percent(totaltime):9.1f}  {name}")
+        output.append('')
+        output.append(f"{'self ms':>10}{'self %':>8}{'total ms':>10}{'total %':>9}{'count':>10}{'line':>7}  source")
+        for line, (selftime, totaltime, _) in sorted(lines.items(), key=lambda item: -item[1][0]):
+            count = '-' if linecounts is None else linecounts[line] if line < len(linecounts) else 0
+            output.append(f"{selftime * 1000:10.1f}{percent(selftime):8.1f}{totaltime * 1000:10.1f}{percent(totaltime):9.1f}{count:>10}{line:7}  {sourcelines[line - 1].strip()}")
+        # Lines that ran without ever being caught by a sample
+        for line, count in enumerate([] if linecounts is None else linecounts):
+            if count > 0 and line not in lines:
+                output.append(f"{0.0:10.1f}{0.0:8.1f}{0.0:10.1f}{0.0:9.1f}{count:10}{line:7}  {sourcelines[line - 1].strip()}")
+        return '\n'.join(output) + '\n'
@@ -1,10 +1,22 @@
 class Token:
+    # No per-instance __dict__, scripts easily produce hundreds of thousands of tokens
+    __slots__ = ('line', 'column', 'category', 'lexeme')
+
     def __init__(self, line, column, category, lexeme) -> None:
         self.line = line
         self.column = column
         self.category = category
         self.lexeme = lexeme
 
+# Version of the front end. Cached tokens and trees (see cache.py) are only reused by the same version, so bump it whenever the tokenizer, the parser or what they produce changes
+VERSION             = '1.0'
+
+# Default limits on nested function calls, deeper recursion in a script raises a RuntimeError
+# pyparser.py recurses in Python for every call, vm.py keeps its calls on a stack of its own and can go much deeper
+# The VM default leaves room for 100k-deep recursion while a runaway one fails within a second or so, --maxdepth raises it
+MAXCALLDEPTH        = 1000
+MAXVMCALLDEPTH      = 200000
+
 # Category constants
 EOF                 = 0
 PRINT               = 1
@@ -140,4 +152,75 @@ smalltokens = {
     '':     EOF
 }
 
-stmttokens = [PYIF, PYWHILE, PRINT, PYPASS, NAME, BREAK, DEF, RETURN, GLOBAL]
\ No newline at end of file
+stmttokens = [PYIF, PYWHILE, PRINT, PYPASS, NAME, BREAK, DEF, RETURN, GLOBAL]
+
+# Bytecode opcodes, numbered after CPython's where there is a counterpart (see book/h1shell.py)
+# Every instruction is an (opcode, argument) pair in co_code, opcodes that need no argument carry 0
+POP_TOP             = 1
+ROT_TWO             = 2
+ROT_THREE           = 3
+DUP_TOP             = 4
+UNARY_POSITIVE      = 10
+UNARY_NEGATIVE      = 11
+BINARY_MULTIPLY     = 20
+BINARY_MODULO       = 22
+BINARY_ADD          = 23
+BINARY_SUBTRACT     = 24
+BINARY_TRUE_DIVIDE  = 27
+INPLACE_ADD         = 55
+INPLACE_SUBTRACT    = 56
+INPLACE_MULTIPLY    = 57
+INPLACE_TRUE_DIVIDE = 29
+PRINT_ITEM          = 71
+PRINT_NEWLINE       = 72
+RETURN_VALUE        = 83
+STORE_NAME          = 90    # argument is an index into co_names
+LOAD_CONST          = 100   # argument is an index into co_consts
+LOAD_NAME           = 101   # argument is an index into co_names
+COMPARE_OP          = 107   # argument is the token category of the comparison
+JUMP_IF_FALSE_OR_POP= 111   # jumps if top of stack is falsy and keeps it, pops it otherwise
+JUMP_ABSOLUTE       = 113   # argument is an index into co_code
+POP_JUMP_IF_FALSE   = 114   # jumps if top of stack is falsy, as in "if condition:"
+POP_JUMP_IF_NOT_TRUE= 115   # jumps unless top of stack is True, as in "if condition is True:"
+LOAD_FUNCTION       = 116   # argument is an index into co_names
+CALL_FUNCTION       = 131   # argument is the number of arguments on the stack
+MAKE_FUNCTION       = 132   # argument is an index into co_consts holding the function's code object
+DECLARE_GLOBAL      = 133   # argument is an index into co_names
+AND_COMPARE         = 134   # combines two results of a chained comparison
+POP_JUMP_IF_NOT_FALSE= 135  # jumps unless top of stack is False, as in "if condition is False:"
+
+# Displayable names for each opcode
+opnames = {
+    1:  'POP_TOP',
+    2:  'ROT_TWO',
+    3:  'ROT_THREE',
+    4:  'DUP_TOP',
+    10: 'UNARY_POSITIVE',
+    11: 'UNARY_NEGATIVE',
+    20: 'BINARY_MULTIPLY',
+    22: 'BINARY_MODULO',
+    23: 'BINARY_ADD',
+    24: 'BINARY_SUBTRACT',
+    27: 'BINARY_TRUE_DIVIDE',
+    29: 'INPLACE_TRUE_DIVIDE',
+    55: 'INPLACE_ADD',
+    56: 'INPLACE_SUBTRACT',
+    57: 'INPLACE_MULTIPLY',
+    71: 'PRINT_ITEM',
+    72: 'PRINT_NEWLINE',
+    83: 'RETURN_VALUE',
+    90: 'STORE_NAME',
+    100:'LOAD_CONST',
+    101:'LOAD_NAME',
+    107:'COMPARE_OP',
+    111:'JUMP_IF_FALSE_OR_POP',
+    113:'JUMP_ABSOLUTE',
+    114:'POP_JUMP_IF_FALSE',
+    115:'POP_JUMP_IF_NOT_TRUE',
+    116:'LOAD_FUNCTION',
+    131:'CALL_FUNCTION',
+    132:'MAKE_FUNCTION',
+    133:'DECLARE_GLOBAL',
+    134:'AND_COMPARE',
+    135:'POP_JUMP_IF_NOT_FALSE',
+}
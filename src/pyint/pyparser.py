@@ -77,30 +77,114 @@ while a < b:
 ###############################################################
 
 from pyheader import *
-from type import is_operatable
+from type import dispatch
+from tokenbuffer import tokenbuffer
+from output import outputbuffer
+from array import array
+import sys
+
+# Value of a frame slot whose local variable has not been assigned yet
+unbound = object()
+
+# Token categories an <expr> or a <term> may consist of to be folded into a constant, see fold()
+# Comparisons are left out as a failed == or != leaves an extra value on the operand stack, names and calls as their value can change
+constantcategories = {INTEGER, FLOAT, STRING, PYTRUE, PYFALSE, PYNONE, PLUS, MINUS, TIMES, DIVISION, MODULO, LEFTPAREN, RIGHTPAREN}
+
+# Superinstructions, loop idioms run as one fused operation instead of through the whole chain of parser methods, see findsuperinstructions()
+FUSEDINCREMENT  = 0     # NAME ('+=' | '-=') number NEWLINE, e.g. i += 1
+FUSEDACCUMULATE = 1     # NAME '=' NAME ('+' | '-') (NAME | number) NEWLINE with the same name on both sides, e.g. x = x + y
+FUSEDCOMPARE    = 2     # NAME <comparison> (NAME | number) ':' as the condition of a while, if or elif, e.g. while i < n:
+comparisoncategories = {LESSTHAN, LESSEQUAL, EQUAL, NOTEQUAL, GREATEREQUAL, GREATERTHAN}
+
+class functionentry:
+    """Entry of the function table, everything a call needs, resolved once by defstmt()
+    """
+    __slots__ = ('name', 'parameters', 'arity', 'entry', 'end', 'parameterslots', 'localcount', 'emptylocals')
+
+    def __init__(self, name:str, parameters:list, entry:int, end:int):
+        self.name = name
+        self.parameters = parameters
+        self.arity = len(parameters)
+        # Token index of the INDENT that starts the body, and of the DEDENT that ends it
+        self.entry = entry
+        self.end = end
+        # Frame layout, filled in by pyparser.resolvelocals()
+        self.parameterslots = []
+        self.localcount = 0
+        # Frame content before the arguments are bound, copied into the locals of every call
+        self.emptylocals = ()
+
+class callframe:
+    """Everything a function call keeps while it runs: its locals, the names it declared global and where to return to.
+    Frames are linked to the frame of their caller, and recycled through pyparser.framepool once the call returns.
+    """
+    __slots__ = ('function', 'locals', 'globalvardeclared', 'returnaddr', 'caller')
+
+    def __init__(self):
+        self.function = None
+        self.locals = []
+        self.globalvardeclared = set()
+        self.returnaddr = 0
+        self.caller = None
 
 class pyparser:
-    def __init__(self, tokenlist:list, source:str):
+    def __init__(self, tokenlist:list, source:str, maxcalldepth:int=MAXCALLDEPTH, output:outputbuffer=None):
         self.tokenlist = tokenlist
         self.source = source
+        # Where print statements write, flushed by parse() when it is done
+        self.output = output if output is not None else outputbuffer()
         self.trace = False
-        self.token = None
         self.tokenindex = 0
+        # Categories, columns and lexemes of all tokens, read by index without building Token objects, see token. A tokenbuffer already stores them in arrays
+        # The lexeme of token index is lexemetable[lexemes[index]], for a list lexemes maps every index to itself
+        if isinstance(tokenlist, tokenbuffer):
+            self.categories = tokenlist.categories
+            self.columns = tokenlist.columns
+            self.lexemes = tokenlist.lexemes
+            self.lexemetable = tokenlist.lexemetable
+        else:
+            self.categories = [token.category for token in tokenlist]
+            self.columns = [token.column for token in tokenlist]
+            self.lexemes = range(len(tokenlist))
+            self.lexemetable = [token.lexeme for token in tokenlist]
         self.operandstack = []
+        # INDENT token index -> matching DEDENT token index, see matchindent()
+        self.indenttable = {}
+        # Token index of an INTEGER or FLOAT -> its value, converted once by parse() instead of on every evaluation
+        self.literals = {}
+        # Token index where an <expr> or a <term> starts -> (value, index of the token after it) if it is a constant, False if it is not, see fold()
+        # An <expr> starts at the same token as its first <term>, so each has a table of its own
+        self.foldedexpr = {}
+        self.foldedterm = {}
+        # Inline caches, one entry per token index, filled in as the sites run:
+        # namecache: (scopeepoch, slot, lexeme) of the NAME loaded there, see resolvename()
+        # operatorcache: (left type, right type, operation) of the operator there, the last operand types it saw
+        self.namecache = []
+        self.operatorcache = []
+        # Bumped whenever the set of names declared global in effect changes, which invalidates every namecache entry
+        self.scopeepoch = 0
+        # Token index -> superinstruction that starts there, None for most tokens, see findsuperinstructions()
+        self.superinstructions = []
 
         # We need to split the symbol table into two: local and global
-        self.localsymboltable = {}
-        self.localsymboltablestack = []     # For nested function calls
-        self.localsymboltablebackup = {}    # This is for function call within function call, basically this is for the caller scope while localsymboltable is for callee scope
+        # Locals live in the callframe of the function being executed, a list with one slot per local variable, see resolvelocals(). None in global scope
+        self.frame = None
+        # Frames of returned calls, reused by the next calls instead of building new ones
+        self.framepool = []
+        # Token index -> frame slot of the NAME at that index, -1 for names that are not a local of the function around them
+        self.slots = array('i')
         self.globalsymboltable = {}
+        # Functions live in their own table, name -> functionentry, filled by defstmt()
+        self.functiontable = {}
+        # Token index of the NAME of a call -> functionentry, so a call site only looks its function up by name the first time it runs
+        self.callsites = {}
         # OK now we have two symbol tables, which one do we store into/load from?
         # We track function call depth, 0 means global, positive means local, and negative means we made some mistakes in tracking
         self.functioncalldepth = 0
-        # If some variables are declared global using the "global" keyword, put into this set. For nested function calls, push each "layer" into the stack and pop it out when the function returns
-        self.globalvardeclared = set()
-        self.globalvardeclaredstack = []
-        # For return addresses, since function calls can be chained, a stack is the natural solution
-        self.returnaddrstack = []
+        self.maxcalldepth = maxcalldepth
+        # If some variables are declared global using the "global" keyword, put into this set. Each call has its own set in its callframe, this is the one of the current call
+        self.globalscope = set()
+        self.globalvardeclared = self.globalscope
         self.returnflag = False
 
         # For tracking parent loop indentations so that we can break out of it, see breakstat() and codeblock() for why
@@ -109,62 +193,153 @@ class pyparser:
         self.flagbreak = False
         self.flagbreakloop = False
     
+    @property
+    def token(self):
+        """The current token, for error messages and for the subclasses. Built on demand from a tokenbuffer, the parser itself reads categories, columns and lexemes by index"""
+        return self.tokenlist[self.tokenindex]
+
     def parse(self):
-        self.token = self.tokenlist[0]
-        self.program()
+        """Interpret the tokens, the token interpreter parses and executes in the same pass
+        """
+        self.prepare()
+        self.execute()
+
+    def prepare(self):
+        """Everything worked out from the tokens alone before they run: matching INDENT and DEDENT, literal values and superinstructions.
+        None of it changes while the tokens run, so a parser that runs its tokens again after reset() does not prepare them again.
+        """
+        self.matchindent()
+        self.slots = array('i', [-1]) * len(self.categories)
+        self.namecache = [None] * len(self.categories)
+        self.operatorcache = [None] * len(self.categories)
+        self.literals = {}
+        for index, category in enumerate(self.categories):
+            if category == INTEGER:
+                self.literals[index] = int(self.lexemetable[self.lexemes[index]])
+            elif category == FLOAT:
+                self.literals[index] = float(self.lexemetable[self.lexemes[index]])
+        self.findsuperinstructions()
+
+    def execute(self):
+        """Run the prepared tokens from the first one"""
+        self.tokenindex = 0
+        # Every call of a script nests a dozen or so calls of parser methods (codeblock, stmt, relexpr, expr, term, factor, ...), give Python enough room that maxcalldepth is the limit scripts run into
+        recursionlimit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursionlimit, 30 * self.maxcalldepth + 1000))
+        try:
+            self.program()
+        except RecursionError:
+            raise RuntimeError("Statements or expressions are nested too deeply")
+        finally:
+            sys.setrecursionlimit(recursionlimit)
+            self.output.flush()
         if self.trace is True:
             print("End of parsing")
 
+    def reset(self):
+        """Forget what the last run left behind, so that execute() can run the same tokens again with a fresh state.
+        What prepare() found stays, and so do the frames in framepool.
+        A new scopeepoch invalidates every namecache entry, the entries of operatorcache check the types of their operands anyway.
+        """
+        self.tokenindex = 0
+        self.operandstack.clear()
+        self.frame = None
+        self.globalsymboltable = {}
+        self.functiontable = {}
+        # A call site must not find a function the last run defined before this run defines it
+        self.callsites = {}
+        self.functioncalldepth = 0
+        self.globalscope = set()
+        self.globalvardeclared = self.globalscope
+        self.scopeepoch += 1
+        self.returnflag = False
+        self.indentloop.clear()
+        self.flagloop = False
+        self.flagbreak = False
+        self.flagbreakloop = False
+
     def advance(self):
         """Advance the reading of a token from tokenlist.
-        The variable "token" always contain the current token
+        tokenindex is the index of the current token, it stays on the last one at the end of the tokens so that dump() can still show it
         """
         # Move to next token
-        self.tokenindex += 1     
-        if self.tokenindex >= len(self.tokenlist):
+        if self.tokenindex + 1 >= len(self.categories):
             # I assume the script ends gracefully once encounters an EOF token
-            raise RuntimeError("Unexpected end of file")    
-        self.token = self.tokenlist[self.tokenindex]
+            raise RuntimeError("Unexpected end of file")
+        self.tokenindex += 1
 
     def consume(self, expectedcat: int):
         """Consumes the expected category.
         Assuming we see a "print" token, we should expect a left parenthesis token immediately
         """
-        if self.token.category != expectedcat:
-            raise RuntimeError(f"Expecting {catnames[expectedcat]} but get {catnames[self.token.category]}")
-        elif self.token.category == EOF:
+        category = self.categories[self.tokenindex]
+        if category != expectedcat:
+            raise RuntimeError(f"Expecting {catnames[expectedcat]} but get {catnames[category]}")
+        elif category == EOF:
             # We are done
             return
         else:
             self.advance()
 
+    def matchindent(self):
+        """Pair every INDENT with its DEDENT, once, before parsing starts.
+        indenttable maps the index of each INDENT token to the index of its matching DEDENT token, so that a block we decide not to execute can be skipped with a single jump instead of counting INDENT-DEDENT pairs token by token.
+        """
+        self.indenttable = {}
+        indentstack = []
+        for index, category in enumerate(self.categories):
+            if category == INDENT:
+                indentstack.append(index)
+            elif category == DEDENT:
+                if len(indentstack) == 0:
+                    raise RuntimeError(f"DEDENT on line {self.tokenlist[index].line} has no matching INDENT")
+                self.indenttable[indentstack.pop()] = index
+        if len(indentstack) != 0:
+            raise RuntimeError(f"INDENT on line {self.tokenlist[indentstack[-1]].line} has no matching DEDENT")
+
+    def skipblock(self):
+        """Skip a whole <codeblock> without executing it.
+        Leading NEWLINEs are passed over, then we jump straight to the DEDENT matching the INDENT and advance() from it.
+        """
+        while self.categories[self.tokenindex] != INDENT:
+            self.advance()
+        self.tokenindex = self.indenttable[self.tokenindex]
+        # Don't forget to advance() from the DEDENT
+        self.advance()
+
+    def skipcondition(self):
+        """Skip the <relexpr> of an elif without evaluating it, up to the ':' that ends it, which cannot appear in an expression
+        """
+        while self.categories[self.tokenindex] != COLON:
+            self.advance()
+
     def program(self):
         # <program>         -> <stmt>* EOF
         # We must skip leading newlines, otherwise the while loop does not do anything and the next expecting token is EOF, which is not we want usually.
-        while self.token.category == NEWLINE:
+        while self.categories[self.tokenindex] == NEWLINE:
             self.advance()
-        while self.token.category in stmttokens:
+        while self.categories[self.tokenindex] in stmttokens:
             self.stmt()
         # For edge cases such as test_while_2 when the initial while loop is NOT in a codeblock statement, thus the DEDENTATION left over cannot be consumed properly
-        while self.token.category != EOF:
+        while self.categories[self.tokenindex] != EOF:
             self.advance()
         self.consume(EOF)
 
     def stmt(self):
         # <stmt>            -> <simplestmt> NEWLINE+
         # <stmt>            -> <compoundstmt>
-        if self.token.category in [PRINT, NAME, PYPASS, BREAK, GLOBAL, RETURN]:
+        if self.categories[self.tokenindex] in [PRINT, NAME, PYPASS, BREAK, GLOBAL, RETURN]:
             self.simplestmt()
-            while self.token.category == NEWLINE:
+            while self.categories[self.tokenindex] == NEWLINE:
                 self.consume(NEWLINE)
-        elif self.token.category in [PYIF, PYWHILE, DEF]:
+        elif self.categories[self.tokenindex] in [PYIF, PYWHILE, DEF]:
             self.compoundstmt()
             # Sometimes the whilestmt() is the outmost ring, so the return chain does NOT pass a codeblock() thus we must manually revert the flag. Details in README.md
             if self.flagbreak is True and self.flagbreakloop is True:
                 self.flagbreak = False
                 self.flagbreakloop = False
         else:
-            raise RuntimeError(f"Expecting print, a name, pass, if, while, but get {self.token.category}")
+            raise RuntimeError(f"Expecting print, a name, pass, if, while, but get {self.categories[self.tokenindex]}")
         
     def simplestmt(self):
         # <simplestmt>      -> <printstmt>
@@ -174,22 +349,24 @@ class pyparser:
         # <simplestmt>      -> <globalstmt>
         # <simplestmt>      -> <returnstmt>
         # <simplestmt>      -> <functioncallstmt>
-        if self.token.category == PRINT:
+        if self.categories[self.tokenindex] == PRINT:
             self.printstmt()
-        elif self.token.category == NAME:
+        elif self.categories[self.tokenindex] == NAME:
+            fused = self.superinstructions[self.tokenindex]
+            if fused is not None and self.runsuperinstruction(fused) is not unbound:
+                return
             # could be assignment, or function call
-            token_next = self.tokenlist[self.tokenindex + 1]
-            if token_next.category == LEFTPAREN:
+            if self.categories[self.tokenindex + 1] == LEFTPAREN:
                 self.functioncallstmt()
             else:
                 self.assignmentstmt()
-        elif self.token.category == PYPASS:
+        elif self.categories[self.tokenindex] == PYPASS:
             self.passstmt()
-        elif self.token.category == BREAK:
+        elif self.categories[self.tokenindex] == BREAK:
             self.breakstmt()
-        elif self.token.category == GLOBAL:
+        elif self.categories[self.tokenindex] == GLOBAL:
             self.globalstmt()
-        elif self.token.category == RETURN:
+        elif self.categories[self.tokenindex] == RETURN:
             self.returnstmt()
         else:
             raise RuntimeError("Expecting PRINT, NAME, PYPASS, BREAK, GLOBAL, RETURN and FUNCTION CALL") 
@@ -198,22 +375,22 @@ class pyparser:
     # <printstmt>       -> 'print' '(' [ <relexpr> (',' <relexpr>)* [ ',' ]] ')'
         self.advance()
         self.consume(LEFTPAREN)
-        if self.token.category != RIGHTPAREN:
+        if self.categories[self.tokenindex] != RIGHTPAREN:
             # Must have a <relexpr>
             self.relexpr()
-            print(self.operandstack.pop(), end=' ')
+            self.output.write(f"{self.operandstack.pop()} ")
             # Is there a comma?
-            while self.token.category == COMMA:
+            while self.categories[self.tokenindex] == COMMA:
                 self.advance()
                 # Is this the last comma before ')'?
-                if self.token.category == RIGHTPAREN:
+                if self.categories[self.tokenindex] == RIGHTPAREN:
                     break
                 else:
                     # Should be another relexpr
                     self.relexpr()
-                    print(self.operandstack.pop(), end=' ')
+                    self.output.write(f"{self.operandstack.pop()} ")
         self.consume(RIGHTPAREN)
-        print()
+        self.output.newline()
 
     def assignmentstmt(self):
         # <assignmentstmt>  -> NAME '=' <relexpr>
@@ -228,10 +405,12 @@ class pyparser:
         2. Check functioncalldepth, if it's 0 then we are in global
         """
         intermediate = None
-        left = self.token.lexeme
+        left = self.lexemetable[self.lexemes[self.tokenindex]]
+        # Every name assigned in a function body has a frame slot, see resolvelocals()
+        left_slot = self.slots[self.tokenindex]
         self.advance()
 
-        if self.token.category == ASSIGNOP:
+        if self.categories[self.tokenindex] == ASSIGNOP:
             self.consume(ASSIGNOP)
             self.relexpr()
             # expr() pushes onto top of the operand stack, update symbol table
@@ -243,15 +422,16 @@ class pyparser:
                 except KeyError:
                     raise RuntimeError(f"NAME {left} is declared as global but not defined in global scope")
             else:
-                # Then it must be in local scope, even if not found - in that case we will create a new entry
-                self.localsymboltable[left] = intermediate
-        elif self.token.category in [ADDASSIGN, SUBASSIGN, MULASSIGN, DIVASSIGN]:
-            compound_assign_op:Token = self.token
+                # Then it must be in local scope, even if not found - in that case the slot gets its first value
+                self.frame.locals[left_slot] = intermediate
+        elif self.categories[self.tokenindex] in [ADDASSIGN, SUBASSIGN, MULASSIGN, DIVASSIGN]:
+            compound_assign_op = self.categories[self.tokenindex]
+            opindex = self.tokenindex
             self.advance()   # No need to check again
             self.relexpr()
             # Added type checking
             operand_right = self.operandstack.pop()
-            # NOTE: Switch symboltable to one of the other two symbol tables
+            # NOTE: Switch symboltable to the global symbol table or the frame, left then becomes the key into it
             # TODO: We do not need intermediate. Since we are using symbol_table_left to point to the correct symbol table
             symbol_table_left = None
             if left in self.globalvardeclared or self.functioncalldepth == 0:
@@ -260,35 +440,17 @@ class pyparser:
                 else:
                     raise RuntimeError(f"NAME {left} is declared in the global scope but is not present")
             else:
-                if left not in self.localsymboltable:
+                if self.frame.locals[left_slot] is unbound:
                     raise RuntimeError(f"NAME {left} is not present in the local scope ")
-                symbol_table_left = self.localsymboltable
+                symbol_table_left = self.frame.locals
+                left = left_slot
             
-            left_type = type(symbol_table_left[left]).__name__
-            right_type = type(operand_right).__name__
-            if compound_assign_op.category == ADDASSIGN:
-                if is_operatable(operator=ADDASSIGN, left_type=left_type, right_type=right_type):
-                    symbol_table_left[left] = symbol_table_left[left] + operand_right
-                    if left_type == 'int' and right_type == 'int':
-                        symbol_table_left[left] = int(symbol_table_left[left])
-                else:
-                    raise RuntimeError(f"It is illegal to perform {left_type} {smalltokens[ADDASSIGN]} {right_type}")
-            elif compound_assign_op.category == SUBASSIGN:
-                if is_operatable(operator=SUBASSIGN, left_type=left_type, right_type=right_type):
-                    symbol_table_left[left] = symbol_table_left[left] - operand_right
-                else:
-                    raise RuntimeError(f"It is illegal to perform {left_type} {smalltokens[SUBASSIGN]} {right_type}")
-            elif compound_assign_op.category == MULASSIGN:
-                if is_operatable(operator=MULASSIGN, left_type=left_type, right_type=right_type):
-                    symbol_table_left[left] = symbol_table_left[left] * operand_right
-                else:
-                    raise RuntimeError(f"It is illegal to perform {left_type} {smalltokens[MULASSIGN]} {right_type}")
-            elif compound_assign_op.category == DIVASSIGN:
-                if is_operatable(operator=DIVASSIGN, left_type=left_type, right_type=right_type):
-                    symbol_table_left[left] = symbol_table_left[left] / operand_right
-                else:
-                    raise RuntimeError(f"It is illegal to perform {left_type} {smalltokens[DIVASSIGN]} {right_type}")
-                
+            # One lookup checks the types and finds the operation, see type.dispatch
+            operation = dispatch.get((compound_assign_op, type(symbol_table_left[left]), type(operand_right)))
+            if operation is None:
+                raise RuntimeError(f"It is illegal to perform {type(symbol_table_left[left]).__name__} {self.lexemetable[self.lexemes[opindex]]} {type(operand_right).__name__}")
+            symbol_table_left[left] = operation(symbol_table_left[left], operand_right)
+
     def passstmt(self):
         # <passstmt>        -> 'pass'
         self.advance()
@@ -320,7 +482,7 @@ class pyparser:
                     a = a + 1
             """
             # New logic, check README.md for details
-            if self.token.column == self.indentloop[-1] and self.token.category == DEDENT:
+            if self.columns[self.tokenindex] == self.indentloop[-1] and self.categories[self.tokenindex] == DEDENT:
                 self.flagbreak = True
                 self.consume(DEDENT)
                 break
@@ -336,15 +498,17 @@ class pyparser:
         We need to check whether those names were in globalsymboltable dict, and if yes, push into globalvartuple set
         """
         while True:
-            symbol_name = self.token.lexeme
+            symbol_name = self.lexemetable[self.lexemes[self.tokenindex]]
             if symbol_name in self.globalsymboltable:
-                self.globalvardeclared.add(symbol_name)
+                if symbol_name not in self.globalvardeclared:
+                    self.globalvardeclared.add(symbol_name)
+                    self.scopeepoch += 1
             else:
                 raise RuntimeError(f"The variable {symbol_name} has not been defined.")
             
             self.advance()
             # Is it a comma? If so then there are more symboles to be added
-            if self.token.lexeme == ',':
+            if self.lexemetable[self.lexemes[self.tokenindex]] == ',':
                 self.advance()
             else:
                 break
@@ -358,7 +522,7 @@ class pyparser:
         self.advance()
 
         # If nothing follows "return"
-        if self.token.category != NEWLINE:
+        if self.categories[self.tokenindex] != NEWLINE:
             # How do we plan to fetch the result?
             # Recall that it is already pushed to the "stack"
             self.relexpr()
@@ -370,67 +534,70 @@ class pyparser:
     def functioncallstmt(self):
         # <functioncallstmt>-> NAME'(' [<relexpr> (',' <relexpr>)*] ')'
         """
-        1. Locate the function in globalsymboltable
+        1. Locate the function in functiontable
         2. Populate the parameter field
-        3. Backup local symbol table and global var declared
-            - Also swap the local symbol table for the callee function
-            - Also clear the global var declared for the callee function
-        4. Save the return address (current token to be executed)
+        3. Link the callee's callframe to the caller's and make it the current frame
+            - The frame holds the callee's locals and global var declared
+        4. Save the return address (current token to be executed) in the frame
         5. Jump to the tokenindex of the function body
         6. Cleanup after return
         """
-        function_name = self.token.lexeme
-        self.localsymboltablebackup = {}
+        # Step 1: Locate the function, by name the first time this call site runs
+        function = self.callsites.get(self.tokenindex)
+        if function is None:
+            function_name = self.lexemetable[self.lexemes[self.tokenindex]]
+            if function_name not in self.functiontable:
+                raise RuntimeError(f"Function {function_name} has not been defined yet")
+            function = self.functiontable[function_name]
+            self.callsites[self.tokenindex] = function
+        function_name = function.name
+        if self.functioncalldepth >= self.maxcalldepth:
+            raise RuntimeError(f"Maximum call depth of {self.maxcalldepth} exceeded calling {function_name}")
 
-        # Step 1: Locate the function in globalsymboltable
-        if function_name not in self.globalsymboltable:
-            raise RuntimeError(f"Function {function_name} has not been defined yet")
-                
         # Step 2: Populate the parameter field
-        """
-        In globalsymboltable, each function takes the format of:
-        "foo":{
-            "parameters": ["a", "b", "c"],
-            "entry":23
-        }
-        """
+        # The callee's frame is a local variable, so that a call among the arguments cannot swap it for its own
+        frame = self.framepool.pop() if len(self.framepool) > 0 else callframe()
+        frame.function = function
+        frame_locals = frame.locals
+        frame_locals[:] = function.emptylocals
+        parameterslots = function.parameterslots
+        parameter_num = function.arity
         self.advance()
         self.consume(LEFTPAREN)
 
         counter = 0
-        parameter_num = len(self.globalsymboltable[function_name]["parameters"])
         while True:
-            if self.token.category == RIGHTPAREN:
+            if self.categories[self.tokenindex] == RIGHTPAREN:
                 break
             else:
                 self.relexpr()
                 # This basically says, in local symbol table, 'a': some value
-                if counter >= parameter_num:
-                    raise RuntimeError(f"Function {function_name} accepts {parameter_num} parameters but gets {counter}")
-                
-                self.localsymboltablebackup[self.globalsymboltable[function_name]["parameters"][counter]] = self.operandstack.pop()
+                # Arguments beyond the parameters are still evaluated and counted, the check below reports how many there are
+                if counter < parameter_num:
+                    frame_locals[parameterslots[counter]] = self.operandstack.pop()
+                else:
+                    self.operandstack.pop()
                 counter += 1
-                if self.token.category == COMMA:
+                if self.categories[self.tokenindex] == COMMA:
                     self.advance()
         # Right now we don't accept default value for parameters so the numbers must match: for 3 parameters we must pass 3 values
-        if counter < parameter_num - 1:
+        if counter != parameter_num:
             raise RuntimeError(f"Function {function_name} accepts {parameter_num} parameters but gets {counter}")
         
         self.consume(RIGHTPAREN)
 
-        # Step 3: Backup local symbol table and global var declared.
-        # Swap local symbol table, and clear global var declared for the callee function
-        self.localsymboltablestack.append(self.localsymboltable)
-        self.localsymboltable = self.localsymboltablebackup
-        self.globalvardeclaredstack.append(self.globalvardeclared)
-        self.globalvardeclared = set()
-        
+        # Step 3: Push the callee's frame. Its global var declared is empty, a pooled frame cleared it when it was released
+        frame.caller = self.frame
+        self.frame = frame
+        if len(self.globalvardeclared) > 0:
+            self.scopeepoch += 1
+        self.globalvardeclared = frame.globalvardeclared
+
         # NOTE: Step 4: Save the return address
-        self.returnaddrstack.append(self.tokenindex)
+        frame.returnaddr = self.tokenindex
 
         # Step 4: Jump to the entry token of the function
-        self.tokenindex = self.globalsymboltable[function_name]["entry"]
-        self.token = self.tokenlist[self.tokenindex]
+        self.tokenindex = function.entry
 
         # Step 5: Execution
         self.functioncalldepth += 1
@@ -442,32 +609,33 @@ class pyparser:
         if self.returnflag == True:
             self.returnflag = False
         self.functioncalldepth -= 1
-        self.tokenindex = self.returnaddrstack.pop()
-        self.token = self.tokenlist[self.tokenindex]
-        # If return to the caller function, restore local symbol table as we already pushed whatever the returned value onto the stack
-        if self.functioncalldepth >= 1:
-            self.localsymboltable = self.localsymboltablestack.pop()
-            self.globalvardeclared = self.globalvardeclaredstack.pop()
-        if self.functioncalldepth == 0:
-            # We are back to global env
-            self.localsymboltable = {}
+        self.tokenindex = frame.returnaddr
+        # Pop back to the caller's frame as we already pushed whatever the returned value onto the stack. Back in global env that is None
+        self.frame = frame.caller
+        self.globalvardeclared = self.globalscope if self.frame is None else self.frame.globalvardeclared
+        if len(frame.globalvardeclared) > 0 or len(self.globalvardeclared) > 0:
+            self.scopeepoch += 1
+        # Release the frame into the pool
+        frame.function = None
+        frame.caller = None
+        frame.globalvardeclared.clear()
+        self.framepool.append(frame)
 
     def compoundstmt(self):
         # <compoundstmt>    -> <whilestmt>
         # <compoundstmt>    -> <ifstmt>
         # <compoundstmt>    -> <defstmt>
-        if self.token.category == PYIF:
+        if self.categories[self.tokenindex] == PYIF:
             self.ifstmt()
-        elif self.token.category == PYWHILE:
+        elif self.categories[self.tokenindex] == PYWHILE:
             self.whilestmt()
-        elif self.token.category == DEF:
+        elif self.categories[self.tokenindex] == DEF:
             self.defstmt()
 
     def ifstmt(self):
         # <ifstmt>          -> 'if' <relexpr> ':' <codeblock> ('elif' <relexpr> ':' <codeblock>)* ['else' ':' <codeblock>]
         self.consume(PYIF)
-        self.relexpr()
-        condition = self.operandstack.pop()
+        condition = self.condition()
         self.consume(COLON)
         """
         if condition is True then execute codeblock()
@@ -487,38 +655,28 @@ class pyparser:
             if self.flagbreak is True:
                 return
         else:
-            # Skip over until all pairs of INDENT-DEDENT are passed
+            # Skip over the whole INDENT-DEDENT block
             # codeblock() runs pass the indent-dedent block, but if we choose not to execute codeblock(), we need to implement this functionality by our own
-            indent_tracker = 0
-            indent_start = False
-            while True:
-                if self.token.category == INDENT:
-                    indent_tracker += 1
-                    indent_start = True
-                elif self.token.category == DEDENT:
-                    indent_tracker -= 1
-                if indent_tracker == 0 and indent_start is True:
-                    # We got all those indent-dedent pairs
-                    # Next token should be a statement or something close
-                    # Don't forget to advance() from the DEDENT
-                    self.advance()
-                    break
-                self.advance()
+            self.skipblock()
         # Now that we skipped the codeblock of "if", we should expect either "else" or "elif", or something else which means that the "if" has no "else" nor "elif". We can also have multiple "elif"s so a loop is good for this kind of stuffs (or recursively function call)
         # Hacky way to tell the "else" block that some "elif" got executed
         elif_executed = False
-        while self.token.category == PYELIF:
+        while self.categories[self.tokenindex] == PYELIF:
             self.advance()
-            self.relexpr()
-            condition_elif = self.operandstack.pop()
+            if condition is not False or elif_executed is True:
+                # No elif can run any more, its condition is not even evaluated, so that a function called in it has no effect
+                self.skipcondition()
+                self.consume(COLON)
+                self.skipblock()
+                continue
+            condition_elif = self.condition()
             self.consume(COLON)
 
-            # We need to make sure that the if condition is False
-            # Otherwise this will be falsely triggered if the if condition is True and the elif condition is also True
+            # The if condition is False and no elif before ran, checked above
+            # Otherwise this would be falsely triggered if the if condition is True and the elif condition is also True
             # This is rare but still can happen (think counter == 0 and counter % 2 == 0 can be both true)
-            if condition_elif is True and condition is False:
-                if elif_executed is False:
-                    elif_executed = True
+            if condition_elif is True:
+                elif_executed = True
                 self.codeblock()
                 # If we are in the middle of the return chain, we need to return
                 if self.returnflag is True:
@@ -527,24 +685,10 @@ class pyparser:
                 if self.flagbreak is True:
                     return
             else:
-                # Skip over until all pairs of INDENT-DEDENT are passed
+                # Skip over the whole INDENT-DEDENT block
                 # codeblock() runs pass the indent-dedent block, but if we choose not to execute codeblock(), we need to implement this functionality by our own
-                indent_tracker = 0
-                indent_start = False
-                while True:
-                    if self.token.category == INDENT:
-                        indent_tracker += 1
-                        indent_start = True
-                    elif self.token.category == DEDENT:
-                        indent_tracker -= 1
-                    if indent_tracker == 0 and indent_start is True:
-                        # We got all those indent-dedent pairs
-                        # Next token should be a statement or something close
-                        # Don't forget to advance() from the DEDENT
-                        self.advance()
-                        break
-                    self.advance()
-        if self.token.category == PYELSE:
+                self.skipblock()
+        if self.categories[self.tokenindex] == PYELSE:
             self.advance()
             self.consume(COLON)
             # if either condition is True, we need to skip this part as ELSE won't be executed
@@ -558,21 +702,7 @@ class pyparser:
                     return
             else:
                 # codeblock() runs pass the indent-dedent block, but if we choose not to execute codeblock(), we need to implement this functionality by our own
-                indent_tracker = 0
-                indent_start = False
-                while True:
-                    if self.token.category == INDENT:
-                        indent_tracker += 1
-                        indent_start = True
-                    elif self.token.category == DEDENT:
-                        indent_tracker -= 1
-                    if indent_tracker == 0 and indent_start is True:
-                        # We got all those indent-dedent pairs
-                        # Next token should be a statement or something close
-                        # Don't forget to advance() from the DEDENT
-                        self.advance()
-                        break
-                    self.advance()
+                self.skipblock()
 
     def whilestmt(self):
         # <whilestmt>       -> 'while' <relexpr> ':' <codeblock>
@@ -588,16 +718,13 @@ class pyparser:
         """
         # Push indent of each while loop so that a "break" can get us out of it
         # Don't forget to manually pop once the loop is done, or "break" gets us out of it
-        self.indentloop.append(self.token.column)
-        if self.trace is True:
-            print(f"Loop: {self.indentloop}")
+        self.indentloop.append(self.columns[self.tokenindex])
 
         self.consume(PYWHILE)
         # Record the position of the first token after "while" so that we can jump back
         relexpr_pos = self.tokenindex
         while True:
-            self.relexpr()
-            condition = self.operandstack.pop()
+            condition = self.condition()
             self.consume(COLON)
             if condition is True:
                 self.codeblock()
@@ -612,65 +739,44 @@ class pyparser:
                     return
                 else:
                     self.tokenindex = relexpr_pos
-                    # Manually move the token
-                    self.token = self.tokenlist[self.tokenindex]
             else:
                 # as in if, we need to skip the indent-dedent block
-                indent_tracker = 0
-                indent_start = False
-                while True:
-                    if self.token.category == INDENT:
-                        indent_tracker += 1
-                        indent_start = True
-                    elif self.token.category == DEDENT:
-                        indent_tracker -= 1
-                    if indent_tracker == 0 and indent_start is True:
-                        # We got all those indent-dedent pairs
-                        # Next token should be a statement or something close
-                        # Don't forget to advance() from the DEDENT
-                        self.advance()
-                        # return instead of break as we are inside of double while loop
-                        # Don't forget to pop the indentloop stack as no "break" is run
-                        self.indentloop.pop()
-                        return
-                    self.advance()
+                self.skipblock()
+                # return instead of break as we are inside of double while loop
+                # Don't forget to pop the indentloop stack as no "break" is run
+                self.indentloop.pop()
+                return
 
     def defstmt(self):
         # <defstmt>         -> 'def' NAME '(' [NAME (, NAME)*] ')'':' <codeblock>
         """
         Primary function execution: read README.md for more details of the whole scheme.
 
-        In globalsymboltable, each function takes the format of:
-        "foo":{
-            "parameters": ["a", "b", "c"],
-            "entry":23
-        }
+        Each function gets a function entry in functiontable with its parameters, its arity, and the token indices of the INDENT and the DEDENT of its body.
         """
         self.advance()
-        function_name = self.token.lexeme
+        function_name = self.lexemetable[self.lexemes[self.tokenindex]]
         function_parameters = []
-        if function_name in self.globalsymboltable:
+        if function_name in self.functiontable or function_name in self.globalsymboltable:
             # Double definition, illegal
             raise RuntimeError(f"Function {function_name} was already defined")
-        else:
-            self.globalsymboltable[function_name] = {"parameters": function_parameters, "entry": None}
         self.advance()
 
         # Parameter names
         self.consume(LEFTPAREN)
         while True:
-            token_cat = self.token.category
+            token_cat = self.categories[self.tokenindex]
             if token_cat == RIGHTPAREN:
                 break
             elif token_cat == NAME:
                 # Must be a parameter
-                self.globalsymboltable[function_name]["parameters"].append(self.token.lexeme)
+                function_parameters.append(self.lexemetable[self.lexemes[self.tokenindex]])
                 self.advance()
             elif token_cat == COMMA:
                 self.advance()
-                if self.token.category == NAME:
+                if self.categories[self.tokenindex] == NAME:
                     # Must be a parameter
-                    self.globalsymboltable[function_name]["parameters"].append(self.token.lexeme)
+                    function_parameters.append(self.lexemetable[self.lexemes[self.tokenindex]])
                     self.advance()
                 else:
                     raise RuntimeError(f"Expecting NAME after COMMA")
@@ -681,21 +787,49 @@ class pyparser:
         self.consume(COLON)
         # Now we need to find the entry point and then skip the rest of the function
         while True:
-            if self.token.category != INDENT:
+            if self.categories[self.tokenindex] != INDENT:
                 self.advance()
             else:
                 # This is the entry point, recall that <codeblock> needs an INDENT token at the beginning
-                self.globalsymboltable[function_name]["entry"] = self.tokenindex
                 break
-        # Skip the rest of the function
-        while True:
-            token_col = self.token.column
-            token_cat = self.token.category
-            # TODO: Need to de-hardcode token_col == 1 if we want to allow multiple layers of function definition (def within a def)
-            if token_col == 1 and token_cat not in [INDENT, DEDENT]:
-                break
-            else:
-                self.advance()
+        function = functionentry(function_name, function_parameters, self.tokenindex, self.indenttable[self.tokenindex])
+        self.resolvelocals(function)
+        self.functiontable[function_name] = function
+        # Skip the rest of the function, we already know where its DEDENT is
+        self.tokenindex = function.end
+        self.advance()
+
+    def resolvelocals(self, function:functionentry):
+        """Scope resolution for the body of a function, done once when it is defined.
+        The locals of a function are its parameters and every name it assigns to. Each one gets a fixed slot in the frame of a call, and every NAME token of the body that refers to a local gets its slot in self.slots, so reading or writing the variable is a list index instead of a dict lookup.
+        Bodies of nested functions are left alone, they are resolved when their own "def" runs.
+        """
+        localslots = {}
+        for parameter in function.parameters:
+            if parameter not in localslots:
+                localslots[parameter] = len(localslots)
+        function.parameterslots = [localslots[parameter] for parameter in function.parameters]
+
+        names = []
+        index = function.entry
+        while index < function.end:
+            category = self.categories[index]
+            if category == DEF:
+                # Jump over the nested function, from its INDENT to its DEDENT
+                while self.categories[index] != INDENT:
+                    index += 1
+                index = self.indenttable[index]
+            elif category == NAME:
+                lexeme = self.lexemetable[self.lexemes[index]]
+                names.append((index, lexeme))
+                if self.categories[index + 1] in [ASSIGNOP, ADDASSIGN, SUBASSIGN, MULASSIGN, DIVASSIGN] and lexeme not in localslots:
+                    localslots[lexeme] = len(localslots)
+            index += 1
+        function.localcount = len(localslots)
+        function.emptylocals = (unbound,) * function.localcount
+        for index, lexeme in names:
+            if lexeme in localslots:
+                self.slots[index] = localslots[lexeme]
 
     def codeblock(self):
         # <codeblock>       -> <NEWLINE> 'INDENT' <stmt>+ 'DEDENT'
@@ -713,7 +847,7 @@ class pyparser:
         """
         # In general there is exactly one <NEWLINE> to be consumes
         # However there are cases with multiple <NEWLINE>s and 0 <NEWLINE> -- the second case results from comments and their following <NEWLINE>s been removed from the token list
-        while self.token.category == NEWLINE:
+        while self.categories[self.tokenindex] == NEWLINE:
             self.consume(NEWLINE)
         self.consume(INDENT)
         # TODO: We need to fix a bug regarding empty codeblocks (see below)
@@ -725,9 +859,9 @@ class pyparser:
         
         We should throw a RuntimeError.
         """
-        if self.token.category not in stmttokens:
-            raise RuntimeError(f"Expecting a statement but get {catnames[self.token.category]}")
-        while self.token.category in stmttokens:
+        if self.categories[self.tokenindex] not in stmttokens:
+            raise RuntimeError(f"Expecting a statement but get {catnames[self.categories[self.tokenindex]]}")
+        while self.categories[self.tokenindex] in stmttokens:
             self.stmt()
             """
             In case codeblock() encounters a "flagbreak" signal, this means we are breaking out. If the other signal "flagbreakloop" is also True, this means we are already out of the while loop we want to break out, so we should reset the two flags.
@@ -766,51 +900,35 @@ class pyparser:
         self.expr()
 
         while True:
-            if self.token.category in [LESSTHAN, LESSEQUAL, EQUAL, NOTEQUAL, GREATEREQUAL, GREATERTHAN]:
+            if self.categories[self.tokenindex] in [LESSTHAN, LESSEQUAL, EQUAL, NOTEQUAL, GREATEREQUAL, GREATERTHAN]:
                 if right_operand is None:
                     left_operand = self.operandstack.pop()
                 else:
                     left_operand = right_operand
 
-                token_op = self.token
+                opcategory = self.categories[self.tokenindex]
+                opindex = self.tokenindex
                 self.advance()
                 self.expr()
                 right_operand = self.operandstack.pop()
 
-                left_type = type(left_operand).__name__
-                right_type = type(right_operand).__name__
-                
-                if token_op.category == LESSTHAN:
-                    if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                        result = (left_operand < right_operand) if result is None else (result and (left_operand < right_operand))
-                    else:
-                        raise RuntimeError(f"{token_op.lexeme} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
-                elif token_op.category == LESSEQUAL:
-                    if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                        result = (left_operand <= right_operand) if result is None else (result and (left_operand <= right_operand))
-                    else:
-                        raise RuntimeError(f"{token_op.lexeme} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
-                elif token_op.category == EQUAL:
-                    if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                        result = (left_operand == right_operand) if result is None else (result and (left_operand == right_operand))
-                    else:
-                        # Users should be able to put anything on both ends and get either True or False
-                        self.operandstack.append(False)
-                elif token_op.category == NOTEQUAL:
-                    if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                        result = (left_operand != right_operand) if result is None else (result and (left_operand != right_operand))
-                    else:
-                        self.operandstack.append(True)
-                elif token_op.category == GREATEREQUAL:
-                    if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                        result = (left_operand >= right_operand) if result is None else (result and (left_operand >= right_operand))
-                    else:
-                        raise RuntimeError(f"{token_op.lexeme} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
-                elif token_op.category == GREATERTHAN:
-                    if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                        result = (left_operand > right_operand) if result is None else (result and (left_operand > right_operand))
-                    else:
-                        raise RuntimeError(f"{token_op.lexeme} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
+                # Inline cache first, type.dispatch when the operand types differ from the last time
+                site = self.operatorcache[opindex]
+                if site is not None and site[0] is type(left_operand) and site[1] is type(right_operand):
+                    operation = site[2]
+                else:
+                    operation = dispatch.get((opcategory, type(left_operand), type(right_operand)))
+                    if operation is not None:
+                        self.operatorcache[opindex] = (type(left_operand), type(right_operand), operation)
+                if operation is not None:
+                    result = operation(left_operand, right_operand) if result is None else (result and operation(left_operand, right_operand))
+                elif opcategory == EQUAL:
+                    # Users should be able to put anything on both ends and get either True or False
+                    self.operandstack.append(False)
+                elif opcategory == NOTEQUAL:
+                    self.operandstack.append(True)
+                else:
+                    raise RuntimeError(f"{self.lexemetable[self.lexemes[opindex]]} operator is not suitable for left operand type {type(left_operand).__name__} and right operand type {type(right_operand).__name__}")
             else:
                 # We only need to push result onto the stack if there is at least one comparison
                 if result is not None:
@@ -821,66 +939,87 @@ class pyparser:
         # <expr>            -> <term> ('+' <term>)*
         # <expr>            -> <term> ('-' <term>)*
         
+        # A constant expression is only computed the first time, see fold()
+        start = self.tokenindex
+        folded = self.foldedexpr.get(start)
+        if folded is not None and folded is not False:
+            self.operandstack.append(folded[0])
+            self.tokenindex = folded[1]
+            return
+
         # NOTE: Now we introduce strings into the picture, we need to check types
         self.term()
-        while self.token.category == PLUS or self.token.category == MINUS:
+        while self.categories[self.tokenindex] == PLUS or self.categories[self.tokenindex] == MINUS:
             # Now the left side was pushed onto the operand stack
             # Note that the left side must be in the loop for multiple operations
-            token_op = self.token
+            opcategory = self.categories[self.tokenindex]
+            opindex = self.tokenindex
             left_operand = self.operandstack.pop()
             self.advance()
             self.term()
             # Now the right side was pushed onto the operand stack
             right_operand = self.operandstack.pop()
-            left_type = type(left_operand).__name__
-            right_type = type(right_operand).__name__
-            if token_op.category == PLUS:
-                if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                    result = left_operand + right_operand
-                else:
-                    raise RuntimeError(f"{token_op.lexeme} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
-            elif token_op.category == MINUS:
-                if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                    result = left_operand - right_operand
-                else:
-                    raise RuntimeError(f"{token_op.lexeme} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
-                
+            site = self.operatorcache[opindex]
+            if site is not None and site[0] is type(left_operand) and site[1] is type(right_operand):
+                operation = site[2]
+            else:
+                operation = dispatch.get((opcategory, type(left_operand), type(right_operand)))
+                if operation is None:
+                    raise RuntimeError(f"{self.lexemetable[self.lexemes[opindex]]} operator is not suitable for left operand type {type(left_operand).__name__} and right operand type {type(right_operand).__name__}")
+                self.operatorcache[opindex] = (type(left_operand), type(right_operand), operation)
+            result = operation(left_operand, right_operand)
             self.operandstack.append(result)
 
+        if folded is None:
+            self.fold(self.foldedexpr, start)
+
     def term(self):
         # <term>            -> <factor> ('*' <factor>)*
         # <term>            -> <factor> ('/' <factor>)*
         # <term>            -> <factor> ('%' <factor>)*
+        # A constant term is only computed the first time, see fold()
+        start = self.tokenindex
+        folded = self.foldedterm.get(start)
+        if folded is not None and folded is not False:
+            self.operandstack.append(folded[0])
+            self.tokenindex = folded[1]
+            return
+
         self.factor()
-        while self.token.category in [TIMES, DIVISION, MODULO]:
+        while self.categories[self.tokenindex] in [TIMES, DIVISION, MODULO]:
             # Now the left side was pushed onto the operand stack
             # Note that the left side must be in the loop for multiple operations
-            token_op = self.token
+            opcategory = self.categories[self.tokenindex]
+            opindex = self.tokenindex
             left_operand = self.operandstack.pop()
             self.advance()
             self.factor()
             right_operand = self.operandstack.pop()
-            left_type = type(left_operand).__name__
-            right_type = type(right_operand).__name__
-
-            if token_op.category == TIMES:
-                if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                    result = left_operand * right_operand
-                else:
-                    raise RuntimeError(f"{token_op.lexeme} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
-            elif token_op.category == DIVISION:
-                if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                    result = left_operand / right_operand
-                else:
-                    raise RuntimeError(f"{token_op.lexeme} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
-            elif token_op.category == MODULO:
-                if is_operatable(operator=token_op.category, left_type=left_type, right_type=right_type):
-                    result = left_operand % right_operand
-                else:
-                    raise RuntimeError(f"{token_op.lexeme} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
-            
+            site = self.operatorcache[opindex]
+            if site is not None and site[0] is type(left_operand) and site[1] is type(right_operand):
+                operation = site[2]
+            else:
+                operation = dispatch.get((opcategory, type(left_operand), type(right_operand)))
+                if operation is None:
+                    raise RuntimeError(f"{self.lexemetable[self.lexemes[opindex]]} operator is not suitable for left operand type {type(left_operand).__name__} and right operand type {type(right_operand).__name__}")
+                self.operatorcache[opindex] = (type(left_operand), type(right_operand), operation)
+            result = operation(left_operand, right_operand)
             self.operandstack.append(result)
 
+        if folded is None:
+            self.fold(self.foldedterm, start)
+
+    def fold(self, folded:dict, start:int):
+        """Constant folding for the <expr> or <term> that started at token start and has just been evaluated, remembered in folded, the table of expr() or of term().
+        If it only consists of literals and arithmetic, e.g. 60 * 60 * 24, its value is remembered with the index of the token after it. The next time expr() or term() starts there, the value is pushed and the tokens are jumped over instead of evaluated again.
+        Folding happens after a first evaluation that went through the type checks and the arithmetic as usual, so errors come out the same and at the same time as without folding.
+        """
+        for category in self.categories[start:self.tokenindex]:
+            if category not in constantcategories:
+                folded[start] = False
+                return
+        folded[start] = (self.operandstack[-1], self.tokenindex)
+
     def factor(self):
         # <factor>          -> '+' <factor>
         # <factor>          -> '-' <factor>
@@ -893,70 +1032,164 @@ class pyparser:
         # <factor>          -> 'False'
         # <factor>          -> 'None'
         # <factor>          -> '(' <relexpr> ')'
-        if self.token.category == PLUS:
+        if self.categories[self.tokenindex] == PLUS:
             self.advance()
             self.factor()
             # Now the right side must also be on the stack
             right = self.operandstack.pop()
             self.operandstack.append(right)
-        elif self.token.category == MINUS:
+        elif self.categories[self.tokenindex] == MINUS:
             self.advance()
             self.factor()
             # Now the right side must also be on the stack
             right = self.operandstack.pop()
             self.operandstack.append(-1 * right)
-        elif self.token.category == NAME:
+        elif self.categories[self.tokenindex] == NAME:
             # Could also be a function call such as foo()
-            if self.tokenlist[self.tokenindex + 1].category == LEFTPAREN:
+            if self.categories[self.tokenindex + 1] == LEFTPAREN:
                 self.functioncallstmt()
                 # NOTE: Function call would jump to the saved return address so does not need to advance()
                 # self.advance()
             else:
-                """
-                With functional call implementation, we need to do the following checks:
-                - What is the current scope? (functioncalldepth == 0 or > 0?)
-                - Is variable declared to be global? (check globalvardeclared)
-                - If we are in local scope and cannot find the variable, don't forget to check the global scope as well
-                """
-                if self.token.lexeme in self.globalvardeclared:
-                    if self.token.lexeme not in self.globalsymboltable:
-                        raise RuntimeError(f"Name {self.token.lexeme} is decalred to be global yet not defined in global scope.")
-                    else:
-                        self.operandstack.append(self.globalsymboltable[self.token.lexeme])
-                else:
-                    if self.token.lexeme not in self.localsymboltable:
-                        if self.token.lexeme not in self.globalsymboltable:
-                            raise RuntimeError(f"Name {self.token.lexeme} is not defined in local scope, and neither is it defined in the global scope.")
-                        else:
-                            self.operandstack.append(self.globalsymboltable[self.token.lexeme])
-                    else:
-                        self.operandstack.append(self.localsymboltable[self.token.lexeme])
+                # Inline cache: the scope this site resolved to last time, as long as no global declaration came or went since
+                site = self.namecache[self.tokenindex]
+                value = unbound
+                if site is not None and site[0] == self.scopeepoch:
+                    value = self.frame.locals[site[1]] if site[1] >= 0 else self.globalsymboltable.get(site[2], unbound)
+                if value is unbound:
+                    # A local that is not assigned in this call or a name that is not defined, see again
+                    value = self.resolvename()
+                self.operandstack.append(value)
                 self.advance()
-        elif self.token.category == FLOAT:
-            self.operandstack.append(float(self.token.lexeme))
-            self.advance()
-        elif self.token.category == INTEGER:
-            self.operandstack.append(int(self.token.lexeme))
+        elif self.categories[self.tokenindex] == FLOAT or self.categories[self.tokenindex] == INTEGER:
+            self.operandstack.append(self.literals[self.tokenindex])
             self.advance()
-        elif self.token.category == STRING:
-            self.operandstack.append(self.token.lexeme)
+        elif self.categories[self.tokenindex] == STRING:
+            self.operandstack.append(self.lexemetable[self.lexemes[self.tokenindex]])
             self.advance()
-        elif self.token.category == PYTRUE:
+        elif self.categories[self.tokenindex] == PYTRUE:
             self.operandstack.append(True)
             self.advance()
-        elif self.token.category == PYFALSE:
+        elif self.categories[self.tokenindex] == PYFALSE:
             self.operandstack.append(False)
             self.advance()
-        elif self.token.category == PYNONE:
+        elif self.categories[self.tokenindex] == PYNONE:
             self.operandstack.append(None)
             self.advance()
-        elif self.token.category == LEFTPAREN:
+        elif self.categories[self.tokenindex] == LEFTPAREN:
             self.advance()
             self.relexpr()
             self.consume(RIGHTPAREN)
         else:
             raise RuntimeError("Expecting a valid expression.")
     
+    def condition(self):
+        """Evaluate the <relexpr> of an if, elif or while and return its value, as a FUSEDCOMPARE superinstruction if it is one
+        """
+        fused = self.superinstructions[self.tokenindex]
+        if fused is not None:
+            result = self.runsuperinstruction(fused)
+            if result is not unbound:
+                return result
+        self.relexpr()
+        return self.operandstack.pop()
+
+    def findsuperinstructions(self):
+        """Find the statements and conditions that have the shape of a superinstruction, once, before parsing starts.
+        Each one gets a tuple in superinstructions at the index of its first token: the kind, the token index of the variable and its name for the assignments, the operator category, the token index of the right operand and its value if it is a number, and the index of the token after it.
+        Only the shape is checked here, runsuperinstruction() checks scopes and types every time it runs.
+        """
+        categories = self.categories
+        self.superinstructions = [None] * len(categories)
+        operands = (NAME, INTEGER, FLOAT)
+        # Every pattern is at least four tokens long, and the token list always ends with an EOF
+        for index in range(1, len(categories) - 4):
+            if categories[index] != NAME:
+                continue
+            after = categories[index + 1]
+            if categories[index - 1] in (PYWHILE, PYIF, PYELIF):
+                if after in comparisoncategories and categories[index + 2] in operands and categories[index + 3] == COLON:
+                    self.superinstructions[index] = (FUSEDCOMPARE, index, None, after, index + 2, self.literals.get(index + 2), index + 3)
+            elif categories[index - 1] in (NEWLINE, INDENT, DEDENT):
+                if after in (ADDASSIGN, SUBASSIGN) and categories[index + 2] in (INTEGER, FLOAT) and categories[index + 3] == NEWLINE:
+                    self.superinstructions[index] = (FUSEDINCREMENT, index, self.lexemetable[self.lexemes[index]], after, None, self.literals[index + 2], index + 3)
+                elif after == ASSIGNOP and categories[index + 2] == NAME and categories[index + 3] in (PLUS, MINUS) and categories[index + 4] in operands and categories[index + 5] == NEWLINE:
+                    name = self.lexemetable[self.lexemes[index]]
+                    if name == self.lexemetable[self.lexemes[index + 2]]:
+                        self.superinstructions[index] = (FUSEDACCUMULATE, index, name, categories[index + 3], index + 4, self.literals.get(index + 4), index + 5)
+
+    def runsuperinstruction(self, fused:tuple):
+        """Run a superinstruction found by findsuperinstructions() and move to the token after it.
+        The fast path only covers the common case: names whose scope is in namecache, operand types type.dispatch accepts, and for the assignments a variable that is loaded from and stored to the same scope.
+        Anything else returns unbound without having changed anything, and the caller runs the statement or the condition the usual way, which also raises the usual errors.
+        A FUSEDCOMPARE returns the result of the comparison.
+        """
+        kind, target, name, category, operandindex, operand, nextindex = fused
+        if operand is None:
+            # The right operand is a NAME
+            site = self.namecache[operandindex]
+            if site is None or site[0] != self.scopeepoch:
+                return unbound
+            operand = self.frame.locals[site[1]] if site[1] >= 0 else self.globalsymboltable.get(site[2], unbound)
+            if operand is unbound:
+                return unbound
+
+        if kind == FUSEDCOMPARE:
+            site = self.namecache[target]
+            if site is None or site[0] != self.scopeepoch:
+                return unbound
+            value = self.frame.locals[site[1]] if site[1] >= 0 else self.globalsymboltable.get(site[2], unbound)
+            if value is unbound:
+                return unbound
+            operation = dispatch.get((category, type(value), type(operand)))
+            if operation is None:
+                return unbound
+            result = operation(value, operand)
+        else:
+            # Same scope rules as assignmentstmt(), the variable must already exist there
+            if self.functioncalldepth == 0 or name in self.globalvardeclared:
+                table = self.globalsymboltable
+                key = name
+                value = table.get(name, unbound)
+            else:
+                table = self.frame.locals
+                key = self.slots[target]
+                value = table[key]
+            if value is unbound:
+                return unbound
+            operation = dispatch.get((category, type(value), type(operand)))
+            if operation is None:
+                return unbound
+            table[key] = operation(value, operand)
+            result = None
+
+        self.tokenindex = nextindex
+        return result
+
+    def resolvename(self):
+        """Value of the NAME at tokenindex, the slow path of a name load in factor().
+        With functional call implementation, we need to do the following checks:
+        - What is the current scope? (functioncalldepth == 0 or > 0?)
+        - Is variable declared to be global? (check globalvardeclared)
+        - If we are in local scope and cannot find the variable, don't forget to check the global scope as well
+        The scope found is stored in namecache for the next load at this site. A local that is not assigned yet is not cached, the global it falls back to would hide the local once it is assigned.
+        """
+        lexeme = self.lexemetable[self.lexemes[self.tokenindex]]
+        if lexeme in self.globalvardeclared:
+            if lexeme not in self.globalsymboltable:
+                raise RuntimeError(f"Name {lexeme} is decalred to be global yet not defined in global scope.")
+            self.namecache[self.tokenindex] = (self.scopeepoch, -1, lexeme)
+            return self.globalsymboltable[lexeme]
+        slot = self.slots[self.tokenindex]
+        if slot < 0 or self.frame.locals[slot] is unbound:
+            if lexeme not in self.globalsymboltable:
+                raise RuntimeError(f"Name {lexeme} is not defined in local scope, and neither is it defined in the global scope.")
+            if slot < 0:
+                self.namecache[self.tokenindex] = (self.scopeepoch, -1, lexeme)
+            return self.globalsymboltable[lexeme]
+        self.namecache[self.tokenindex] = (self.scopeepoch, slot, lexeme)
+        return self.frame.locals[slot]
+
     def dump(self):
         # In output, show '\n' for newline
         lexeme = self.token.lexeme.replace('\n', '\\n')
@@ -0,0 +1,137 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                         tokenbuffer                         #
+#                                                             #
+#-------------------------------------------------------------#
+from pyheader import *
+from array import array
+import gc
+
+class tokenbuffer:
+    """Columnar storage for the token stream, a drop-in replacement for the plain token list.
+
+    Instead of one Token object per token, each field lives in its own array:
+        categories  array('H')  token category
+        lines       array('I')  source line
+        columns     array('I')  source column
+        lexemes     array('I')  index into lexemetable
+    Lexemes are interned in lexemetable, so every occurrence of the same name, keyword or operator shares one string.
+
+    Indexing still returns a Token, built on demand, so the tokenizer and the parsers can use a tokenbuffer wherever they use a list.
+    Code that only needs the category of a token should read categories[index] directly.
+    """
+    def __init__(self):
+        self.categories = array('H')
+        self.lines = array('I')
+        self.columns = array('I')
+        self.lexemes = array('I')
+        self.lexemetable = []
+        self.lexemeindex = {}
+
+    def intern(self, lexeme:str):
+        index = self.lexemeindex.get(lexeme)
+        if index is None:
+            index = len(self.lexemetable)
+            self.lexemetable.append(lexeme)
+            self.lexemeindex[lexeme] = index
+        return index
+
+    def append(self, token:Token):
+        self.categories.append(token.category)
+        self.lines.append(token.line)
+        self.columns.append(token.column)
+        self.lexemes.append(self.intern(token.lexeme))
+
+    def pop(self, index:int=-1):
+        token = self[index]
+        self.categories.pop(index)
+        self.lines.pop(index)
+        self.columns.pop(index)
+        self.lexemes.pop(index)
+        return token
+
+    def extend(self, tokens):
+        for token in tokens:
+            self.append(token)
+
+    def clear(self):
+        self.__init__()
+
+    def compact(self, keep):
+        """Keep only the tokens for which the iterable keep yields True, one flag per token in order.
+        Kept tokens are moved down in place and the columns truncated, so no second copy of the columns is built. Lexemes left unused are dropped from lexemetable.
+        keep may be a generator over categories: position index is read before anything is written there.
+        """
+        categories, lines, columns, lexemes = self.categories, self.lines, self.columns, self.lexemes
+        size = 0
+        for index, kept in enumerate(keep):
+            if kept:
+                if size != index:
+                    categories[size] = categories[index]
+                    lines[size] = lines[index]
+                    columns[size] = columns[index]
+                    lexemes[size] = lexemes[index]
+                size += 1
+        for column in [categories, lines, columns, lexemes]:
+            del column[size:]
+        # Drop the lexemes only the removed tokens had, such as the text of comments
+        used = sorted(set(lexemes))
+        if len(used) < len(self.lexemetable):
+            renumbered = {old: new for new, old in enumerate(used)}
+            for index, lexeme in enumerate(lexemes):
+                lexemes[index] = renumbered[lexeme]
+            self.lexemetable = [self.lexemetable[old] for old in used]
+            self.lexemeindex = {lexeme: index for index, lexeme in enumerate(self.lexemetable)}
+
+    def __len__(self):
+        return len(self.categories)
+
+    def __getitem__(self, index:int):
+        return Token(self.lines[index], self.columns[index], self.categories[index], self.lexemetable[self.lexemes[index]])
+
+    def __iter__(self):
+        lexemetable = self.lexemetable
+        for category, line, column, lexeme in zip(self.categories, self.lines, self.columns, self.lexemes):
+            yield Token(line, column, category, lexemetable[lexeme])
+
+    def tolist(self):
+        """Build the plain list of Token objects, for code that works on whole tokens
+        """
+        # A Token is never part of a cycle, so keep the cyclic garbage collector from running over and over while the list grows
+        gcenabled = gc.isenabled()
+        gc.disable()
+        try:
+            return list(self)
+        finally:
+            if gcenabled:
+                gc.enable()
+
+    def tobytes(self):
+        """Serialize the buffer, e.g. to cache the token stream on disk.
+        Layout: a header array('I') with the token count, the lexeme count and the byte length of every lexeme, then the four columns, then all lexemes encoded as UTF-8 back to back.
+        """
+        encoded = [lexeme.encode('utf-8') for lexeme in self.lexemetable]
+        header = array('I', [len(self.categories), len(encoded)] + [len(lexeme) for lexeme in encoded])
+        return header.tobytes() + self.categories.tobytes() + self.lines.tobytes() + self.columns.tobytes() + self.lexemes.tobytes() + b''.join(encoded)
+
+    def frombytes(self, data:bytes):
+        """Replace the content of the buffer with the output of tobytes()
+        """
+        itemsize = array('I').itemsize
+        counts = array('I')
+        counts.frombytes(data[:2 * itemsize])
+        tokencount, lexemecount = counts
+        offset = 2 * itemsize
+        lengths = array('I')
+        lengths.frombytes(data[offset:offset + lexemecount * itemsize])
+        offset += lexemecount * itemsize
+
+        self.__init__()
+        for column in [self.categories, self.lines, self.columns, self.lexemes]:
+            size = tokencount * column.itemsize
+            column.frombytes(data[offset:offset + size])
+            offset += size
+        for length in lengths:
+            self.lexemetable.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+        self.lexemeindex = {lexeme: index for index, lexeme in enumerate(self.lexemetable)}
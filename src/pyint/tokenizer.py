@@ -4,10 +4,40 @@
 #                                                             #
 #-------------------------------------------------------------#
 from pyheader import *
-import os
+from tokenbuffer import tokenbuffer
+import re
+import gc
+
+# Tables for the fast scanner, tokenizer(..., fast=True)
+# tokenrx skips the whitespace in front of a token and matches the token as one of these groups, it cannot fail as SPECIALGROUP matches the empty string
+NAMEGROUP, NUMBERGROUP, OPERATORGROUP, NEWLINEGROUP, STRINGGROUP, COMMENTGROUP, SPECIALGROUP = range(1, 8)
+tokenrx = re.compile(r"""[^\S\n]*(?:
+    ([A-Za-z_]\w*)                                     # name or keyword, \w is exactly str.isalnum() or '_' like in run()
+    |((?:[0-9]+\.?[0-9]*|\.[0-9]*)(?![.\d]|[^\x00-\x7f]))  # number, unless it runs into a second point or into non-ASCII
+    |([=!+\-*/<>]=|[=+\-*/<>()%:,])                    # operator
+    |(\n)
+    |('[^'\\\n]*')                                     # string without escapes and newlines
+    |(\#[^\n]*)                                         # comment
+    |()                                                 # anything else, see tokenizer.fastspecial()
+    )""", re.VERBOSE)
+namerx = re.compile(r'\w+')
+
+onecharops = dict(smalltokens)
+onecharops.update({'<': LESSTHAN, '>': GREATERTHAN})
+twocharops = {
+    '==': EQUAL,
+    '!=': NOTEQUAL,
+    '+=': ADDASSIGN,
+    '-=': SUBASSIGN,
+    '*=': MULASSIGN,
+    '/=': DIVASSIGN,
+    '<=': LESSEQUAL,
+    '>=': GREATEREQUAL,
+}
+stringescapes = {'n': '\n', 't': '\t', '\\': '\\', 'b': '\b', '\'': "'"}
 
 class tokenizer:
-    def __init__(self, source:str, tokenlist:list):
+    def __init__(self, source:str, tokenlist:list, fast:bool=False, infile=None, stripcomments:bool=False, hooks=None):
         self.source = source
         self.tokenlist = tokenlist
         self.token = None
@@ -17,9 +47,23 @@ class tokenizer:
         self.blankline = True
         self.sourceindex = 0
         self.indentstack = [1]
-        self.trace = True
-        self.dump_tokenizer = False
-        self.token_dump_file = 'C:/Dev/Projects/Intepreter/src/pyint/token.dump'
+        # Category of the last "real" token appended, INDENT/DEDENT excluded. Saves reading tokenlist[-1] back, which a tokenbuffer has to rebuild
+        self.prevcategory = NEWLINE
+        # Use fastscan() instead of the character by character scanner, both produce the same token list
+        self.fast = fast
+        # Drop comments while run() tokenizes, leaving the same tokenlist as run() followed by removecomment()
+        self.stripcomments = stripcomments
+        # Streaming input for nexttoken(). With an infile, source is only a window of complete lines read from it by readchunk()
+        self.infile = infile
+        self.chunksize = 65536
+        # Text read after the last newline, waiting for the rest of its line
+        self.pending = ''
+        # Line number of the first line in source
+        self.firstline = 1
+        # Set when nexttoken() raised, so the caller knows the error is to be reported by the tokenizer and not by the parser
+        self.error = False
+        # tracehooks whose token hooks see every token scanned, see traced()
+        self.hooks = hooks
 
     def getchar(self):
         # global sourceindex, column, line, prevchar, blankline
@@ -31,6 +75,10 @@ class tokenizer:
             # Reset blankline
             self.blankline = True
 
+        # When streaming, all of the window has been read, continue on the next lines of infile
+        if self.sourceindex >= len(self.source) and self.readchunk(self.sourceindex):
+            self.sourceindex = 0
+
         # end of source code
         if self.sourceindex >= len(self.source):
             self.column = 1
@@ -59,6 +107,29 @@ class tokenizer:
             return self.source[self.sourceindex]
 
     def run(self):
+        """Tokenize the whole source into tokenlist
+        """
+        append = self.tokenlist.append
+        tokens = self.traced(self.fastscan() if self.fast is True else self.scan())
+        if self.stripcomments is True:
+            tokens = self.dropcomments(tokens)
+        if self.fast is True:
+            # Every token is a new object but none of them is part of a cycle, so pause the cyclic garbage collector, which would otherwise run over and over as the token list grows
+            gcenabled = gc.isenabled()
+            gc.disable()
+            try:
+                for token in tokens:
+                    append(token)
+            finally:
+                if gcenabled:
+                    gc.enable()
+        else:
+            for token in tokens:
+                append(token)
+
+    def scan(self):
+        """Character by character scanner, yields one token at a time
+        """
         cur_char = ' '
         prev_char = ' '
 
@@ -275,94 +346,287 @@ class tokenizer:
                 self.token.lexeme = cur_char
                 raise RuntimeError('Invalid self.token')
             
-            """
-            Check for indentations AFTER a NEWLINE has been appended
-            Two cases: 
-                1. the first line has leading spaces, so len(self.tokenlist) == 0
-                2. the previous appended self.token is NEWLINE, and now we have a new self.token
-
-            What do we do? Assuming we have indentstack as [1, 4, 7, 10].
-            We check the column of the new self.token:
-                - If it's indentstack[-1] < column, we append it, and add an INDENT self.token
-                - If it's indentstack[-1] > column, we pop indentstack until we find one matching:
-                    - For each indent in indentstack, if indent > column, pop and add a DEDENT self.token
-                    - If indent == column, quit without popping it
-                    - If indent < column, something is wrong, raise a RuntimeError
-            """
-            if len(self.tokenlist) == 0 or self.tokenlist[-1].category == NEWLINE:
-                if self.indentstack[-1] < self.token.column:
-                    # Append and add an INDENT
-                    self.token_indent = Token(self.line, self.indentstack[-1], INDENT, '')
-                    # The beauty is that INDENT is created afterwards but appended before the first "real" self.token of the line
-                    self.tokenlist.append(self.token_indent)
-                    self.indentstack.append(self.token.column)
-                    if self.trace is True:
-                        print(f"{str(self.token_indent.line)}   {str(self.token_indent.column)}    {catnames[self.token_indent.category]}   {str(self.token_indent.lexeme)}")
-                else:
-                    while True:
-                        if self.indentstack[-1] == self.token.column:
-                            # Do nothing, no change in indentation of dedentation
-                            break
-                        if self.indentstack[-1] > self.token.column:
-                            # Pop and add a DEDENT
-                            # Do NOT pollute the original self.token as it is not appended yet
-                            # Same line as the following self.token(parsed but yet appended)
-                            # I put column as 1 but this is not important
-
-                            # Must pop first, otherwise DEDENT gets the wrong position plus indentstack will never be depleted as it has an initial element 1
-                            self.indentstack.pop()
-                            self.token_dedent = Token(self.line, self.indentstack[-1], DEDENT, '')
-                            # The beauty is that DEDENT is created afterwards but appended before the first "real" self.token of the line
-                            self.tokenlist.append(self.token_dedent)
-                            if self.trace is True:
-                                print(f"{str(self.token_dedent.line)}   {str(self.token_dedent.column)}    {catnames[self.token_dedent.category]}   {str(self.token_dedent.lexeme)}")
-                        else:
-                            raise RuntimeError(f"Incorrect dedentation {self.token.column} for {self.indentstack}")
-            
-            self.tokenlist.append(self.token)
+            if self.prevcategory == NEWLINE:
+                for token in self.indentation():
+                    yield token
             
-            self.trace_print()
+            self.prevcategory = self.token.category
+            yield self.token
 
             if self.token.category == EOF:
-                if self.trace is True:
-                    self.traceall()
-                    print(self.indentstack)
                 break
 
-    def trace_print(self):
-        if self.trace is True:
-            print(f"{str(self.token.line)}   {str(self.token.column)}    {catnames[self.token.category]}   {str(self.token.lexeme)}")
+    def indentation(self):
+        """
+        Check for indentations AFTER a NEWLINE has been appended
+        Two cases: 
+            1. the first line has leading spaces, so len(self.tokenlist) == 0
+            2. the previous appended self.token is NEWLINE, and now we have a new self.token
 
-    def traceall(self):
-        if self.trace is True:
-            """
-            Remove the existing file even if we don't need to dump
-            """
-            try:
-                os.remove(self.token_dump_file)
-            except OSError:
-                pass
-            print('Line Col Category            Lexeme\n')
-            for self.token in self.tokenlist:
-                if self.dump_tokenizer is False:
-                    print(f"{str(self.token.line)}   {str(self.token.column)}    {catnames[self.token.category]}   {str(self.token.lexeme)}")
+        What do we do? Assuming we have indentstack as [1, 4, 7, 10].
+        We check the column of the new self.token:
+            - If it's indentstack[-1] < column, we append it, and add an INDENT self.token
+            - If it's indentstack[-1] > column, we pop indentstack until we find one matching:
+                - For each indent in indentstack, if indent > column, pop and add a DEDENT self.token
+                - If indent == column, quit without popping it
+                - If indent < column, something is wrong, raise a RuntimeError
+
+        The INDENT and DEDENT tokens are returned in a list, to go in front of self.token
+        """
+        tokens = []
+        if self.indentstack[-1] < self.token.column:
+            # Append and add an INDENT
+            self.token_indent = Token(self.line, self.indentstack[-1], INDENT, '')
+            # The beauty is that INDENT is created afterwards but appended before the first "real" self.token of the line
+            tokens.append(self.token_indent)
+            self.indentstack.append(self.token.column)
+        else:
+            while True:
+                if self.indentstack[-1] == self.token.column:
+                    # Do nothing, no change in indentation of dedentation
+                    break
+                if self.indentstack[-1] > self.token.column:
+                    # Pop and add a DEDENT
+                    # Do NOT pollute the original self.token as it is not appended yet
+                    # Same line as the following self.token(parsed but yet appended)
+                    # I put column as 1 but this is not important
+
+                    # Must pop first, otherwise DEDENT gets the wrong position plus indentstack will never be depleted as it has an initial element 1
+                    self.indentstack.pop()
+                    self.token_dedent = Token(self.line, self.indentstack[-1], DEDENT, '')
+                    # The beauty is that DEDENT is created afterwards but appended before the first "real" self.token of the line
+                    tokens.append(self.token_dedent)
                 else:
-                    """
-                    Then dump the content
-                    """
-                    try:
-                        with open(self.token_dump_file, 'a') as file:
-                            print(f"{str(self.token.line)}   {str(self.token.column)}    {catnames[self.token.category]}   {str(self.token.lexeme)}", file=file)
-                    except Exception as e:
-                        raise RuntimeError(e)
-                    
+                    raise RuntimeError(f"Incorrect dedentation {self.token.column} for {self.indentstack}")
+        return tokens
+
+    def fastscan(self):
+        """Scanner selected with tokenizer(..., fast=True), it yields the same tokens as the character by character scan().
+        Each match of tokenrx skips the whitespace in front of a token and takes the whole lexeme, the group that matched tells the kind of the token.
+        Whatever tokenrx leaves to its empty SPECIALGROUP (end of source, non-ASCII, errors, strings with escapes or newlines) is handed to fastspecial(), then matching restarts after that token.
+        Line and column are derived from sourceindex and linestart, the index of the first character of the current line.
+        """
+        source = self.source
+        sourcelen = len(source)
+        prevcategory = self.prevcategory
+        indentstack = self.indentstack
+        sourceindex = 0
+        line = 1
+        linestart = 0
+        # Where the last token ended. A newline is blank, and skipped as scan() does, if no token ended on its line
+        tokenend = 0
+        token = None
+
+        while token is None or token.category != EOF:
+            for match in tokenrx.finditer(source, sourceindex):
+                group = match.lastindex
+
+                if group == NAMEGROUP:
+                    lexeme = match.group(NAMEGROUP)
+                    sourceindex = match.end()
+                    token = Token(line, sourceindex - len(lexeme) - linestart + 1, keywords.get(lexeme, NAME), lexeme)
+
+                elif group == OPERATORGROUP:
+                    lexeme = match.group(OPERATORGROUP)
+                    sourceindex = match.end()
+                    if len(lexeme) == 1:
+                        token = Token(line, sourceindex - linestart, onecharops[lexeme], lexeme)
+                    elif sourceindex < sourcelen:
+                        token = Token(line, sourceindex - 1 - linestart, twocharops[lexeme], lexeme)
+                    else:
+                        # scan() peeks the second character with peekchar(), which never sees the last character of the source
+                        sourceindex -= 1
+                        lexeme = lexeme[0]
+                        if lexeme == '!':
+                            self.token = Token(line, sourceindex - linestart, None, lexeme)
+                            raise RuntimeError("Expecting a '=' following '!'")
+                        token = Token(line, sourceindex - linestart, onecharops[lexeme], lexeme)
+                        # Restart matching at the second character
+                        group = SPECIALGROUP
+
+                elif group == NEWLINEGROUP:
+                    column = match.end() - linestart
+                    blank = tokenend <= linestart
+                    sourceindex = match.end()
+                    line += 1
+                    linestart = sourceindex
+                    if blank:
+                        continue
+                    token = Token(line - 1, column, NEWLINE, '\n')
+
+                elif group == NUMBERGROUP:
+                    lexeme = match.group(NUMBERGROUP)
+                    sourceindex = match.end()
+                    token = Token(line, sourceindex - len(lexeme) - linestart + 1, FLOAT if '.' in lexeme else INTEGER, lexeme)
+
+                elif group == STRINGGROUP:
+                    lexeme = match.group(STRINGGROUP)
+                    sourceindex = match.end()
+                    token = Token(line, sourceindex - len(lexeme) - linestart + 1, STRING, lexeme[1:-1])
+
+                elif group == COMMENTGROUP:
+                    lexeme = match.group(COMMENTGROUP)
+                    sourceindex = match.end()
+                    token = Token(line, sourceindex - len(lexeme) - linestart + 1, COMMENT_SINGLE, lexeme)
+
+                else:
+                    sourceindex = match.end()
+                    if sourceindex >= sourcelen and self.readchunk(linestart):
+                        # Streaming, the window is used up and readchunk() replaced it with the next lines of infile
+                        sourceindex -= linestart
+                        tokenend -= linestart
+                        linestart = 0
+                        source = self.source
+                        sourcelen = len(source)
+                        break
+                    token, sourceindex, line, linestart = self.fastspecial(sourceindex, line, linestart)
+                    # fastspecial() may have read more lines for a string
+                    source = self.source
+                    sourcelen = len(source)
+
+                tokenend = sourceindex
+                # Most lines keep the indentation of the previous one, only call indentation() when it changes
+                if prevcategory == NEWLINE and token.column != indentstack[-1]:
+                    self.token = token
+                    self.line = line
+                    for indenttoken in self.indentation():
+                        yield indenttoken
+
+                prevcategory = token.category
+                yield token
+
+                if group == SPECIALGROUP:
+                    break
+
+        self.prevcategory = prevcategory
+        self.token = token
+        self.line = line
+        self.sourceindex = sourceindex
+
+    def fastspecial(self, sourceindex:int, line:int, linestart:int):
+        """Tokens at sourceindex tokenrx does not match, decided with the same str tests run() uses.
+        Returns the token and the index, line and line start after it.
+        """
+        source = self.source
+        if sourceindex >= len(source):
+            return Token(line, 1, EOF, ''), sourceindex, line, linestart
+
+        char = source[sourceindex]
+        column = sourceindex - linestart + 1
+        if char.isdigit() or char == '.':
+            # Non-ASCII digits or a second decimal point, checked one character at a time
+            end = sourceindex
+            flag_fp = False
+            while end < len(source) and (source[end].isdigit() or source[end] == '.'):
+                if source[end] == '.':
+                    if flag_fp:
+                        self.token = Token(line, column, UNSIGNEDNUM, source[sourceindex:end])
+                        raise RuntimeError("A numerical value cannot have two decimal points")
+                    flag_fp = True
+                end += 1
+            return Token(line, column, FLOAT if flag_fp else INTEGER, source[sourceindex:end]), end, line, linestart
+
+        elif char.isalpha():
+            end = namerx.match(source, sourceindex).end()
+            lexeme = source[sourceindex:end]
+            return Token(line, column, keywords.get(lexeme, NAME), lexeme), end, line, linestart
+
+        elif char == '\'':
+            # Escapes or newlines. As in run(), a newline ending a blank line inside of the string is read as a space
+            token = Token(line, column, STRING, '')
+            # The opening quote is on the first line, so it cannot be blank
+            blankline = False
+            escape = False
+            sourceindex += 1
+            while True:
+                if sourceindex >= len(source) and self.readchunk(0):
+                    # Streaming, the string goes on in the next lines of infile
+                    source = self.source
+                if sourceindex >= len(source):
+                    self.token = token
+                    if escape:
+                        raise RuntimeError("Only allow escape chars: \\n, \\t, \\, \\b")
+                    raise RuntimeError("String is not closed")
+                char = source[sourceindex]
+                sourceindex += 1
+                if char == '\n':
+                    if blankline:
+                        char = ' '
+                    line += 1
+                    linestart = sourceindex
+                    blankline = True
+                elif not char.isspace():
+                    blankline = False
+
+                if escape:
+                    if char not in stringescapes:
+                        self.token = token
+                        raise RuntimeError("Only allow escape chars: \\n, \\t, \\, \\b")
+                    token.lexeme += stringescapes[char]
+                    escape = False
+                elif char == '\'':
+                    return token, sourceindex, line, linestart
+                elif char == '\\':
+                    escape = True
+                else:
+                    token.lexeme += char
+
+        elif char == '!':
+            self.token = Token(line, column, None, char)
+            raise RuntimeError("Expecting a '=' following '!'")
+
+        else:
+            self.token = Token(line, column, ERROR, char)
+            raise RuntimeError('Invalid self.token')
+
+    def traced(self, tokens):
+        """Pass tokens through, calling the token hooks on each of them.
+        Without token hooks the scanner is returned as it is, so tokenizing without tracing does not pay for a test per token.
+        """
+        if self.hooks is None or self.hooks.active('token') is False:
+            return tokens
+        return self.tracetokens(tokens)
+
+    def tracetokens(self, tokens):
+        emit = self.hooks.emit
+        for token in tokens:
+            emit('token', token)
+            yield token
+
     def removecomment(self):
         """Remove all comments from token list
+        The list is rebuilt once from the tokens dropcomments() keeps, popping every comment in place made this quadratic on commented sources.
+        A tokenbuffer is filtered in place from its categories instead, going through dropcomments() would build a Token for every token.
+        """
+        if isinstance(self.tokenlist, tokenbuffer):
+            self.tokenlist.compact(self.keepcategories(self.tokenlist.categories))
+            return
+        kept = list(self.dropcomments(self.tokenlist))
+        if len(kept) != len(self.tokenlist):
+            self.tokenlist.clear()
+            self.tokenlist.extend(kept)
+
+    def keepcategories(self, categories):
+        """Yield for every category whether its token stays, by the same rule as dropcomments()
+        """
+        dropnewline = False
+        for category in categories:
+            if category in [COMMENT_MULTIPLE, COMMENT_SINGLE]:
+                dropnewline = True
+                yield False
+            elif category != NEWLINE or dropnewline is False:
+                dropnewline = False
+                yield True
+            else:
+                yield False
+
+    def dropcomments(self, tokens):
+        """Yield tokens without the comments and the NEWLINEs right after each comment
         """
-        index = 0
-        while index < len(self.tokenlist):
-            if self.tokenlist[index].category in [COMMENT_MULTIPLE, COMMENT_SINGLE]:
-                self.tokenlist.pop(index)
+        dropnewline = False
+        for token in tokens:
+            if token.category in [COMMENT_MULTIPLE, COMMENT_SINGLE]:
+                dropnewline = True
                 # If the next token is a NEWLINE, should also remove it. Imagine this piece of code snippet:
                 """
                 while count < number:
@@ -378,15 +642,48 @@ class tokenizer:
 
                 This is going to raise a RuntimeError in our case as our next token is <NEWLINE>
                 """
-                while self.tokenlist[index].category == NEWLINE:
-                    self.tokenlist.pop(index)
-            else:
-                index += 1
+            elif token.category != NEWLINE or dropnewline is False:
+                dropnewline = False
+                yield token
 
-    #TODO: Add the functionality of spitting out one token at a time
     def nexttoken(self):
-        pass
-    
+        """Yield the tokens one at a time, the same tokens run() and removecomment() leave in tokenlist.
+        With an infile the source is read in chunks while the tokens are pulled, so that neither the whole source nor the whole token list is held in memory.
+        """
+        try:
+            yield from self.dropcomments(self.traced(self.fastscan() if self.fast is True else self.scan()))
+        except RuntimeError:
+            self.error = True
+            raise
+
+    def readchunk(self, keep:int):
+        """Replace source by source[keep:] followed by the next complete lines of infile.
+        Returns False when there is no infile or nothing left to read.
+        """
+        if self.infile is None:
+            return False
+        text = self.pending
+        while True:
+            chunk = self.infile.read(self.chunksize)
+            if chunk == '':
+                # Same as main.py, the last line must end with a newline
+                self.infile = None
+                self.pending = ''
+                if text != '' and text[-1] != '\n':
+                    text += '\n'
+                break
+            text += chunk
+            end = text.rfind('\n') + 1
+            if end > 0:
+                self.pending = text[end:]
+                text = text[:end]
+                break
+        if text == '':
+            return False
+        self.firstline += self.source.count('\n', 0, keep)
+        self.source = self.source[keep:] + text
+        return True
+
     def dump(self):
         # In output, show '\n' for newline
         lexeme = self.token.lexeme.replace('\n', '\\n')
@@ -394,5 +691,7 @@ class tokenizer:
         # Added the feature to enrigh Runtime Error message:
         # Show the line with a caret pointing to the token
         sourcesplit = self.source.split('\n')
-        print(sourcesplit[self.token.line - 1])
-        print(' ' * (self.token.column - 1) + '^')
\ No newline at end of file
+        # When streaming, source only holds the lines from firstline on
+        if 0 <= self.token.line - self.firstline < len(sourcesplit):
+            print(sourcesplit[self.token.line - self.firstline])
+            print(' ' * (self.token.column - 1) + '^')
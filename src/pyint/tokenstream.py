@@ -0,0 +1,70 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                         tokenstream                         #
+#                                                             #
+#-------------------------------------------------------------#
+from pyheader import *
+from collections import deque
+
+class tokenstream:
+    """Token list over a token generator such as tokenizer.nexttoken(), for parsers that only move forward.
+
+    Tokens are pulled from the generator when they are first indexed and kept in a small lookahead buffer.
+    Reading token i forgets every token before i - 1, so only the current token, the one before it and the lookahead are ever held.
+    This suits compiler.py, which reads tokenlist[tokenindex] and peeks at tokenindex + 1, but not pyparser.py, which jumps back to loop and function entries.
+    Between keep() and release() the tokens are collected in a tokenwindow instead of being forgotten.
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.buffer = deque()
+        # Index of buffer[0] in the whole token stream
+        self.offset = 0
+        self.categories = categoryview(self)
+        # tokenwindow of keep(), None when tokens are forgotten
+        self.window = None
+
+    def __getitem__(self, index:int):
+        while self.offset < index - 1 and len(self.buffer) > 0:
+            token = self.buffer.popleft()
+            if self.window is not None and self.offset >= self.window.offset:
+                self.window.tokens.append(token)
+            self.offset += 1
+        if index < self.offset:
+            raise RuntimeError(f"Token {index} has already been dropped from the stream")
+        while index >= self.offset + len(self.buffer):
+            try:
+                self.buffer.append(next(self.tokens))
+            except StopIteration:
+                raise RuntimeError("Unexpected end of file")
+        return self.buffer[index - self.offset]
+
+    def keep(self, index:int):
+        """Collect the tokens from index on until release(), and return the tokenwindow they go to"""
+        self.window = tokenwindow(index)
+        return self.window
+
+    def release(self):
+        """Add the tokens still in the buffer to the window of keep(), and go back to forgetting tokens"""
+        window = self.window
+        for position, token in enumerate(self.buffer, self.offset):
+            if position >= window.offset + len(window.tokens):
+                window.tokens.append(token)
+        self.window = None
+
+class tokenwindow:
+    """Tokens offset, offset + 1, ... of a tokenstream, indexed by their position in the whole stream"""
+    def __init__(self, offset:int):
+        self.offset = offset
+        self.tokens = []
+
+    def __getitem__(self, index:int):
+        return self.tokens[index - self.offset]
+
+class categoryview:
+    """categories[index] of a tokenstream, so that lookahead reads the same as with a tokenbuffer or a plain list
+    """
+    def __init__(self, stream:tokenstream):
+        self.stream = stream
+
+    def __getitem__(self, index:int):
+        return self.stream[index].category
@@ -1,4 +1,5 @@
 from header import *
+import operator
 
 # "Operatable" dictionary
 # [LESSTHAN, LESSEQUAL, EQUAL, NOTEQUAL, GREATEREQUAL, GREATERTHAN]
@@ -27,6 +28,34 @@ operatable = {
 def is_operatable(operator, left_type, right_type):
     return (left_type, right_type) in operatable[operator]
 
+# The implementation of each operator
+operations = {
+    PLUS:           operator.add,
+    MINUS:          operator.sub,
+    TIMES:          operator.mul,
+    DIVISION:       operator.truediv,
+    MODULO:         operator.mod,
+    ADDASSIGN:      operator.add,
+    SUBASSIGN:      operator.sub,
+    MULASSIGN:      operator.mul,
+    DIVASSIGN:      operator.truediv,
+    LESSTHAN:       operator.lt,
+    LESSEQUAL:      operator.le,
+    EQUAL:          operator.eq,
+    NOTEQUAL:       operator.ne,
+    GREATEREQUAL:   operator.ge,
+    GREATERTHAN:    operator.gt,
+}
+
+# "Operatable" compiled into one dictionary (operator, type of left operand, type of right operand) -> function computing the result
+# Keys use the exact types, as type(x).__name__ does, so True is a 'bool' and not an 'int'. A missing key means the types are not operatable
+typesbyname = {'int': int, 'float': float, 'str': str}
+dispatch = {
+    (op, typesbyname[left_type], typesbyname[right_type]): operations[op]
+    for op, typepairs in operatable.items()
+    for left_type, right_type in typepairs
+}
+
 # Test
 def main():
     assert(is_operatable(ADDASSIGN, 'str', 'str') == True)
@@ -0,0 +1,298 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                       virtual machine                       #
+#                                                             #
+#-------------------------------------------------------------#
+
+# A stack machine that runs the code objects produced by compiler.py.
+# Scoping rules, type checks, error messages and how the conditions of if, elif and while are tested follow pyparser.py, only the execution strategy differs.
+
+from pyheader import *
+from type import dispatch
+from compiler import codeobject
+from output import outputbuffer
+
+# Opcodes of binary operators and the token categories type.dispatch knows them by
+binarycategories = {
+    BINARY_ADD:             PLUS,
+    BINARY_SUBTRACT:        MINUS,
+    BINARY_MULTIPLY:        TIMES,
+    BINARY_TRUE_DIVIDE:     DIVISION,
+    BINARY_MODULO:          MODULO,
+    INPLACE_ADD:            ADDASSIGN,
+    INPLACE_SUBTRACT:       SUBASSIGN,
+    INPLACE_MULTIPLY:       MULASSIGN,
+    INPLACE_TRUE_DIVIDE:    DIVASSIGN,
+}
+
+binaryopcodes = {BINARY_ADD, BINARY_SUBTRACT, BINARY_MULTIPLY, BINARY_TRUE_DIVIDE, BINARY_MODULO}
+inplaceopcodes = {INPLACE_ADD, INPLACE_SUBTRACT, INPLACE_MULTIPLY, INPLACE_TRUE_DIVIDE}
+
+# type.dispatch keyed by opcode instead of token category: (opcode, type of left operand, type of right operand) -> function computing the result
+opcodedispatch = {
+    (opcode, left_type, right_type): operation
+    for opcode, category in binarycategories.items()
+    for (operator, left_type, right_type), operation in dispatch.items()
+    if operator == category
+}
+
+# Lexemes of operators, for error messages
+oplexemes = {
+    PLUS:           '+',
+    MINUS:          '-',
+    TIMES:          '*',
+    DIVISION:       '/',
+    MODULO:         '%',
+    ADDASSIGN:      '+=',
+    SUBASSIGN:      '-=',
+    MULASSIGN:      '*=',
+    DIVASSIGN:      '/=',
+    LESSTHAN:       '<',
+    LESSEQUAL:      '<=',
+    EQUAL:          '==',
+    NOTEQUAL:       '!=',
+    GREATEREQUAL:   '>=',
+    GREATERTHAN:    '>',
+}
+
+class vm:
+    def __init__(self, code:codeobject, source:str, maxcalldepth:int=MAXVMCALLDEPTH, output:outputbuffer=None):
+        self.code = code
+        self.source = source
+        # Where PRINT_ITEM and PRINT_NEWLINE write, flushed by run() when it is done
+        self.output = output if output is not None else outputbuffer()
+        self.trace = False
+        self.globalsymboltable = {}
+        # 0 means global, positive means we are inside of a function call
+        self.functioncalldepth = 0
+        self.maxcalldepth = maxcalldepth
+        # Counters for --stats, only touched by calls so that they cost next to nothing
+        self.calls = 0
+        self.maxdepthreached = 0
+        # Code object and instruction of the innermost frame that raised, for dump()
+        self.errorcode = None
+        self.errorpc = 0
+
+    def reset(self):
+        """Forget the globals and the error of the last run, so that the same vm can run another code object"""
+        self.globalsymboltable = {}
+        self.functioncalldepth = 0
+        self.errorcode = None
+        self.errorpc = 0
+
+    def run(self):
+        try:
+            self.execute(self.code, {}, set())
+        finally:
+            self.output.flush()
+        if self.trace is True:
+            print("End of execution")
+
+    def binaryop(self, opcode:int, left, right):
+        operation = opcodedispatch.get((opcode, type(left), type(right)))
+        if operation is None:
+            category = binarycategories[opcode]
+            left_type = type(left).__name__
+            right_type = type(right).__name__
+            if opcode in inplaceopcodes:
+                raise RuntimeError(f"It is illegal to perform {left_type} {oplexemes[category]} {right_type}")
+            raise RuntimeError(f"{oplexemes[category]} operator is not suitable for left operand type {left_type} and right operand type {right_type}")
+        return operation(left, right)
+
+    def compareop(self, category:int, left, right):
+        operation = dispatch.get((category, type(left), type(right)))
+        if operation is None:
+            # Users should be able to put anything on both ends of == and != and get either True or False
+            if category == EQUAL:
+                return False
+            elif category == NOTEQUAL:
+                return True
+            raise RuntimeError(f"{oplexemes[category]} operator is not suitable for left operand type {type(left).__name__} and right operand type {type(right).__name__}")
+        return operation(left, right)
+
+    def execute(self, code:codeobject, localsymboltable:dict, globalvardeclared:set):
+        """Run one code object until RETURN_VALUE and return the value on top of the stack.
+        Each function call runs with its own local symbol table and its own set of names declared global, but not in a nested execute():
+        CALL_FUNCTION suspends the caller on an explicit control stack and switches to the callee, and RETURN_VALUE switches back.
+        So the depth of recursion in a script is bounded by maxcalldepth and memory, not by Python's recursion limit.
+        """
+        co_code = code.co_code
+        co_consts = code.co_consts
+        co_names = code.co_names
+        globalsymboltable = self.globalsymboltable
+        stack = []
+        pc = 0
+        # Suspended callers, (code, pc, stack, localsymboltable, globalvardeclared) of each
+        frames = []
+        try:
+            while True:
+                opcode = co_code[pc]
+                argument = co_code[pc + 1]
+                pc += 2
+
+                if opcode == LOAD_NAME:
+                    name = co_names[argument]
+                    if name in globalvardeclared:
+                        if name not in globalsymboltable:
+                            raise RuntimeError(f"Name {name} is decalred to be global yet not defined in global scope.")
+                        stack.append(globalsymboltable[name])
+                    elif name in localsymboltable:
+                        stack.append(localsymboltable[name])
+                    elif name in globalsymboltable:
+                        stack.append(globalsymboltable[name])
+                    else:
+                        raise RuntimeError(f"Name {name} is not defined in local scope, and neither is it defined in the global scope.")
+                elif opcode == LOAD_CONST:
+                    stack.append(co_consts[argument])
+                elif opcode == STORE_NAME:
+                    name = co_names[argument]
+                    if name in globalvardeclared or len(frames) == 0:
+                        globalsymboltable[name] = stack.pop()
+                    else:
+                        localsymboltable[name] = stack.pop()
+                elif opcode in binaryopcodes:
+                    right = stack.pop()
+                    left = stack.pop()
+                    # Type check and operation in one lookup, binaryop() only to raise the error
+                    operation = opcodedispatch.get((opcode, type(left), type(right)))
+                    stack.append(self.binaryop(opcode, left, right) if operation is None else operation(left, right))
+                elif opcode in inplaceopcodes:
+                    # Compound assignment, the left side must already exist in the scope it resolves to
+                    name = co_names[argument]
+                    if name in globalvardeclared or len(frames) == 0:
+                        if name not in globalsymboltable:
+                            raise RuntimeError(f"NAME {name} is declared in the global scope but is not present")
+                        symboltable = globalsymboltable
+                    else:
+                        if name not in localsymboltable:
+                            raise RuntimeError(f"NAME {name} is not present in the local scope ")
+                        symboltable = localsymboltable
+                    left = symboltable[name]
+                    right = stack.pop()
+                    operation = opcodedispatch.get((opcode, type(left), type(right)))
+                    symboltable[name] = self.binaryop(opcode, left, right) if operation is None else operation(left, right)
+                elif opcode == COMPARE_OP:
+                    right = stack.pop()
+                    left = stack.pop()
+                    operation = dispatch.get((argument, type(left), type(right)))
+                    stack.append(self.compareop(argument, left, right) if operation is None else operation(left, right))
+                elif opcode == POP_JUMP_IF_NOT_TRUE:
+                    if stack.pop() is not True:
+                        pc = argument
+                elif opcode == POP_JUMP_IF_FALSE:
+                    if not stack.pop():
+                        pc = argument
+                elif opcode == JUMP_IF_FALSE_OR_POP:
+                    if not stack[-1]:
+                        pc = argument
+                    else:
+                        stack.pop()
+                elif opcode == POP_JUMP_IF_NOT_FALSE:
+                    if stack.pop() is not False:
+                        pc = argument
+                elif opcode == JUMP_ABSOLUTE:
+                    pc = argument
+                elif opcode == PRINT_ITEM:
+                    self.output.write(f"{stack.pop()} ")
+                elif opcode == PRINT_NEWLINE:
+                    self.output.newline()
+                elif opcode == LOAD_FUNCTION:
+                    name = co_names[argument]
+                    if name not in globalsymboltable:
+                        raise RuntimeError(f"Function {name} has not been defined yet")
+                    if not isinstance(globalsymboltable[name], codeobject):
+                        raise RuntimeError(f"Name {name} is not a function")
+                    stack.append(globalsymboltable[name])
+                elif opcode == CALL_FUNCTION:
+                    function_code = stack[-argument - 1]
+                    parameter_num = len(function_code.co_parameters)
+                    if argument != parameter_num:
+                        raise RuntimeError(f"Function {function_code.co_name} accepts {parameter_num} parameters but gets {argument}")
+                    # Bind the arguments to the parameter names in a fresh local symbol table
+                    function_locals = dict(zip(function_code.co_parameters, stack[len(stack) - argument:]))
+                    del stack[len(stack) - argument - 1:]
+                    if len(frames) >= self.maxcalldepth:
+                        raise RuntimeError(f"Maximum call depth of {self.maxcalldepth} exceeded calling {function_code.co_name}")
+                    # Suspend the caller and continue in the callee
+                    frames.append((code, pc, stack, localsymboltable, globalvardeclared))
+                    self.functioncalldepth = len(frames)
+                    self.calls += 1
+                    if self.functioncalldepth > self.maxdepthreached:
+                        self.maxdepthreached = self.functioncalldepth
+                    code = function_code
+                    co_code = code.co_code
+                    co_consts = code.co_consts
+                    co_names = code.co_names
+                    stack = []
+                    pc = 0
+                    localsymboltable = function_locals
+                    globalvardeclared = set()
+                elif opcode == RETURN_VALUE:
+                    result = stack.pop()
+                    if len(frames) == 0:
+                        return result
+                    # Resume the caller with the result on its stack
+                    code, pc, stack, localsymboltable, globalvardeclared = frames.pop()
+                    self.functioncalldepth = len(frames)
+                    co_code = code.co_code
+                    co_consts = code.co_consts
+                    co_names = code.co_names
+                    stack.append(result)
+                elif opcode == POP_TOP:
+                    stack.pop()
+                elif opcode == UNARY_NEGATIVE:
+                    stack.append(-1 * stack.pop())
+                elif opcode == UNARY_POSITIVE:
+                    pass
+                elif opcode == DUP_TOP:
+                    stack.append(stack[-1])
+                elif opcode == ROT_TWO:
+                    stack[-1], stack[-2] = stack[-2], stack[-1]
+                elif opcode == ROT_THREE:
+                    stack.insert(-2, stack.pop())
+                elif opcode == AND_COMPARE:
+                    # stack: result, right, newresult -> right, result and newresult
+                    result = stack.pop()
+                    right = stack.pop()
+                    result = stack.pop() and result
+                    stack.append(right)
+                    stack.append(result)
+                elif opcode == DECLARE_GLOBAL:
+                    name = co_names[argument]
+                    if name not in globalsymboltable:
+                        raise RuntimeError(f"The variable {name} has not been defined.")
+                    globalvardeclared.add(name)
+                elif opcode == MAKE_FUNCTION:
+                    function_code = co_consts[argument]
+                    if function_code.co_name in globalsymboltable:
+                        raise RuntimeError(f"Function {function_code.co_name} was already defined")
+                    globalsymboltable[function_code.co_name] = function_code
+                else:
+                    raise RuntimeError(f"Unknown opcode {opcode}")
+        except RuntimeError:
+            # code and pc are the ones of the innermost call, where the error happened
+            self.errorcode = code
+            self.errorpc = pc - 2
+            raise
+
+    def counters(self):
+        """Counters for --stats. The VM runs instructions, not tokens and statements, so it only counts calls"""
+        return [
+            ('tokens advanced by advance()', None),
+            ('statements executed', None),
+            ('function calls', self.calls),
+            ('maximum call depth', self.maxdepthreached),
+            ('tokens skipped in dead branches', None),
+        ]
+
+    def dump(self):
+        if self.errorcode is None:
+            return
+        token = self.errorcode.co_tokens[self.errorcode.co_lines[self.errorpc // 2]]
+        # In output, show '\n' for newline
+        lexeme = token.lexeme.replace('\n', '\\n')
+        print(f"\nError on '{lexeme}' ' line {str(token.line)} ' column {str(token.column)}'")
+        # Show the line with a caret pointing to the token
+        sourcesplit = self.source.split('\n')
+        print(sourcesplit[token.line - 1])
+        print(' ' * (token.column - 1) + '^')
@@ -1,5 +1,11 @@
 class Node:
-    def __init__(self, type, left, right) -> None:
+    # No per-instance __dict__, a parsed program holds one Node per operand and operator
+    # line and column are those of the token the node was made from, for error messages and trace hooks
+    __slots__ = ('type', 'left', 'right', 'line', 'column')
+
+    def __init__(self, type, left, right, line:int=None, column:int=None) -> None:
         self.type = type
         self.left = left
-        self.right = right
\ No newline at end of file
+        self.right = right
+        self.line = line
+        self.column = column
@@ -0,0 +1,62 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                            cache                            #
+#                                                             #
+#-------------------------------------------------------------#
+from pyheader import *
+from array import array
+import hashlib
+import os
+import zlib
+
+# Start of every cache file, followed by the header fields in an array('I') and the payload
+MAGIC = b'PYINTC\x00\x01'
+
+class sourcecache:
+    """On-disk cache of what the front end makes of a source, in the spirit of __pycache__.
+
+    Every entry is one file <key>.<kind> in directory, where key is a hash of the interpreter VERSION and the source bytes, and kind names the payload ('tokens', 'ast', ...).
+    A file starts with MAGIC, the key and the kind again, the payload length and a CRC32 of the payload, load() checks all of them and treats any mismatch as a miss.
+    The cache is only an optimization: unreadable, stale or corrupt entries are ignored and failures to write are not errors.
+    """
+    def __init__(self, directory:str, source:bytes):
+        self.directory = directory
+        self.key = hashlib.sha256(VERSION.encode('utf-8') + b'\x00' + source).hexdigest()
+
+    def path(self, kind:str):
+        return os.path.join(self.directory, f"{self.key}.{kind}")
+
+    def header(self, kind:str, payload:bytes):
+        fields = array('I', [len(payload), zlib.crc32(payload)])
+        return MAGIC + self.key.encode('ascii') + kind.encode('ascii').ljust(8, b'\x00') + fields.tobytes()
+
+    def load(self, kind:str):
+        """Return the payload stored for kind, or None if there is no valid entry
+        """
+        try:
+            with open(self.path(kind), 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        headersize = len(self.header(kind, b''))
+        payload = data[headersize:]
+        if data[:headersize] != self.header(kind, payload):
+            return None
+        return payload
+
+    def store(self, kind:str, payload:bytes):
+        """Write the entry for kind. The file is written under a temporary name and renamed, so that a concurrent load() never sees half of it
+        """
+        path = self.path(kind)
+        temppath = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temppath, 'wb') as file:
+                file.write(self.header(kind, payload))
+                file.write(payload)
+            os.replace(temppath, path)
+        except OSError:
+            try:
+                os.remove(temppath)
+            except OSError:
+                pass
@@ -0,0 +1,133 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                            hooks                            #
+#                                                             #
+#-------------------------------------------------------------#
+from pyheader import *
+from pyparser_ast import pyparser
+import sys
+
+# Events a hook can be registered for, and what the hook is called with:
+#     token       (token)                                  every token the scanner produces, comments included
+#     statement   (line, statement)                        every statement interpret() runs
+#     call        (function name, call depth, line)        every call of a pyint function
+#     branch      (line, 'if', 'elif' or 'while', value)   every condition of an if, elif or while, with its value
+# The line is the one of the token a node was made from, and the statement is the category of its node.
+EVENTS = ('token', 'statement', 'call', 'branch')
+
+class tracehooks:
+    """Hooks registered per event.
+
+    The tokenizer and the parser never test for tracing while they run: the tokenizer wraps its scanner in traced() and main picks tracingpyparser only when there are hooks to call, so a run without hooks pays nothing.
+    """
+    def __init__(self):
+        self.hooks = {event: [] for event in EVENTS}
+
+    def register(self, event:str, hook):
+        if event not in self.hooks:
+            raise ValueError(f"Unknown trace event {event}, expecting one of {', '.join(EVENTS)}")
+        self.hooks[event].append(hook)
+
+    def active(self, event:str):
+        return len(self.hooks[event]) > 0
+
+    def emit(self, event:str, *args):
+        for hook in self.hooks[event]:
+            hook(*args)
+
+class tracesink:
+    """Buffered text output of the trace.
+    Lines are collected and written buffersize characters at a time, a print() per event would cost a system call per token on an unbuffered stream such as stderr.
+    """
+    def __init__(self, file=None, buffersize:int=65536):
+        self.owned = file is not None
+        self.file = open(file, 'w') if file is not None else sys.stderr
+        self.buffersize = buffersize
+        self.buffer = []
+        self.size = 0
+
+    def write(self, text:str):
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= self.buffersize:
+            self.flush()
+
+    def flush(self):
+        self.file.write(''.join(self.buffer))
+        self.file.flush()
+        self.buffer.clear()
+        self.size = 0
+
+    def close(self):
+        self.flush()
+        if self.owned is True:
+            self.file.close()
+
+class tracewriter:
+    """Hooks writing one line per event to a tracesink, the output of --trace"""
+    def __init__(self, sink:tracesink):
+        self.sink = sink
+
+    def register(self, hooks:tracehooks, events):
+        for event in events:
+            hooks.register(event, getattr(self, event))
+
+    def token(self, token):
+        # Same columns as the token dump of the tokenizer, with '\n' shown for a newline
+        lexeme = str(token.lexeme).replace('\n', '\\n')
+        self.sink.write(f"token      {token.line}   {token.column}    {catnames[token.category]}   {lexeme}\n")
+
+    def statement(self, line:int, statement:str):
+        self.sink.write(f"statement  {line}   {statement}\n")
+
+    def call(self, name:str, depth:int, line:int):
+        self.sink.write(f"call       {line}   {name}   depth {depth}\n")
+
+    def branch(self, line:int, keyword:str, value):
+        self.sink.write(f"branch     {line}   {keyword}   {value}\n")
+
+class tracingpyparser(pyparser):
+    """pyparser calling the statement, call and branch hooks of a tracehooks.
+    Like statspyparser, the calls live in this subclass so that pyparser itself has no tracing left on its paths.
+    """
+    def __init__(self, *args, hooks:tracehooks=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hooks = hooks if hooks is not None else tracehooks()
+        # id() of every condition node of the tree -> its keyword and the line of the keyword, see findconditions()
+        self.conditions = {}
+
+    def findconditions(self, stmtlist:list):
+        """Record the conditions of the if, elif and while statements of stmtlist, function bodies included.
+        interpret() evaluates them as any other expression, evaluate() tells them apart by their id().
+        """
+        for node in stmtlist:
+            if node.type == PYIF:
+                for branch in node.left:
+                    self.conditions[id(branch.left)] = ('if' if branch.type == PYIF else 'elif', branch.line)
+                    self.findconditions(branch.right)
+                if node.right is not None:
+                    self.findconditions(node.right)
+            elif node.type == PYWHILE:
+                self.conditions[id(node.left)] = ('while', node.line)
+                self.findconditions(node.right)
+            elif node.type == DEF:
+                self.findconditions(node.right["body"])
+
+    def interpret(self, node):
+        if node.type == PROGRAM:
+            self.findconditions(node.left)
+        else:
+            self.hooks.emit('statement', node.line, catnames[node.type])
+        super().interpret(node)
+
+    def functioncall(self, node):
+        self.hooks.emit('call', node.left, self.functioncalldepth + 1, node.line)
+        return super().functioncall(node)
+
+    def evaluate(self, node):
+        value = super().evaluate(node)
+        condition = self.conditions.get(id(node))
+        if condition is not None:
+            keyword, line = condition
+            self.hooks.emit('branch', line, keyword, value)
+        return value
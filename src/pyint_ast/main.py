@@ -1,6 +1,14 @@
 import sys
+import os
+import argparse
+import pickle
 from tokenizer import tokenizer
 from pyparser_ast import pyparser
+from cache import sourcecache
+from pyheader import MAXCALLDEPTH
+from stats import phasestats, statspyparser
+from output import outputbuffer, FLUSHPOLICIES, LINE, SIZE
+from hooks import EVENTS, tracehooks, tracesink, tracewriter, tracingpyparser
 
 # Control switches
 only_tokenizer = False
@@ -9,37 +17,111 @@ def main():
     source = ''
     tokenlist = []
 
-    if len(sys.argv) == 2:
-        try:
-            infile = open(sys.argv[1], 'r')
-            source = infile.read()
-        except IOError:
-            print(f'Failed to read input file {sys.argv[1]}')
-            sys.exit(1)
-    else:
-        print('Wrong number of command line arguments')
-        print('Usage: python3 interpreter.py <infile>')
+    argparser = argparse.ArgumentParser(description='pyint AST interpreter')
+    argparser.add_argument('infile', help='pyint source file')
+    argparser.add_argument('--cache', action='store_true', help='reuse the syntax tree of an unchanged source from a cache directory')
+    argparser.add_argument('--cachedir', help='directory of --cache, by default __pyintcache__ next to the source file')
+    argparser.add_argument('--maxdepth', type=int, default=MAXCALLDEPTH, help=f'maximum depth of nested function calls in the script, default {MAXCALLDEPTH}')
+    argparser.add_argument('--stats', action='store_true', help='report the wall time of every phase and counters of the run on stderr')
+    argparser.add_argument('--statsmemory', action='store_true', help='--stats with the peak memory of every phase as well, which slows the run down')
+    argparser.add_argument('--outfile', help='write what the script prints to this file instead of stdout')
+    argparser.add_argument('--flush', choices=FLUSHPOLICIES, help='when to write the output of the script: at the end of every print statement (line), once --buffersize characters are waiting (size) or only at the end of the run (exit). Default line on a terminal, size otherwise')
+    argparser.add_argument('--buffersize', type=int, default=65536, help='characters of output kept before they are written with --flush size, default 65536')
+    argparser.add_argument('--trace', metavar='EVENTS', help=f"write a line per event to stderr, or to --tracefile, for a comma separated list of events out of {', '.join(EVENTS)}. Tokens are not traced when the tree is loaded from --cache")
+    argparser.add_argument('--tracefile', help='file to write the events of --trace to instead of stderr')
+    args = argparser.parse_args()
+    traceevents = [] if args.trace is None else [event.strip() for event in args.trace.split(',')]
+    for event in traceevents:
+        if event not in EVENTS:
+            argparser.error(f"unknown --trace event {event}, expecting {', '.join(EVENTS)}")
+
+    try:
+        infile = open(args.infile, 'r')
+        source = infile.read()
+    except IOError:
+        print(f'Failed to read input file {args.infile}')
+        sys.exit(1)
+
+    try:
+        sink = open(args.outfile, 'wb') if args.outfile is not None else None
+    except IOError:
+        print(f'Failed to open output file {args.outfile}')
         sys.exit(1)
+    policy = args.flush if args.flush is not None else LINE if args.outfile is None and sys.stdout.isatty() else SIZE
+    output = outputbuffer(policy=policy, buffersize=args.buffersize, sink=sink)
 
     # Add newline to end if missing TODO: Why does the last line need a newline?
     # (probably because the parser needs a newline to properly identify one line)
     if source[-1] != '\n':
         source = source + '\n'
 
-    T = tokenizer(source=source, tokenlist=tokenlist)
+    hooks = None
+    traceoutput = None
+    if len(traceevents) > 0:
+        hooks = tracehooks()
+        traceoutput = tracesink(args.tracefile)
+        tracewriter(traceoutput).register(hooks, traceevents)
+
+    T = tokenizer(source=source, tokenlist=tokenlist, hooks=hooks)
+    P = None
+    parserclass = pyparser
+    parserkwargs = {'maxcalldepth': args.maxdepth, 'output': output}
+
+    stats = None
+    # Number of tokens from the tokenizer, and left after removecomment(), for --stats
+    tokencounts = [None, None]
+    if args.stats is True or args.statsmemory is True:
+        stats = phasestats(memory=args.statsmemory)
+        parserclass = statspyparser
+    if any(event != 'token' for event in traceevents):
+        # --stats and --trace both at once in a class derived from the two
+        parserclass = tracingpyparser if parserclass is pyparser else type('pyparser', (statspyparser, tracingpyparser), {})
+        parserkwargs['hooks'] = hooks
+
+    def phase(name:str, function, *args):
+        if stats is None:
+            return function(*args)
+        return stats.run(name, function, *args)
+
+    cache = None
+    if args.cache is True:
+        directory = args.cachedir if args.cachedir is not None else os.path.join(os.path.dirname(os.path.abspath(args.infile)), '__pyintcache__')
+        cache = sourcecache(directory, source.encode('utf-8'))
 
+    tree = None
     try:
-        T.run()
-        if only_tokenizer == True:
-            exit()
-        T.traceall()
-        T.removecomment()
-        P = pyparser(tokenlist=tokenlist, source=source)
-        P.parse()
+        payload = None if cache is None else phase('load cache', cache.load, 'ast')
+        if payload is not None:
+            # Same source and same interpreter version, skip the tokenizer and the parser
+            P = parserclass(tokenlist=tokenlist, source=source, **parserkwargs)
+            tree = pickle.loads(payload)
+        else:
+            phase('tokenize', T.run)
+            tokencounts[0] = len(tokenlist)
+            if only_tokenizer == True:
+                exit()
+            phase('removecomment', T.removecomment)
+            tokencounts[1] = len(tokenlist)
+            P = parserclass(tokenlist=tokenlist, source=source, **parserkwargs)
+            tree = phase('parse', P.parse)
+            if cache is not None:
+                cache.store('ast', pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL))
+        phase('execute', P.interpret, tree)
     except RuntimeError as emsg:
-        T.dump()
-        P.dump()
+        if P is None:
+            T.dump()
+        else:
+            P.dump()
         print(emsg)
         sys.exit(1)
+    finally:
+        output.close()
+        if traceoutput is not None:
+            traceoutput.close()
+        if stats is not None:
+            counters = [('tokens produced', tokencounts[0]), ('tokens after removecomment()', tokencounts[1])]
+            if P is not None:
+                counters += P.counters()
+            stats.report(counters)
 
 main()
\ No newline at end of file
@@ -1,10 +1,20 @@
 class Token:
+    # No per-instance __dict__, scripts easily produce hundreds of thousands of tokens
+    __slots__ = ('line', 'column', 'category', 'lexeme')
+
     def __init__(self, line, column, category, lexeme) -> None:
         self.line = line
         self.column = column
         self.category = category
         self.lexeme = lexeme
 
+# Version of the front end. Cached tokens and trees (see cache.py) are only reused by the same version, so bump it whenever the tokenizer, the parser or what they produce changes
+VERSION             = '1.4'
+
+# Default limit on nested function calls, deeper recursion in a script raises a RuntimeError
+# interpret() recurses in Python for every call, as the token interpreter of pyint does
+MAXCALLDEPTH        = 1000
+
 # Category constants
 EOF                 = 0
 PRINT               = 1
@@ -53,6 +63,7 @@ RETURN              = 43
 FUNCTIONCALL        = 44
 PROGRAM             = 45
 NEGATE              = 46
+COMPARISON          = 47    # chained comparison such as a < b <= c
 ERROR               = 255   # if none of above, then error
 
 # Displayable names for each token category, using dictionary
@@ -104,6 +115,7 @@ catnames = {
     44: 'FUNCTIONCALL',
     45: 'PROGRAM',
     46: 'NEGATE',
+    47: 'COMPARISON',
     255:'ERROR'
 }
 
@@ -87,6 +87,8 @@ class pyparser:
         self.token = None
         self.tokenindex = 0
         self.operandstack = []
+        # INDENT token index -> matching DEDENT token index, see matchindent()
+        self.indenttable = {}
 
         # We need to split the symbol table into two: local and global
         self.localsymboltable = {}
@@ -110,6 +112,7 @@ class pyparser:
         self.flagbreakloop = False
     
     def parse(self):
+        self.matchindent()
         self.token = self.tokenlist[0]
         self.program()
         if self.trace is True:
@@ -138,6 +141,32 @@ class pyparser:
         else:
             self.advance()
 
+    def matchindent(self):
+        """Pair every INDENT with its DEDENT, once, before parsing starts.
+        indenttable maps the index of each INDENT token to the index of its matching DEDENT token, so that a block we decide not to execute can be skipped with a single jump instead of counting INDENT-DEDENT pairs token by token.
+        """
+        self.indenttable = {}
+        indentstack = []
+        for index, token in enumerate(self.tokenlist):
+            if token.category == INDENT:
+                indentstack.append(index)
+            elif token.category == DEDENT:
+                if len(indentstack) == 0:
+                    raise RuntimeError(f"DEDENT on line {token.line} has no matching INDENT")
+                self.indenttable[indentstack.pop()] = index
+        if len(indentstack) != 0:
+            raise RuntimeError(f"INDENT on line {self.tokenlist[indentstack[-1]].line} has no matching DEDENT")
+
+    def skipblock(self):
+        """Skip a whole <codeblock> without executing it.
+        Leading NEWLINEs are passed over, then we jump straight to the DEDENT matching the INDENT and advance() from it.
+        """
+        while self.token.category != INDENT:
+            self.advance()
+        self.tokenindex = self.indenttable[self.tokenindex]
+        # Don't forget to advance() from the DEDENT
+        self.advance()
+
     def program(self):
         # <program>         -> <stmt>* EOF
         # We must skip leading newlines, otherwise the while loop does not do anything and the next expecting token is EOF, which is not we want usually.
@@ -487,23 +516,9 @@ class pyparser:
             if self.flagbreak is True:
                 return
         else:
-            # Skip over until all pairs of INDENT-DEDENT are passed
+            # Skip over the whole INDENT-DEDENT block
             # codeblock() runs pass the indent-dedent block, but if we choose not to execute codeblock(), we need to implement this functionality by our own
-            indent_tracker = 0
-            indent_start = False
-            while True:
-                if self.token.category == INDENT:
-                    indent_tracker += 1
-                    indent_start = True
-                elif self.token.category == DEDENT:
-                    indent_tracker -= 1
-                if indent_tracker == 0 and indent_start is True:
-                    # We got all those indent-dedent pairs
-                    # Next token should be a statement or something close
-                    # Don't forget to advance() from the DEDENT
-                    self.advance()
-                    break
-                self.advance()
+            self.skipblock()
         # Now that we skipped the codeblock of "if", we should expect either "else" or "elif", or something else which means that the "if" has no "else" nor "elif". We can also have multiple "elif"s so a loop is good for this kind of stuffs (or recursively function call)
         # Hacky way to tell the "else" block that some "elif" got executed
         elif_executed = False
@@ -527,23 +542,9 @@ class pyparser:
                 if self.flagbreak is True:
                     return
             else:
-                # Skip over until all pairs of INDENT-DEDENT are passed
+                # Skip over the whole INDENT-DEDENT block
                 # codeblock() runs pass the indent-dedent block, but if we choose not to execute codeblock(), we need to implement this functionality by our own
-                indent_tracker = 0
-                indent_start = False
-                while True:
-                    if self.token.category == INDENT:
-                        indent_tracker += 1
-                        indent_start = True
-                    elif self.token.category == DEDENT:
-                        indent_tracker -= 1
-                    if indent_tracker == 0 and indent_start is True:
-                        # We got all those indent-dedent pairs
-                        # Next token should be a statement or something close
-                        # Don't forget to advance() from the DEDENT
-                        self.advance()
-                        break
-                    self.advance()
+                self.skipblock()
         if self.token.category == PYELSE:
             self.advance()
             self.consume(COLON)
@@ -558,21 +559,7 @@ class pyparser:
                     return
             else:
                 # codeblock() runs pass the indent-dedent block, but if we choose not to execute codeblock(), we need to implement this functionality by our own
-                indent_tracker = 0
-                indent_start = False
-                while True:
-                    if self.token.category == INDENT:
-                        indent_tracker += 1
-                        indent_start = True
-                    elif self.token.category == DEDENT:
-                        indent_tracker -= 1
-                    if indent_tracker == 0 and indent_start is True:
-                        # We got all those indent-dedent pairs
-                        # Next token should be a statement or something close
-                        # Don't forget to advance() from the DEDENT
-                        self.advance()
-                        break
-                    self.advance()
+                self.skipblock()
 
     def whilestmt(self):
         # <whilestmt>       -> 'while' <relexpr> ':' <codeblock>
@@ -616,24 +603,11 @@ class pyparser:
                     self.token = self.tokenlist[self.tokenindex]
             else:
                 # as in if, we need to skip the indent-dedent block
-                indent_tracker = 0
-                indent_start = False
-                while True:
-                    if self.token.category == INDENT:
-                        indent_tracker += 1
-                        indent_start = True
-                    elif self.token.category == DEDENT:
-                        indent_tracker -= 1
-                    if indent_tracker == 0 and indent_start is True:
-                        # We got all those indent-dedent pairs
-                        # Next token should be a statement or something close
-                        # Don't forget to advance() from the DEDENT
-                        self.advance()
-                        # return instead of break as we are inside of double while loop
-                        # Don't forget to pop the indentloop stack as no "break" is run
-                        self.indentloop.pop()
-                        return
-                    self.advance()
+                self.skipblock()
+                # return instead of break as we are inside of double while loop
+                # Don't forget to pop the indentloop stack as no "break" is run
+                self.indentloop.pop()
+                return
 
     def defstmt(self):
         # <defstmt>         -> 'def' NAME '(' [NAME (, NAME)*] ')'':' <codeblock>
@@ -688,14 +662,7 @@ class pyparser:
                 self.globalsymboltable[function_name]["entry"] = self.tokenindex
                 break
         # Skip the rest of the function
-        while True:
-            token_col = self.token.column
-            token_cat = self.token.category
-            # TODO: Need to de-hardcode token_col == 1 if we want to allow multiple layers of function definition (def within a def)
-            if token_col == 1 and token_cat not in [INDENT, DEDENT]:
-                break
-            else:
-                self.advance()
+        self.skipblock()
 
     def codeblock(self):
         # <codeblock>       -> <NEWLINE> 'INDENT' <stmt>+ 'DEDENT'
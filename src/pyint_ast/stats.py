@@ -0,0 +1,80 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                            stats                            #
+#                                                             #
+#-------------------------------------------------------------#
+from pyheader import *
+from pyparser_ast import pyparser
+import sys
+import time
+import tracemalloc
+
+class phasestats:
+    """Wall time and peak memory of each phase of a run, for --stats.
+
+    Memory is measured with tracemalloc, which slows everything down, so it is only on when asked for.
+    The peak of a phase is the most memory Python had allocated at any time during it, including what earlier phases left behind.
+    """
+    def __init__(self, memory:bool=False):
+        self.memory = memory
+        # (phase, seconds, peak bytes or None) in the order the phases ran
+        self.phases = []
+        if self.memory is True:
+            tracemalloc.start()
+
+    def run(self, phase:str, function, *args):
+        if self.memory is True:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases.append((phase, elapsed, tracemalloc.get_traced_memory()[1] if self.memory is True else None))
+
+    def report(self, counters:list, file=sys.stderr):
+        """Print the phases and the (name, value) counters, on stderr so that they stay out of the output of the script"""
+        print(f"\n{'phase':<16}{'time (ms)':>12}{'peak memory (KiB)':>20}", file=file)
+        for phase, seconds, peak in self.phases:
+            print(f"{phase:<16}{seconds * 1000:12.1f}{'-' if peak is None else f'{peak / 1024:.1f}':>20}", file=file)
+        print(f"{'total':<16}{sum(seconds for _, seconds, _ in self.phases) * 1000:12.1f}", file=file)
+        if self.memory is False:
+            print("peak memory is only measured with --statsmemory, which makes the run slower", file=file)
+        print(file=file)
+        for name, value in counters:
+            print(f"{name:<36}{'-' if value is None else value:>12}", file=file)
+
+class statspyparser(pyparser):
+    """pyparser counting what it does for --stats.
+    The counting lives in this subclass so that a run without --stats does not pay for it.
+    Tokens are only advanced over while parsing. The tree has no tokens to skip, a branch that is not taken is never visited at all.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.advanced = 0
+        self.statements = 0
+        self.calls = 0
+        self.maxdepthreached = 0
+
+    def advance(self):
+        self.advanced += 1
+        super().advance()
+
+    def interpret(self, node):
+        if node.type != PROGRAM:
+            self.statements += 1
+        super().interpret(node)
+
+    def functioncall(self, node):
+        self.calls += 1
+        self.maxdepthreached = max(self.maxdepthreached, self.functioncalldepth + 1)
+        return super().functioncall(node)
+
+    def counters(self):
+        return [
+            ('tokens advanced by advance()', self.advanced),
+            ('statements executed', self.statements),
+            ('function calls', self.calls),
+            ('maximum call depth', self.maxdepthreached),
+            ('tokens skipped in dead branches', None),
+        ]
@@ -4,10 +4,9 @@
 #                                                             #
 #-------------------------------------------------------------#
 from pyheader import *
-import os
 
 class tokenizer:
-    def __init__(self, source:str, tokenlist:list):
+    def __init__(self, source:str, tokenlist:list, hooks=None):
         self.source = source
         self.tokenlist = tokenlist
         self.token = None
@@ -17,9 +16,8 @@ class tokenizer:
         self.blankline = True
         self.sourceindex = 0
         self.indentstack = [1]
-        self.trace = True
-        self.dump_tokenizer = False
-        self.token_dump_file = 'C:/Dev/Projects/Intepreter/src/pyint/token.dump'
+        # tracehooks whose token hooks see every token of tokenlist once run() is done
+        self.hooks = hooks
 
     def getchar(self):
         # global sourceindex, column, line, prevchar, blankline
@@ -296,8 +294,6 @@ class tokenizer:
                     # The beauty is that INDENT is created afterwards but appended before the first "real" self.token of the line
                     self.tokenlist.append(self.token_indent)
                     self.indentstack.append(self.token.column)
-                    if self.trace is True:
-                        print(f"{str(self.token_indent.line)}   {str(self.token_indent.column)}    {catnames[self.token_indent.category]}   {str(self.token_indent.lexeme)}")
                 else:
                     while True:
                         if self.indentstack[-1] == self.token.column:
@@ -314,55 +310,35 @@ class tokenizer:
                             self.token_dedent = Token(self.line, self.indentstack[-1], DEDENT, '')
                             # The beauty is that DEDENT is created afterwards but appended before the first "real" self.token of the line
                             self.tokenlist.append(self.token_dedent)
-                            if self.trace is True:
-                                print(f"{str(self.token_dedent.line)}   {str(self.token_dedent.column)}    {catnames[self.token_dedent.category]}   {str(self.token_dedent.lexeme)}")
                         else:
                             raise RuntimeError(f"Incorrect dedentation {self.token.column} for {self.indentstack}")
             
             self.tokenlist.append(self.token)
-            
-            self.trace_print()
 
             if self.token.category == EOF:
-                if self.trace is True:
-                    self.traceall()
-                    print(self.indentstack)
                 break
 
-    def trace_print(self):
-        if self.trace is True:
-            print(f"{str(self.token.line)}   {str(self.token.column)}    {catnames[self.token.category]}   {str(self.token.lexeme)}")
+        # The hooks are called once the list is complete, so the scanning loop has no test for them
+        if self.hooks is not None and self.hooks.active('token') is True:
+            for token in self.tokenlist:
+                self.hooks.emit('token', token)
 
-    def traceall(self):
-        if self.trace is True:
-            """
-            Remove the existing file even if we don't need to dump
-            """
-            try:
-                os.remove(self.token_dump_file)
-            except OSError:
-                pass
-            print('Line Col Category            Lexeme\n')
-            for self.token in self.tokenlist:
-                if self.dump_tokenizer is False:
-                    print(f"{str(self.token.line)}   {str(self.token.column)}    {catnames[self.token.category]}   {str(self.token.lexeme)}")
-                else:
-                    """
-                    Then dump the content
-                    """
-                    try:
-                        with open(self.token_dump_file, 'a') as file:
-                            print(f"{str(self.token.line)}   {str(self.token.column)}    {catnames[self.token.category]}   {str(self.token.lexeme)}", file=file)
-                    except Exception as e:
-                        raise RuntimeError(e)
-                    
     def removecomment(self):
         """Remove all comments from token list
+        The list is rebuilt once from the tokens dropcomments() keeps, popping every comment in place made this quadratic on commented sources.
+        """
+        kept = list(self.dropcomments(self.tokenlist))
+        if len(kept) != len(self.tokenlist):
+            self.tokenlist.clear()
+            self.tokenlist.extend(kept)
+
+    def dropcomments(self, tokens):
+        """Yield tokens without the comments and the NEWLINEs right after each comment
         """
-        index = 0
-        while index < len(self.tokenlist):
-            if self.tokenlist[index].category in [COMMENT_MULTIPLE, COMMENT_SINGLE]:
-                self.tokenlist.pop(index)
+        dropnewline = False
+        for token in tokens:
+            if token.category in [COMMENT_MULTIPLE, COMMENT_SINGLE]:
+                dropnewline = True
                 # If the next token is a NEWLINE, should also remove it. Imagine this piece of code snippet:
                 """
                 while count < number:
@@ -378,10 +354,9 @@ class tokenizer:
 
                 This is going to raise a RuntimeError in our case as our next token is <NEWLINE>
                 """
-                while self.tokenlist[index].category == NEWLINE:
-                    self.tokenlist.pop(index)
-            else:
-                index += 1
+            elif token.category != NEWLINE or dropnewline is False:
+                dropnewline = False
+                yield token
 
     #TODO: Add the functionality of spitting out one token at a time
     def nexttoken(self):
@@ -0,0 +1 @@
+# Differential regression test of the pyint engines, run it with python -m regress from src/, see runner.py
@@ -0,0 +1,3 @@
+from regress.runner import main
+
+main()
@@ -0,0 +1,162 @@
+#-------------------------------------------------------------#
+#                                                             #
+#                           runner                            #
+#                                                             #
+#-------------------------------------------------------------#
+
+# Differential regression test: runs pyint scripts on every engine and every input path and compares what they print:
+#     python -m regress [scripts ...] [--configurations ...] [--jobs N] [--list]
+# Without scripts it runs src/book/*.in and the edge cases in regress/cases/*.in.
+# Every configuration is a command line of pyint/main.py or pyint_ast/main.py. Its output and exit status must be the same as the ones of
+# the reference, the token interpreter with the default options. Run it from src/. The exit status is 1 if any configuration disagreed.
+#
+# Where an error is shown differs between the engines, the token interpreter only sees the error once it has read the token after the
+# expression, so the 'Error on ... line ... column' block is compared for being there, not for its position.
+# A script can add options to every command line in a comment line of its own, '# regress: --maxdepth 50'.
+
+import sys
+import os
+import re
+import glob
+import difflib
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+srcdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+casesdir = os.path.join(srcdir, 'regress', 'cases')
+
+# Configuration -> command line, the first one is the reference
+configurations = {
+    'pyparser':             ['pyint/main.py'],
+    'pyparser --fast':      ['pyint/main.py', '--fast'],
+    'pyparser --mmap':      ['pyint/main.py', '--mmap'],
+    'pyparser --columnar':  ['pyint/main.py', '--columnar'],
+    'pyparser --cache':     ['pyint/main.py', '--cache'],
+    'vm':                   ['pyint/main.py', '--vm'],
+    'vm --fast':            ['pyint/main.py', '--vm', '--fast'],
+    'vm --mmap':            ['pyint/main.py', '--vm', '--mmap'],
+    'vm --columnar':        ['pyint/main.py', '--vm', '--columnar'],
+    'vm --cache':           ['pyint/main.py', '--vm', '--cache'],
+    'stream':               ['pyint/main.py', '--stream'],
+    'stream --fast':        ['pyint/main.py', '--stream', '--fast'],
+    'stream --mmap':        ['pyint/main.py', '--stream', '--mmap'],
+    'ast':                  ['pyint_ast/main.py'],
+    'ast --cache':          ['pyint_ast/main.py', '--cache'],
+}
+REFERENCE = 'pyparser'
+
+# Scripts of src/book on which the engines are known to disagree, and why. Only their exit status is compared.
+# The token interpreter parses a statement right before it runs it, the VM and the AST interpreter parse the whole script first,
+# so on a syntax error the token interpreter has printed the output of the statements before it, and the parsers word some errors differently.
+statusonly = {
+    'p0609.in':     'syntax error',
+    'p0701a.in':    'syntax error',
+    'p0707a.in':    'syntax error',
+    'p0707b.in':    'syntax error',
+    'p0802b.in':    'syntax error',
+    'p0802c.in':    'syntax error',
+    'p1403.in':     'syntax error',
+    'p1501a.in':    'syntax error',
+    'p1501b.in':    'syntax error',
+    'p1501c.in':    'syntax error',
+    'p1501d.in':    'syntax error',
+    'p1501e.in':    'syntax error',
+    'p1909.in':     'syntax error',
+}
+# Scripts that are not compared at all
+skipped = {
+    # print(3)) runs on the token interpreter, which stops reading a statement at its closing parenthesis
+    'p0701c.in':    'the token interpreter ignores what follows a complete statement on its line',
+}
+
+# Seconds a configuration may take on one script
+TIMEOUT = 60
+
+errorblock = re.compile(r"\nError on '.*' ' line \d+ ' column \d+'\n(?:.*\n *\^\n)?")
+optionline = re.compile(r"^#\s*regress:(.*)$", re.MULTILINE)
+
+def normalize(output:str):
+    """Output with the position of the error left out, see the top of this file"""
+    return errorblock.sub('\nError\n', output)
+
+def options(path:str):
+    """Options the script asks for in its '# regress:' lines"""
+    with open(path, 'r') as infile:
+        return [option for line in optionline.findall(infile.read()) for option in line.split()]
+
+def run(command:list):
+    """Output and exit status of one command line, stdout and stderr together as a terminal shows them"""
+    try:
+        completed = subprocess.run([sys.executable] + command, cwd=srcdir, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return f"timed out after {TIMEOUT} s\n", None
+    return completed.stdout, completed.returncode
+
+def runconfiguration(name:str, path:str):
+    """Results of one configuration on one script, a list of (label, output, status).
+    A --cache configuration runs twice in a cache directory of its own, once filling the cache and once loading from it.
+    """
+    command = configurations[name] + options(path)
+    if '--cache' not in command:
+        return [(name, *run(command + [path]))]
+    with tempfile.TemporaryDirectory() as directory:
+        command = command + ['--cachedir', directory, path]
+        return [(f"{name} (store)", *run(command)), (f"{name} (load)", *run(command))]
+
+def check(path:str, names:list, jobs:int):
+    """Run the configurations on the script at path and return the lines reporting their disagreements with the reference"""
+    script = os.path.basename(path)
+    if script in skipped:
+        return []
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = [result for results in pool.map(lambda name: runconfiguration(name, path), [REFERENCE] + names) for result in results]
+    _, expected, expectedstatus = results[0]
+    problems = []
+    if 'Traceback (most recent call last)' in expected:
+        problems.append(f"{path}: {REFERENCE} crashed\n{expected}")
+    for label, output, status in results[1:]:
+        if 'Traceback (most recent call last)' in output:
+            problems.append(f"{path}: {label} crashed\n{output}")
+        elif status != expectedstatus:
+            problems.append(f"{path}: {label} exits with {status}, {REFERENCE} with {expectedstatus}\n{output}")
+        elif script not in statusonly and normalize(output) != normalize(expected):
+            diff = difflib.unified_diff(normalize(expected).split('\n'), normalize(output).split('\n'), REFERENCE, label, lineterm='', n=1)
+            problems.append(f"{path}: {label} prints something else\n" + '\n'.join(list(diff)[:20]))
+    return problems
+
+def main():
+    argparser = argparse.ArgumentParser(prog='python -m regress', description='differential regression test of the pyint engines')
+    argparser.add_argument('scripts', nargs='*', help='pyint scripts to run, by default book/*.in and regress/cases/*.in')
+    argparser.add_argument('--configurations', nargs='+', choices=[name for name in configurations if name != REFERENCE], help=f'configurations to compare with {REFERENCE}, all by default')
+    argparser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='configurations of a script run at the same time, default the number of CPUs')
+    argparser.add_argument('--list', action='store_true', help='list the configurations and their command lines and exit')
+    args = argparser.parse_args()
+    if args.list is True:
+        for name, command in configurations.items():
+            print(f"{name:<22}{' '.join(command)}")
+        return
+    if args.jobs < 1:
+        argparser.error('--jobs must be at least 1')
+    names = args.configurations if args.configurations is not None else [name for name in configurations if name != REFERENCE]
+    scripts = [os.path.abspath(path) for path in args.scripts]
+    if len(scripts) == 0:
+        scripts = sorted(glob.glob(os.path.join(srcdir, 'book', '*.in'))) + sorted(glob.glob(os.path.join(casesdir, '*.in')))
+
+    failed = 0
+    for path in scripts:
+        problems = check(path, names, args.jobs)
+        name = os.path.relpath(path, srcdir)
+        if os.path.basename(path) in skipped:
+            print(f"skipped   {name}: {skipped[os.path.basename(path)]}")
+        elif len(problems) == 0:
+            print(f"ok        {name}")
+        else:
+            failed += 1
+            print(f"FAILED    {name}")
+            for problem in problems:
+                print(problem)
+    print(f"{len(scripts) - failed} of {len(scripts)} scripts agree on {len(names) + 1} configurations")
+    if failed > 0:
+        sys.exit(1)